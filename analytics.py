@@ -0,0 +1,364 @@
+"""
+Persistent store of finished analyses, and reports over it.
+
+Every face shape the kiosk decides becomes one row in a SQLite database in
+WAL mode. The row holds the shape, its confidence, the scores, the mean
+face ratios, the timings and the hairstyles shown. A ResultStore queues
+rows from the Tk thread and writes them in batches on its own thread, so
+neither disk speed nor a busy reader can hold up the display. WAL lets
+reports run against the live database.
+
+Indexes on (decided_at), (shape, decided_at) and (kiosk, decided_at) keep
+time-range, per-shape and per-kiosk queries off full table scans.
+
+Running this module prints an aggregate report: shape distribution, time
+to decision, decision methods, per-kiosk throughput, activity over time
+and the most shown hairstyles.
+
+Example:
+    python app.py --kiosk-id lobby          # stores to .cache/results.db
+    python analytics.py --since 7d --by day
+    python analytics.py --kiosk lobby --shape Oval --json
+"""
+import argparse
+import datetime
+import json
+import os
+import queue
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+from face_shape import RATIO_KEYS, SHAPES, UNKNOWN_SHAPE
+
+RESULTS_PATH = os.path.join(".cache", "results.db")
+SCHEMA_VERSION = 1
+
+COLUMNS = ('decided_at', 'kiosk', 'source', 'face_id', 'shape', 'confidence', 'method',
+           'seconds_to_decision', 'frames') + RATIO_KEYS + ('scores', 'hairstyles')
+JSON_COLUMNS = ('scores', 'hairstyles')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    decided_at REAL NOT NULL,
+    kiosk TEXT NOT NULL,
+    source TEXT,
+    face_id INTEGER,
+    shape TEXT NOT NULL,
+    confidence REAL,
+    method TEXT NOT NULL,
+    seconds_to_decision REAL,
+    frames INTEGER,
+    {', '.join(f'{key} REAL' for key in RATIO_KEYS)},
+    scores TEXT,
+    hairstyles TEXT
+);
+CREATE INDEX IF NOT EXISTS analyses_time ON analyses (decided_at);
+CREATE INDEX IF NOT EXISTS analyses_shape_time ON analyses (shape, decided_at);
+CREATE INDEX IF NOT EXISTS analyses_kiosk_time ON analyses (kiosk, decided_at);
+"""
+
+INSERT = f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def connect(path=RESULTS_PATH):
+    """Open the database in WAL mode, creating it and the schema if needed."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        db.close()
+        raise ValueError(f"{path} has schema version {version}; this code writes version {SCHEMA_VERSION}")
+    with db:
+        db.executescript(SCHEMA)
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return db
+
+
+def default_kiosk():
+    return socket.gethostname()
+
+
+class ResultStore:
+    """
+    Appends finished analyses to the database on a background thread.
+
+    record() only builds a tuple and queues it. The writer inserts whatever
+    has arrived within `flush_interval` seconds, up to `batch_size` rows, in
+    one transaction. If it falls more than `queue_size` rows behind, new rows
+    are dropped and counted in `dropped`; rows a failed insert lost are
+    counted in `failed`.
+    """
+
+    def __init__(self, path=RESULTS_PATH, kiosk=None, source=None, batch_size=100, flush_interval=2.0,
+                 queue_size=10000):
+        self.path = path
+        self.kiosk = kiosk or default_kiosk()
+        self.source = source
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(queue_size)
+        self._db = connect(path)
+        self._thread = threading.Thread(target=self._run, name="result-store", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def open(cls, path=RESULTS_PATH, **options):
+        """The store at `path`, or None if the database cannot be opened."""
+        try:
+            return cls(path, **options)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Not storing results: {e}")
+            return None
+
+    def record(self, shape, confidence, method, decided_at=None, **fields):
+        """
+        Queue one finished analysis
+
+        Args:
+            shape (str): Decided face shape
+            confidence (float): Its share of the votes or posterior
+            method (str): 'scores', 'votes' or 'recalled'
+            decided_at (float): Unix time of the decision (default: now)
+            **fields: Any other COLUMNS; ratios as RATIO_KEYS, 'scores' as a
+                {shape: probability} dict and 'hairstyles' as a list of paths
+        """
+        fields.update(shape=shape, confidence=confidence, method=method,
+                      decided_at=time.time() if decided_at is None else decided_at)
+        fields.setdefault('kiosk', self.kiosk)
+        fields.setdefault('source', self.source)
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown result fields: {', '.join(sorted(unknown))}")
+        for key in JSON_COLUMNS:
+            if fields.get(key) is not None:
+                fields[key] = json.dumps(fields[key])
+        try:
+            self._queue.put_nowait(tuple(fields.get(column) for column in COLUMNS))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_session(self, session, decided_at=None, hairstyles=None, **fields):
+        """
+        Queue the result of a decided voting.FaceSession
+
+        Args:
+            session (voting.FaceSession): Session with a result
+            decided_at (float): Unix time of the decision (default: now)
+            hairstyles (list): Gallery paths shown for the result
+            **fields: Any other COLUMNS, such as kiosk or source
+        """
+        ratios = session.mean_ratios()
+        if ratios is not None:
+            fields.update(zip(RATIO_KEYS, (float(r) for r in ratios)))
+        if session.recalled:
+            method = 'recalled'
+        elif session.scored:
+            method = 'scores'
+            fields['scores'] = {shape: round(float(p), 4) for shape, p in zip(SHAPES, session.voter.posterior())}
+        else:
+            method = 'votes'
+        self.record(session.result, session.confidence, method, decided_at, face_id=session.face_id,
+                    seconds_to_decision=session.elapsed, frames=session.frames, hairstyles=hairstyles, **fields)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    with self._db:
+                        self._db.executemany(INSERT, rows)
+                    self.written += len(rows)
+                except sqlite3.Error as e:
+                    self.failed += len(rows)
+                    print(f"Could not store {len(rows)} results: {e}")
+            if batch[-1] is None:
+                return
+
+    def close(self):
+        """Write out everything queued and close the database."""
+        self._queue.put(None)
+        self._thread.join()
+        self._db.close()
+
+    def summary(self):
+        text = f"{self.written} results stored in {self.path}"
+        if self.dropped or self.failed:
+            text += f", {self.dropped} dropped, {self.failed} failed"
+        return text
+
+
+def parse_time(text):
+    """
+    Unix time from an ISO date or datetime, or from an age such as 30m, 12h or 7d
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([mhd])", text.strip())
+    if match:
+        seconds = float(match.group(1)) * {'m': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+        return time.time() - seconds
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def _percentile(values, q):
+    """q-th percentile of sorted values, interpolated"""
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def report(db, since=None, until=None, kiosk=None, shape=None, by='day', top=10):
+    """
+    Aggregate the analyses matching the filters
+
+    Args:
+        db (sqlite3.Connection): Open database
+        since, until (float): Unix time range (either end optional)
+        kiosk (str): Only this kiosk
+        shape (str): Only this face shape
+        by (str): Activity buckets, 'hour' or 'day' (local time)
+        top (int): Number of hairstyles to list
+
+    Returns:
+        dict: JSON-serialisable report
+    """
+    clauses, params = [], []
+    for column, op, value in (('decided_at', '>=', since), ('decided_at', '<', until),
+                              ('kiosk', '=', kiosk), ('shape', '=', shape)):
+        if value is not None:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def query(sql, extra=""):
+        return db.execute(sql.format(where=where + extra), params).fetchall()
+
+    total, first, last = query("SELECT COUNT(*), MIN(decided_at), MAX(decided_at) FROM analyses{where}")[0]
+    ratio_columns = ", ".join(f"AVG({key})" for key in RATIO_KEYS)
+    shapes = [{'shape': row[0], 'count': row[1], 'share': row[1] / total, 'confidence': row[2],
+               'seconds_to_decision': row[3], 'ratios': dict(zip(RATIO_KEYS, row[4:]))}
+              for row in query(f"SELECT shape, COUNT(*), AVG(confidence), AVG(seconds_to_decision), "
+                               f"{ratio_columns} FROM analyses{{where}} GROUP BY shape ORDER BY COUNT(*) DESC")]
+    methods = dict(query("SELECT method, COUNT(*) FROM analyses{where} GROUP BY method"))
+
+    # Returning customers are decided at once, so leave them out of the timings
+    seconds = [row[0] for row in query("SELECT seconds_to_decision FROM analyses{where}",
+                                       (" AND " if where else " WHERE ") +
+                                       "method != 'recalled' AND seconds_to_decision IS NOT NULL "
+                                       "ORDER BY seconds_to_decision")]
+    timing = None
+    if seconds:
+        timing = {'mean': sum(seconds) / len(seconds),
+                  **{f"p{q}": _percentile(seconds, q) for q in (50, 90, 99)}}
+
+    kiosks = []
+    for name, count, start, end, days in query(
+            "SELECT kiosk, COUNT(*), MIN(decided_at), MAX(decided_at), "
+            "COUNT(DISTINCT date(decided_at, 'unixepoch', 'localtime')) FROM analyses{where} "
+            "GROUP BY kiosk ORDER BY COUNT(*) DESC"):
+        hours = (end - start) / 3600
+        kiosks.append({'kiosk': name, 'count': count, 'active_days': days, 'per_active_day': count / days,
+                       'per_hour': count / hours if hours > 0 else None})
+
+    bucket = "%Y-%m-%d %H:00" if by == 'hour' else "%Y-%m-%d"
+    activity = dict(query(f"SELECT strftime('{bucket}', decided_at, 'unixepoch', 'localtime') AS bucket, "
+                          f"COUNT(*) FROM analyses{{where}} GROUP BY bucket ORDER BY bucket"))
+
+    try:
+        hairstyles = query("SELECT json_each.value, COUNT(*) FROM analyses, json_each(analyses.hairstyles)"
+                           "{where} GROUP BY json_each.value ORDER BY COUNT(*) DESC LIMIT " + str(int(top)))
+    except sqlite3.OperationalError:
+        hairstyles = []  # SQLite built without JSON functions
+
+    return {
+        'analyses': total,
+        'first': first,
+        'last': last,
+        'shapes': shapes,
+        'methods': methods,
+        'seconds_to_decision': timing,
+        'kiosks': kiosks,
+        'activity': activity,
+        'hairstyles': [{'path': path, 'count': count} for path, count in hairstyles],
+    }
+
+
+def _format_time(t):
+    return datetime.datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M")
+
+
+def print_report(data):
+    if not data['analyses']:
+        print("No analyses match")
+        return
+    print(f"{data['analyses']} analyses from {_format_time(data['first'])} to {_format_time(data['last'])}")
+    print(f"\n{'shape':<18}{'count':>7}{'share':>8}{'conf':>7}{'secs':>7}")
+    for row in data['shapes']:
+        secs = f"{row['seconds_to_decision']:.1f}" if row['seconds_to_decision'] is not None else "-"
+        conf = f"{row['confidence']:.0%}" if row['confidence'] is not None else "-"
+        print(f"{row['shape']:<18}{row['count']:>7}{row['share']:>8.1%}{conf:>7}{secs:>7}")
+    timing = data['seconds_to_decision']
+    if timing:
+        print(f"\nTime to decision: mean {timing['mean']:.1f}s, p50 {timing['p50']:.1f}s, "
+              f"p90 {timing['p90']:.1f}s, p99 {timing['p99']:.1f}s")
+    print("Methods: " + ", ".join(f"{method} {count}" for method, count in data['methods'].items()))
+    print(f"\n{'kiosk':<24}{'count':>7}{'days':>6}{'per day':>9}{'per hour':>10}")
+    for row in data['kiosks']:
+        per_hour = f"{row['per_hour']:.1f}" if row['per_hour'] is not None else "-"
+        print(f"{row['kiosk']:<24}{row['count']:>7}{row['active_days']:>6}{row['per_active_day']:>9.1f}"
+              f"{per_hour:>10}")
+    print()
+    for bucket, count in data['activity'].items():
+        print(f"{bucket:<18}{count:>7}")
+    if data['hairstyles']:
+        print("\nMost shown hairstyles:")
+        for row in data['hairstyles']:
+            print(f"{row['count']:>7}  {row['path']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report on stored face shape analyses.")
+    parser.add_argument("--db", default=RESULTS_PATH, help="Results database")
+    parser.add_argument("--since", type=parse_time, help="Start time: ISO date/datetime or an age like 12h or 7d")
+    parser.add_argument("--until", type=parse_time, help="End time, in the same formats")
+    parser.add_argument("--kiosk", help="Only this kiosk ID")
+    parser.add_argument("--shape", choices=SHAPES + [UNKNOWN_SHAPE], help="Only this face shape")
+    parser.add_argument("--by", choices=["hour", "day"], default="day", help="Activity bucket size")
+    parser.add_argument("--top", type=int, default=10, help="Hairstyles to list")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"Results database not found at: {args.db}")
+    try:
+        db = sqlite3.connect(args.db)
+        data = report(db, args.since, args.until, args.kiosk, args.shape, args.by, args.top)
+    except sqlite3.Error as e:
+        sys.exit(f"Could not read {args.db}: {e}")
+    if args.json:
+        print(json.dumps(data, indent=2))
+    else:
+        print_report(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,27 @@
-import cv2
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
 import threading
-import subprocess
-import sys
-import dlib
-import numpy as np
-import math
-import os
 import time
 
+# cv2, dlib, numpy and PIL are imported where first needed, mostly by the
+# model loader thread, so the window appears before they finish loading
+from models import ModelLoader
+from profiling import StageProfiler
+
 class FaceShapeRecognizer:
-    def __init__(self):
-        self.root = tk.Tk()
+    def __init__(self, detect_every=10, track_min_confidence=7.0, detection_width=320,
+                 detector_backend='hog', detector_options=None, vote_options=None,
+                 profile=False, profile_overlay=False, profile_dump=None,
+                 source='0', realtime=False, loop=False, landmark_workers=1,
+                 static_threshold=2.0, max_reuse=15, smoothing=None,
+                 scoring=None, vote_labels=False, shape_model_path=None, predictor_path=None,
+                 record=None, record_video=False, identity_options=None, governor_options=None,
+                 results_db=None, kiosk_id=None,
+                 master=None, models=None, on_back=None):
+        # Standalone the recognizer owns the Tk root; started from the menu
+        # it is a Toplevel of the menu's root and shares its loaded models
+        self.master = master
+        self.root = tk.Toplevel(master) if master is not None else tk.Tk()
         self.root.title("Face Shape Recognition")
         self.root.state('zoomed')
         
@@ -26,10 +34,91 @@ class FaceShapeRecognizer:
         self.current_frame = None
         self.message_shown = False
         self.current_shape = None
-        self.timer_started = False
-        self.timer_value = 10
-        self.timer_paused = False
-        self.elapsed_time = 0
+        self.pipeline = None
+        self.tracker = None
+        self.detector = None
+        self.predictor = None
+        self.source = None
+        self.source_error = None
+        self.video_sink = None
+        self.start_pending = False
+        self.on_back = on_back
+        self.display_interval = 15  # ms between UI redraws
+        self.idle_display_interval = 100  # ms between polls while idle
+        
+        # Run the full detector every N frames and track faces in between
+        self.detect_every = detect_every
+        self.track_min_confidence = track_min_confidence
+        
+        # Width faces are detected at; landmarks still use the full frame.
+        # HOG misses faces under ~80 px, so raise this for distant subjects.
+        self.detection_width = detection_width
+        
+        # Face detector backend (see detectors.DETECTOR_BACKENDS)
+        self.detector_backend = detector_backend
+        self.detector_options = detector_options or {}
+        
+        # Per-frame shape probabilities are accumulated per face until one
+        # shape is probable enough (see voting.ScoreAccumulator); with
+        # vote_labels, per-frame labels are counted instead (see voting.ShapeVoter)
+        self.scoring = None if vote_labels else (scoring or {})
+        self.vote_options = vote_options or {}
+        self.shape_model_path = shape_model_path
+        self.predictor_path = predictor_path
+        
+        # Each tracked face gets its own vote and timer (see voting.FaceSessions);
+        # faces unseen for face_timeout seconds are forgotten
+        self.analysis_time = 10.0
+        self.face_timeout = 3.0
+        self.face_sessions = None
+        
+        # Processes predicting landmarks when several faces are in view
+        self.landmark_workers = landmark_workers
+        self.landmark_pool = None
+        
+        # Reuse landmarks while a face holds still (see pipeline.StaticFaceCache)
+        self.static_threshold = static_threshold
+        self.max_reuse = max_reuse
+        self.static_cache = None
+        
+        # One Euro landmark filter settings, or None to classify raw landmarks
+        # (see smoothing.LandmarkSmoother)
+        self.smoothing = smoothing
+        self.smoother = None
+        
+        # Per-stage latency profiling; near zero cost while disabled
+        self.profiler = StageProfiler(enabled=profile or profile_overlay or bool(profile_dump))
+        self.profile_overlay = profile_overlay
+        self.profile_dump = profile_dump
+        
+        # Analysis rate cap and low-power idle mode (see governor.RateGovernor);
+        # False analyzes every frame as fast as possible
+        self.governor_options = {} if governor_options is None else governor_options
+        self.governor = None
+        
+        # Opt-in recognition of returning customers, who get their stored
+        # shape at once (see identity.IdentityCache); None keeps it off
+        self.identity_options = identity_options
+        self.identities = None
+        self.enroll_confidence = 0.8
+        
+        # Finished analyses go to a SQLite database for analytics (see
+        # analytics.ResultStore); None uses analytics.RESULTS_PATH, False keeps it off
+        self.results_db = results_db
+        self.kiosk_id = kiosk_id
+        self.results = None
+        self.current_hairstyles = []
+        
+        # Optional session log of every displayed frame, for offline replay
+        # (see recording.SessionRecorder)
+        self.record_path = record
+        self.record_video = record_video
+        self.recorder = None
+        
+        # Camera index, video file, image sequence or stream URL (see sources.open_source)
+        self.source_spec = source
+        self.realtime = realtime
+        self.loop = loop
         
         # Calculate dynamic sizes based on screen dimensions
         self.hairstyle_img_size = min(int(self.screen_width * 0.15), int(self.screen_height * 0.2))
@@ -39,63 +128,57 @@ class FaceShapeRecognizer:
         video_width = int(video_height * 4/3)
         self.video_size = (video_width, video_height)
         
-        # Load hairstyle images with dynamic sizing
-        self.male_images = self.load_hairstyle_images("male")
-        self.female_images = self.load_hairstyle_images("female")
+        # Hairstyle thumbnails are decoded on demand when a shape is shown
+        self.thumbnails = None
         
         # Create GUI elements before camera initialization
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
-        # Initialize camera and models after GUI setup
-        self.init_camera()
+        # Load models and open the frame source in the background
+        self.models = models or ModelLoader(self.detector_backend, self.detector_options, self.predictor_path,
+                                            shape_model_path=self.shape_model_path,
+                                            eye_landmarks=self.identity_options is not None)
+        self.models.start()
+        self.source_thread = threading.Thread(target=self.init_source, name="open-source", daemon=True)
+        self.source_thread.start()
+        self.root.after(100, self.check_loading)
+
+    def init_source(self):
+        """Open the frame source; runs on a background thread."""
         try:
-            predictor_path = r"tools\shape_predictor_68_face_landmarks.dat"
-            if not os.path.exists(predictor_path):
-                raise FileNotFoundError(f"Predictor file not found at: {predictor_path}")
-            
-            self.detector = dlib.get_frontal_face_detector()
-            self.predictor = dlib.shape_predictor(predictor_path)
+            from sources import open_source
+            self.source = open_source(self.source_spec, realtime=self.realtime, loop=self.loop)
+            print(f"Opened frame source {self.source.describe()}")
         except Exception as e:
-            messagebox.showerror("Error", f"Error loading dlib models: {e}")
-            self.root.destroy()
+            self.source_error = e
+
+    def check_loading(self):
+        """Poll background loading from the Tk thread until it is done."""
+        if not self.models.ready.is_set() or self.source_thread.is_alive():
+            status = self.models.status if not self.models.ready.is_set() else "Opening camera..."
+            self.info_label.config(text=status)
+            self.root.after(100, self.check_loading)
             return
-
-    def load_hairstyle_images(self, gender):
-        images = {}
-        shapes = ["Round", "Oval", "Square", "Diamond", "Heart"]
-        for shape in shapes:
-            shape_images = []
-            path = f"{gender}/{shape.lower()}"
-            if os.path.exists(path):
-                for img_file in os.listdir(path):
-                    if img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                        try:
-                            img = Image.open(os.path.join(path, img_file))
-                            img = img.resize((self.hairstyle_img_size, self.hairstyle_img_size), Image.Resampling.LANCZOS)
-                            photo = ImageTk.PhotoImage(img)
-                            shape_images.append(photo)
-                        except Exception as e:
-                            print(f"Error loading image {img_file}: {e}")
-            images[shape] = shape_images[:5]  # Take up to 5 images
-        return images
-
-    def run(self):
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        # Start video processing after a short delay
-        self.root.after(100, self.start_video)
-        self.root.mainloop()
-
-    def init_camera(self):
-        try:
-            self.cap = cv2.VideoCapture(0)
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer size
-            self.cap.set(cv2.CAP_PROP_FPS, 30)  # Set FPS
-            if not self.cap.isOpened():
-                raise Exception("Could not open camera")
-            print("Camera initialized successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"Camera initialization failed: {e}")
-            self.root.destroy()
+        
+        self.progress.stop()
+        self.progress.pack_forget()
+        if self.models.error is not None:
+            messagebox.showerror("Error", f"Error loading dlib models: {self.models.error}")
+            self.on_closing()
+            return
+        if self.source_error is not None:
+            messagebox.showerror("Error", f"Video source initialization failed: {self.source_error}")
+            self.on_closing()
+            return
+        
+        self.detector = self.models.detector
+        self.predictor = self.models.predictor
+        print(f"Models loaded in {self.models.seconds:.1f}s (landmarks: {self.predictor.describe()})")
+        self.info_label.config(text="Face Shape: Unknown")
+        if self.start_pending:
+            self.start_pending = False
+            self.start_video()
 
     def create_widgets(self):
         # Calculate dynamic padding and font sizes
@@ -237,6 +320,12 @@ class FaceShapeRecognizer:
                                     style='Custom.TLabel')
         self.info_label.pack(pady=10)
         
+        # Shown while models load in the background
+        self.progress = ttk.Progressbar(center_frame, mode='indeterminate',
+                                        length=int(self.screen_width * 0.15))
+        self.progress.pack(pady=5)
+        self.progress.start(10)
+        
         # Create control buttons frame
         self.control_frame = ttk.Frame(center_frame, style="Custom.TFrame")
         self.control_frame.pack(pady=int(self.screen_height * 0.01))
@@ -301,23 +390,33 @@ class FaceShapeRecognizer:
         self.restart_button.config(state=tk.DISABLED)
 
     def back_to_main_menu(self):
-        """Launch the start.py file in a new Python process."""
-        try:
-            script_path = os.path.abspath(r"start.py")
-            if os.path.exists(script_path):
-                # Open the script in the same directory
-                subprocess.Popen([sys.executable, script_path], cwd=os.path.dirname(script_path))
-                self.on_closing()  # Close current window after launching main menu
-            else:
-                messagebox.showerror("Error", f"File not found: {script_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to open start window: {e}")
+        """Hide this screen and show the main menu; models stay loaded for the next visit."""
+        self.hide()
+        if self.on_back is not None:
+            self.on_back()
+        else:
+            # Started on its own: open the menu in this process
+            from start import App
+            App(tk.Toplevel(self.root), models=self.models, recognizer=self)
+
+    def show(self):
+        self.root.deiconify()
+        self.root.after(100, self.start_video)
+
+    def hide(self):
+        self.stop_video()
+        self.root.withdraw()
 
     def update_hairstyle_images(self, face_shape):
         if face_shape != self.current_shape:
             self.current_shape = face_shape
+            if self.thumbnails is None:
+                from thumbnails import ThumbnailStore
+                self.thumbnails = ThumbnailStore(self.hairstyle_img_size)
+            self.current_hairstyles = (self.thumbnails.list_images("male", face_shape)
+                                       + self.thumbnails.list_images("female", face_shape))
             # Update male images
-            male_images = self.male_images.get(face_shape, [])
+            male_images = self.thumbnails.photos_for("male", face_shape)
             for i, label in enumerate(self.male_image_labels):
                 if i < len(male_images):
                     label.configure(image=male_images[i])
@@ -326,7 +425,7 @@ class FaceShapeRecognizer:
                     label.configure(image='')
 
             # Update female images
-            female_images = self.female_images.get(face_shape, [])
+            female_images = self.thumbnails.photos_for("female", face_shape)
             for i, label in enumerate(self.female_image_labels):
                 if i < len(female_images):
                     label.configure(image=female_images[i])
@@ -336,18 +435,12 @@ class FaceShapeRecognizer:
 
     def restart_analysis(self):
         # Reset all analysis-related attributes
-        if hasattr(self, 'shape_history'):
-            del self.shape_history
-        if hasattr(self, 'shape_start_time'):
-            del self.shape_start_time
+        if self.face_sessions is not None:
+            self.face_sessions.clear()
         
         # Reset message flag and current shape
         self.message_shown = False
         self.current_shape = None
-        self.timer_started = False
-        self.timer_value = 10
-        self.timer_paused = False
-        self.elapsed_time = 0
         
         # Clear all image labels
         for label in self.male_image_labels + self.female_image_labels:
@@ -364,139 +457,66 @@ class FaceShapeRecognizer:
         # Restart video processing
         self.start_video()
 
-    def determine_face_shape(self, face_landmarks):
+    def determine_face_shape(self, face_id, shape, now, scores=None, known=None, ratios=None):
         """
-        Advanced face shape detection using comprehensive landmark measurements
+        Add one frame of a face to its own vote and timer
         
         Args:
-            face_landmarks (dlib.full_object_detection): Facial landmarks from dlib
+            face_id (int): Track ID from the face tracker
+            shape (str): This frame's shape label for the face
+            now (float): Current time in seconds
+            scores (np.ndarray): This frame's shape probabilities for the face
+            known (dict): Stored identity if the face is a returning customer
+            ratios (np.ndarray): This frame's face ratios for the face
         
         Returns:
-            str: Detected face shape with high confidence
+            str: Face shape to show for this face
         """
-        # Extract precise landmark coordinates
-        points = np.array([
-            [face_landmarks.part(i).x, face_landmarks.part(i).y] 
-            for i in range(68)
-        ])
-        
-        # Advanced measurement points
-        # Forehead points
-        forehead_left = points[17]
-        forehead_right = points[26]
-        
-        # Cheekbone points
-        cheekbone_left = points[2]
-        cheekbone_right = points[14]
-        
-        # Jawline points
-        jaw_left = points[5]
-        jaw_right = points[11]
-        jaw_bottom = points[8]
-        
-        # Precise measurements
-        forehead_width = np.linalg.norm(forehead_left - forehead_right)
-        cheekbone_width = np.linalg.norm(cheekbone_left - cheekbone_right)
-        jaw_width = np.linalg.norm(jaw_left - jaw_right)
-        
-        # Face length calculations
-        face_length = np.linalg.norm(points[19] - points[8])  # From forehead to chin
-        
-        # Detailed angle calculations
-        def calculate_angle(p1, p2, p3):
-            """Calculate angle between three points"""
-            ba = p1 - p2
-            bc = p3 - p2
-            cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-            angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
-            return np.degrees(angle)
-        
-        # Jaw angle calculation
-        jaw_angle_left = calculate_angle(jaw_left, jaw_bottom, cheekbone_left)
-        jaw_angle_right = calculate_angle(jaw_right, jaw_bottom, cheekbone_right)
-        avg_jaw_angle = (jaw_angle_left + jaw_angle_right) / 2
-        
-        # Advanced ratio calculations
-        ratios = {
-            'length_to_width': face_length / cheekbone_width,
-            'forehead_to_jaw': forehead_width / jaw_width,
-            'cheekbone_to_jaw': cheekbone_width / jaw_width,
-            'face_aspect_ratio': face_length / (forehead_width + jaw_width)
-        }
+        face_shape, session, decided = self.face_sessions.add(face_id, shape, now, scores, known, ratios)
         
-        # Enhanced face shape detection logic
-        def classify_face_shape():
-            # Comprehensive classification criteria
-            if (ratios['length_to_width'] <= 1.2 and 
-                ratios['cheekbone_to_jaw'] >= 0.9 and 
-                avg_jaw_angle < 70):
-                return "Round"
-            
-            elif (ratios['length_to_width'] >= 1.3 and 
-                  ratios['cheekbone_to_jaw'] >= 0.8 and 
-                  ratios['forehead_to_jaw'] > 1.1):
-                return "Oval"
-            
-            elif (forehead_width > cheekbone_width and 
-                  cheekbone_width > jaw_width and 
-                  avg_jaw_angle > 80):
-                return "Heart"
-            
-            elif (math.isclose(forehead_width, jaw_width, rel_tol=0.1) and 
-                  avg_jaw_angle > 75):
-                return "Square"
-            
-            elif (cheekbone_width > forehead_width and 
-                  cheekbone_width > jaw_width and 
-                  ratios['length_to_width'] > 1.2):
-                return "Diamond"
-            
+        # Show the result for whichever face finished most recently
+        if decided:
+            self.message_shown = True
+            if session.recalled:
+                result_text = "Welcome back!\n"
             else:
-                return "Cannot determine"
-        
-        # Get initial shape classification
-        shape = classify_face_shape()
-        
-        # Initialize shape history if not exists
-        if not hasattr(self, 'shape_history'):
-            self.shape_history = []
-            self.shape_start_time = time.time()
-            self.timer_started = True
-
-        # Store shape in history
-        self.shape_history.append(shape)
-        
-        # Check if we have consistent readings
-        if not self.timer_paused:
-            self.elapsed_time = time.time() - self.shape_start_time
-        time_threshold = 10.0
-        
-        # Update timer display
-        if self.timer_started and self.elapsed_time < time_threshold:
-            remaining_time = max(0, int(time_threshold - self.elapsed_time))
-            self.timer_label.config(text=f"Analysis in progress... {remaining_time}s")
-        
-        if self.elapsed_time >= time_threshold:
-            # Get most common shape in history with higher threshold
-            from collections import Counter
-            shape_counts = Counter(self.shape_history)
-            most_common = shape_counts.most_common(1)[0]
-            most_common_shape = most_common[0]
-            confidence = most_common[1] / len(self.shape_history)
-            
-            # Only show result if confidence is high enough
-            if confidence > 0.6 and not getattr(self, 'message_shown', False):
-                self.message_shown = True
-                self.timer_label.config(text="Analysis complete!")
-                result_text = f"Face Shape Analysis Complete!\nYour face shape is: {most_common_shape}\n\n"
-                result_text += self.get_face_shape_description(most_common_shape)
-                self.result_label.config(text=result_text)
-                self.restart_button.config(state=tk.NORMAL)
-                self.update_hairstyle_images(most_common_shape)
-            
-            return most_common_shape
-        
-        return shape
+                result_text = "Face Shape Analysis Complete!\n"
+                if self.identities is not None and session.confidence >= self.enroll_confidence:
+                    self.identities.enroll(face_id, session.result, session.confidence)
+            if len(self.face_sessions) > 1:
+                result_text += f"Face #{face_id}: "
+            result_text += f"Your face shape is: {session.result}"
+            if self.models.shape_model.calibrated:
+                result_text += f" ({session.confidence:.0%} confidence)"
+            result_text += "\n\n"
+            result_text += self.get_face_shape_description(session.result)
+            self.result_label.config(text=result_text)
+            self.restart_button.config(state=tk.NORMAL)
+            self.update_hairstyle_images(session.result)
+            self.store_result(session, now)
+        
+        return face_shape
+
+    def store_result(self, session, now):
+        """Queue a finished analysis for the results database."""
+        if self.results is not None:
+            self.results.record_session(session, now, self.current_hairstyles)
+
+    def update_analysis_status(self, now):
+        """Drop faces that left the frame and refresh the timer label."""
+        self.face_sessions.prune(now)
+        
+        pending = self.face_sessions.pending()
+        if pending:
+            if len(self.face_sessions) == 1:
+                text = f"Analysis in progress... {pending[0].remaining()}s"
+            else:
+                text = "Analysis in progress... " + ", ".join(
+                    f"#{s.face_id}: {s.remaining()}s" for s in pending)
+            self.timer_label.config(text=text)
+        elif self.face_sessions:
+            self.timer_label.config(text="Analysis complete!")
+
     def get_face_shape_description(self, face_shape):
         """
         Provides a detailed description for each face shape
@@ -518,81 +538,335 @@ class FaceShapeRecognizer:
         
         return descriptions.get(face_shape, "No description available.")
 
-    def process_frame(self):
+    def update_display(self):
+        """Draw the newest inference result; runs on the Tk thread only."""
         if not self.is_running:
             return
 
-        ret, frame = self.cap.read()
-        if not ret or frame is None:
-            self.root.after(10, self.process_frame)
+        profiler = self.profiler
+        result = self.pipeline.results.get_nowait()
+        if result is not None:
+            latency_ms = None
+            if result.timestamp is not None:
+                # Read-to-display latency of the frame being shown
+                latency_ms = (time.perf_counter() - result.timestamp) * 1000
+                profiler.record("latency", latency_ms)
+            # Mirror and convert to RGB in one pass; overlays are drawn in RGBA
+            with profiler.stage("to_rgb"):
+                self.video_sink.load(result.frame, mirror=result.mirrored)
+            now = time.time()
+            shown = []
+            for face_id, (face, points), shape, scores, known, ratios in zip(
+                    result.face_ids, result.faces, result.labels, result.scores, result.identities, result.ratios):
+                # Update this face's vote and timer
+                with profiler.stage("vote"):
+                    face_shape = self.determine_face_shape(face_id, shape, now, scores, known, ratios)
+                shown.append((face_id, face_shape))
+
+                with profiler.stage("draw"):
+                    # Draw the face box, landmarks and shape, numbered when
+                    # several faces are in view
+                    text = face_shape if len(result.faces) == 1 else f"#{face_id} {face_shape}"
+                    self.video_sink.draw_face(face, points, text)
+
+            # Update GUI labels
+            if len(shown) == 1:
+                self.info_label.config(text=f"Face Shape: {shown[0][1]}")
+            elif shown:
+                self.info_label.config(text="Face Shapes: " + ", ".join(
+                    f"#{face_id} {face_shape}" for face_id, face_shape in shown))
+            elif result.mode == 'idle' and not self.message_shown:
+                self.info_label.config(text="Waiting for someone to step in front of the camera")
+            self.update_analysis_status(now)
+            if self.recorder is not None:
+                with profiler.stage("record"):
+                    self.recorder.write(result, now, [face_shape for _, face_shape in shown], latency_ms)
+
+            if self.profile_overlay:
+                self.draw_profile_overlay()
+
+            # Update the label's image in place
+            with profiler.stage("photoimage"):
+                self.video_sink.show()
+            profiler.tick("display")
+        elif self.pipeline.finished:
+            # Recorded media played to the end and every frame was shown
+            self.stop_video()
+            self.info_label.config(text="End of video source")
             return
 
-        frame = cv2.flip(frame, 1)  # Mirror the frame
-        
-        # Resize frame to fit screen while maintaining aspect ratio
-        frame = cv2.resize(frame, self.video_size)
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Detect faces using dlib
-        faces = self.detector(gray)
-        for face in faces:
-            # Get landmarks
-            landmarks = self.predictor(gray, face)
-
-            # Calculate face shape
-            face_shape = self.determine_face_shape(landmarks)
-
-            # Draw the face bounding box and landmarks
-            cv2.rectangle(frame, (face.left(), face.top()), (face.right(), face.bottom()), (255, 0, 0), 2)
-            for i in range(68):
-                cv2.circle(frame, (landmarks.part(i).x, landmarks.part(i).y), 1, (0, 255, 0), -1)
-
-            # Display face shape
-            cv2.putText(frame, face_shape, (face.left(), face.top() - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        # Poll less often while the governor has nothing but motion checks to show
+        idle = self.governor is not None and self.governor.idle
+        self.root.after(self.idle_display_interval if idle else self.display_interval, self.update_display)
 
-            # Update GUI label
-            self.info_label.config(text=f"Face Shape: {face_shape}")
-
-        # Convert frame for display
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(cv2image)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_label.imgtk = imgtk
-        self.video_label.configure(image=imgtk)
-
-        self.root.after(10, self.process_frame)
+    def draw_profile_overlay(self):
+        """Draw FPS and per-stage p50/p95 latencies in the frame's top-left corner."""
+        self.video_sink.draw_lines(self.profiler.overlay_lines())
 
     def start_video(self):
+        if self.detector is None or self.source is None:
+            # Still loading; check_loading starts the video when ready
+            self.start_pending = True
+            return
         if not self.is_running:
+            from display import VideoSink
+            from pipeline import FramePipeline, LandmarkPool, StaticFaceCache
+            from tracking import FaceTracker
+            
             self.info_label.config(text="Initializing camera...")
             self.is_running = True
-            self.timer_paused = False
-            if hasattr(self, 'shape_start_time'):
-                # Resume timer from where it was paused
-                self.shape_start_time = time.time() - self.elapsed_time
-            self.video_thread = threading.Thread(target=self.process_frame)
-            self.video_thread.start()
+            if self.video_sink is None:
+                # Reuses one buffer and one Tk image for every frame
+                self.video_sink = VideoSink(self.video_label, self.video_size)
+            if self.face_sessions is None:
+                from voting import FaceSessions, scoring_for
+                self.face_sessions = FaceSessions(self.analysis_time, self.face_timeout,
+                                                  scoring_for(self.models.shape_model, self.scoring),
+                                                  **self.vote_options)
+            now = time.time()
+            for session in self.face_sessions.values():
+                # Resume timers from where they were paused
+                session.resume(now)
+            if self.tracker is None:
+                self.tracker = FaceTracker(self.detector, self.detect_every, self.track_min_confidence)
+            if self.static_cache is None and self.static_threshold > 0:
+                self.static_cache = StaticFaceCache(self.static_threshold, self.max_reuse)
+            if self.smoother is None and self.smoothing is not None:
+                from smoothing import LandmarkSmoother
+                self.smoother = LandmarkSmoother(**self.smoothing)
+            from landmarks import EYE_PARTS
+            if self.identity_options is not None and not self.predictor.covers(EYE_PARTS):
+                print("Returning-customer recognition disabled: the landmark model has no eye points")
+                self.identity_options = None
+            if self.identities is None and self.identity_options is not None:
+                from identity import IdentityCache
+                self.identities = IdentityCache.open(**self.identity_options)
+                if self.identities is None:
+                    self.identity_options = None
+            if self.recorder is None and self.record_path:
+                self.start_recording()
+            if self.results is None and self.results_db is not False:
+                from analytics import RESULTS_PATH, ResultStore
+                self.results = ResultStore.open(self.results_db or RESULTS_PATH, kiosk=self.kiosk_id,
+                                                source=self.source.describe())
+                if self.results is None:
+                    self.results_db = False
+            if self.governor is None and self.governor_options is not False:
+                from governor import RateGovernor
+                self.governor = RateGovernor(on_transition=self.report_transition, **self.governor_options)
+            elif self.governor is not None:
+                self.governor.reset()
+            if self.landmark_pool is None and self.landmark_workers > 1:
+                self.landmark_pool = LandmarkPool(self.predictor, self.models.predictor_path, self.landmark_workers)
+            self.pipeline = FramePipeline(self.source, self.video_size, self.tracker, self.predictor,
+                                          self.detection_width, self.profiler, self.landmark_pool,
+                                          static_cache=self.static_cache, smoother=self.smoother,
+                                          shape_model=self.models.shape_model, identities=self.identities,
+                                          governor=self.governor)
+            self.pipeline.start()
+            self.root.after(self.display_interval, self.update_display)
+
+    def start_recording(self):
+        from recording import SessionRecorder
+        from voting import scoring_for
+        metadata = {
+            'source': self.source.describe(),
+            'video_size': list(self.video_size),
+            'detector': self.detector_backend,
+            'detect_every': self.detect_every,
+            'detection_width': self.detection_width,
+            'static_threshold': self.static_threshold,
+            'smoothing': self.smoothing,
+            'shape_model': self.models.shape_model.info if self.models.shape_model is not None else None,
+            'voting': {
+                'duration': self.analysis_time,
+                'timeout': self.face_timeout,
+                'scoring': scoring_for(self.models.shape_model, self.scoring),
+                'requested_scoring': self.scoring,
+                'vote_options': self.vote_options,
+            },
+        }
+        try:
+            self.recorder = SessionRecorder(self.record_path, metadata,
+                                            self.video_size if self.record_video else None)
+            print(f"Recording session to {self.record_path}")
+        except OSError as e:
+            print(f"Could not record session: {e}")
+            self.record_path = None
+
+    def report_transition(self, old, new, reason):
+        """Log a governor mode change; called on the inference thread."""
+        print(f"Frame rate governor: {old} -> {new} ({reason})")
 
     def stop_video(self):
         self.is_running = False
-        self.timer_paused = True
-        if hasattr(self, 'video_thread'):
-            self.video_thread.join()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            print(f"Inference cost: {self.pipeline.tracker.summary()}")
+            print(f"Frames: {self.pipeline.summary()}")
+            if self.governor is not None:
+                print(f"Governor: {self.governor.summary()}")
+            self.pipeline = None
 
     def run(self):
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        # Process first frame immediately
-        self.root.after(100, self.process_frame)
+        # Start video processing after a short delay
+        self.root.after(100, self.start_video)
         self.root.mainloop()
 
-    def on_closing(self):
+    def shutdown(self):
+        """Stop video and release the source and worker processes, leaving windows alone."""
         self.stop_video()
-        if hasattr(self, 'cap'):
-            self.cap.release()
-        self.root.destroy()
+        if self.profile_dump:
+            try:
+                self.profiler.dump(self.profile_dump)
+                print(f"Wrote stage timings to {self.profile_dump}")
+            except OSError as e:
+                print(f"Could not write stage timings: {e}")
+        if self.identities is not None:
+            self.identities.save()
+        if self.results is not None:
+            self.results.close()
+            print(self.results.summary())
+            self.results = None
+        if self.recorder is not None:
+            self.recorder.close()
+            print(self.recorder.summary())
+            self.recorder = None
+        if self.landmark_pool is not None:
+            self.landmark_pool.close()
+            self.landmark_pool = None
+        if self.source is not None:
+            self.source.release()
+            self.source = None
+
+    def on_closing(self):
+        self.shutdown()
+        # Closing the recognizer ends the app, menu included
+        (self.master if self.master is not None else self.root).destroy()
 
 if __name__ == "__main__":
-    app = FaceShapeRecognizer()
+    import argparse
+    from detectors import add_detector_arguments, detector_options
+    from sources import add_source_arguments
+    parser = argparse.ArgumentParser(description="Face shape recognition")
+    parser.add_argument("--detect-every", type=int, default=10,
+                        help="Run the face detector every N frames and track in between (1 = every frame)")
+    parser.add_argument("--track-min-confidence", type=float, default=7.0,
+                        help="Re-detect when tracker confidence drops below this value")
+    parser.add_argument("--detection-width", type=int, default=320,
+                        help="Width in pixels to downscale frames to for face detection (0 = full resolution)")
+    add_source_arguments(parser)
+    add_detector_arguments(parser)
+    parser.add_argument("--landmark-workers", type=int, default=1,
+                        help="Processes predicting landmarks in parallel when several faces are in view")
+    parser.add_argument("--static-threshold", type=float, default=2.0,
+                        help="Reuse landmarks while a face region changes by at most this many grey levels (0 = off)")
+    parser.add_argument("--max-reuse", type=int, default=15,
+                        help="Predict landmarks again after reusing them for this many frames in a row")
+    parser.add_argument("--smooth", action="store_true",
+                        help="Filter landmarks over time (One Euro) before classifying")
+    parser.add_argument("--smooth-min-cutoff", type=float, default=1.0,
+                        help="Landmark filter cutoff at rest in Hz; lower is smoother")
+    parser.add_argument("--smooth-beta", type=float, default=0.05,
+                        help="How quickly the landmark filter follows movement")
+    parser.add_argument("--vote-labels", action="store_true",
+                        help="Count per-frame labels instead of accumulating shape probabilities")
+    parser.add_argument("--decision-confidence", type=float, default=0.9,
+                        help="Shape probability needed to finish the analysis early (fitted shape models only)")
+    parser.add_argument("--predictor", metavar="PATH",
+                        help="dlib shape predictor, 68-point or reduced from train_predictor.py (default: "
+                             "tools/shape_predictor_face_shape.dat if present, else the 68-point model)")
+    parser.add_argument("--shape-model", metavar="PATH",
+                        help="Face shape prototypes from fit_shapes.py (default: tools/shape_prototypes.json "
+                             "if present, else built-in)")
+    parser.add_argument("--vote-window", type=int,
+                        help="Only count the most recent N per-frame votes")
+    parser.add_argument("--vote-half-life", type=float,
+                        help="Decay older votes with this half-life in seconds")
+    parser.add_argument("--no-early-decision", action="store_true",
+                        help="Always wait the full analysis time before deciding")
+    parser.add_argument("--results-db", metavar="PATH",
+                        help="SQLite database finished analyses are stored in (default: .cache/results.db; "
+                             "see analytics.py)")
+    parser.add_argument("--no-results", action="store_true", help="Do not store finished analyses")
+    parser.add_argument("--kiosk-id", help="Name stored with each result (default: host name)")
+    parser.add_argument("--target-fps", type=float, default=15.0,
+                        help="Most frames analyzed per second; fewer when frames are expensive (0 = no cap)")
+    parser.add_argument("--idle-after", type=float, default=10.0,
+                        help="Seconds without a face before only checking for motion (0 = never idle)")
+    parser.add_argument("--idle-fps", type=float, default=2.0,
+                        help="Motion checks per second while idle")
+    parser.add_argument("--motion-threshold", type=float, default=4.0,
+                        help="Mean grey-level change that wakes the analysis from idle")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Analyze every frame as fast as possible and never idle")
+    parser.add_argument("--remember-faces", action="store_true",
+                        help="Recognise returning customers and give them their stored shape at once "
+                             "(keeps LBPH face histograms, not images, in .cache/)")
+    parser.add_argument("--identity-threshold", type=float, default=50.0,
+                        help="Largest LBPH distance accepted as the same person; lower is stricter")
+    parser.add_argument("--identity-max-age-days", type=float, default=30.0,
+                        help="Forget customers not seen for this many days")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Log every displayed frame's faces, landmarks and labels for replay with recording.py")
+    parser.add_argument("--record-video", action="store_true",
+                        help="Also keep the frames as a compressed video next to the --record log")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-stage timings")
+    parser.add_argument("--profile-overlay", action="store_true",
+                        help="Show FPS and per-stage p50/p95 on the video")
+    parser.add_argument("--profile-dump", metavar="PATH",
+                        help="Write stage timings on exit (.csv, or .json for samples plus summary)")
+    args = parser.parse_args()
+    if args.record_video and not args.record:
+        parser.error("--record-video needs --record PATH")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    app = FaceShapeRecognizer(detect_every=args.detect_every,
+                              track_min_confidence=args.track_min_confidence,
+                              detection_width=args.detection_width,
+                              detector_backend=args.detector,
+                              detector_options=options,
+                              vote_options={
+                                  'window': args.vote_window,
+                                  'half_life': args.vote_half_life,
+                                  'min_time': float('inf') if args.no_early_decision else 2.0,
+                              },
+                              scoring={
+                                  'threshold': args.decision_confidence,
+                                  'half_life': args.vote_half_life,
+                                  'min_time': float('inf') if args.no_early_decision else 0.5,
+                              },
+                              vote_labels=args.vote_labels,
+                              shape_model_path=args.shape_model,
+                              predictor_path=args.predictor,
+                              record=args.record,
+                              record_video=args.record_video,
+                              identity_options={
+                                  'threshold': args.identity_threshold,
+                                  'max_age': args.identity_max_age_days * 24 * 3600,
+                              } if args.remember_faces else None,
+                              results_db=False if args.no_results else args.results_db,
+                              kiosk_id=args.kiosk_id,
+                              governor_options=False if args.no_governor else {
+                                  'target_fps': args.target_fps,
+                                  'idle_after': args.idle_after,
+                                  'idle_fps': args.idle_fps,
+                                  'motion_threshold': args.motion_threshold,
+                              },
+                              profile=args.profile,
+                              profile_overlay=args.profile_overlay,
+                              profile_dump=args.profile_dump,
+                              source=args.source,
+                              realtime=args.realtime,
+                              loop=args.loop,
+                              landmark_workers=args.landmark_workers,
+                              static_threshold=args.static_threshold,
+                              max_reuse=args.max_reuse,
+                              smoothing={
+                                  'min_cutoff': args.smooth_min_cutoff,
+                                  'beta': args.smooth_beta,
+                              } if args.smooth else None)
     app.run()
\ No newline at end of file
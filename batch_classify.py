@@ -0,0 +1,231 @@
+"""
+Headless batch face shape classifier.
+
+Walks one or more directory trees, classifies every image with a pool of
+worker processes (each holding its own face detector and dlib predictor) and
+streams one JSON object per image, so memory stays flat at any corpus size.
+
+Example:
+    python batch_classify.py photos/ -o results.jsonl --workers 4
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from detectors import add_detector_arguments, create_detector, detector_options
+from face_shape import (PREDICTOR_PATH, RATIO_KEYS, SHAPES, compute_features, measure_face,
+                        score_points, scores_to_labels)
+from gallery import IMAGE_EXTENSIONS
+from landmarks import LandmarkPredictor
+
+# Per-process models, set up once by init_worker
+_detector = None
+_predictor = None
+
+
+def init_worker(predictor_path, detector_name='hog', options=None):
+    global _detector, _predictor
+    _detector = create_detector(detector_name, **(options or {}))
+    _predictor = LandmarkPredictor(predictor_path)
+
+
+def iter_images(roots):
+    """Yield image paths under each root in a stable order."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(dirpath, name)
+
+
+def _jittered_boxes(face, frac=0.05):
+    """The face box plus copies shifted by `frac` of its size in each direction."""
+    dx = max(1, int(round(face.width() * frac)))
+    dy = max(1, int(round(face.height() * frac)))
+    return [face] + [dlib.rectangle(face.left() + x, face.top() + y, face.right() + x, face.bottom() + y)
+                     for x, y in ((-dx, 0), (dx, 0), (0, -dy), (0, dy))]
+
+
+def classify_gray(image, record, confidence=False):
+    """
+    Classify the largest face in a decoded grayscale image
+
+    'scores' holds the shape model's probability for every shape and
+    'confidence' the probability of the chosen one. With `confidence`,
+    landmarks are also predicted for slightly shifted copies of the face
+    box and the probabilities are averaged over all of them, so landmark
+    jitter is accounted for; 'agreement' is then the share of copies whose
+    own label matches.
+
+    Args:
+        image (np.ndarray): Grayscale image
+        record (dict): Record to add faces, shape, ratios, box and timings to
+        confidence (bool): Also average the scores over jittered face boxes
+
+    Returns:
+        dict: The same record
+    """
+    start = time.perf_counter()
+    faces = _detector(image)
+    detected = time.perf_counter()
+    record['faces'] = len(faces)
+    if not faces:
+        record['shape'] = None
+    else:
+        face = max(faces, key=lambda r: r.width() * r.height())
+        points = _predictor(image, face)
+        features = compute_features(points)
+        if confidence:
+            jittered = np.stack([points] + [_predictor(image, box)
+                                            for box in _jittered_boxes(face)[1:]])
+            scores, _ = score_points(jittered)
+            labels = scores_to_labels(scores)
+            scores = scores.mean(axis=0)
+        else:
+            scores, _ = score_points(points)
+            scores = scores[0]
+        record['shape'] = str(scores_to_labels(scores)[0])
+        if np.all(np.isfinite(scores)):
+            record['confidence'] = float(scores.max())
+            record['scores'] = {shape: round(float(p), 4) for shape, p in zip(SHAPES, scores)}
+        if confidence:
+            record['agreement'] = float(np.mean(labels == record['shape']))
+        record['ratios'] = {key: float(features[key][0]) for key in RATIO_KEYS}
+        record['box'] = [face.left(), face.top(), face.right(), face.bottom()]
+    done = time.perf_counter()
+
+    timing = record.setdefault('timing_ms', {})
+    timing['detect'] = round((detected - start) * 1000, 2)
+    timing['landmarks_and_classify'] = round((done - detected) * 1000, 2)
+    return record
+
+
+def classify_image(path):
+    """
+    Classify the largest face in one image
+
+    Args:
+        path (str): Image file path
+
+    Returns:
+        dict: JSON-serialisable record with shape, ratios and stage timings
+    """
+    record = {'path': path}
+    start = time.perf_counter()
+    try:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("could not decode image")
+        record['timing_ms'] = {'load': round((time.perf_counter() - start) * 1000, 2)}
+        classify_gray(image, record)
+        record['timing_ms']['total'] = round((time.perf_counter() - start) * 1000, 2)
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def measure_image(path):
+    """
+    Measure the largest face in one image
+
+    Args:
+        path (str): Image file path
+
+    Returns:
+        dict: measure_face output, or None if the image has no readable face
+    """
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    faces = _detector(image)
+    if not faces:
+        return None
+    face = max(faces, key=lambda r: r.width() * r.height())
+    return measure_face(_predictor(image, face))
+
+
+def classify_bytes(data, confidence=True):
+    """
+    Classify the largest face in an encoded image (PNG, JPEG, ...)
+
+    Args:
+        data (bytes): Encoded image file contents
+        confidence (bool): Also average the scores over jittered face boxes (see classify_gray)
+
+    Returns:
+        dict: JSON-serialisable record like classify_image's, without a path
+    """
+    record = {}
+    start = time.perf_counter()
+    try:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("could not decode image")
+        record['timing_ms'] = {'load': round((time.perf_counter() - start) * 1000, 2)}
+        classify_gray(image, record, confidence)
+        record['timing_ms']['total'] = round((time.perf_counter() - start) * 1000, 2)
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify face shapes for every image under the given paths.")
+    parser.add_argument("paths", nargs="+", help="Image files or directories to scan recursively")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="Path to the dlib shape predictor (68-point or reduced)")
+    parser.add_argument("--chunk", type=int, default=256,
+                        help="Paths handed to the pool at a time; bounds queued work")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.predictor):
+        parser.error(f"Predictor file not found at: {args.predictor}")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    count = 0
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers, initializer=init_worker,
+                                  initargs=(args.predictor, args.detector, options)) as pool:
+            paths = iter_images(args.paths)
+            # Feed the pool in bounded chunks so the path list is never
+            # materialised in full
+            while True:
+                chunk = list(itertools.islice(paths, args.chunk))
+                if not chunk:
+                    break
+                for record in pool.imap_unordered(classify_image, chunk):
+                    out.write(json.dumps(record) + "\n")
+                    count += 1
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Classified {count} images in {elapsed:.1f}s ({rate:.1f} images/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
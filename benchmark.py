@@ -0,0 +1,279 @@
+"""
+Reproducible throughput benchmark without a camera or display.
+
+Feeds recorded videos and still images through the same path as the live
+app (mirror, resize, detection/tracking, landmarks, classification and
+shape voting) and writes a JSON report with frames/sec, per-stage latency
+percentiles, peak RSS and classification stability, so runs can be
+compared over time.
+
+Example:
+    python benchmark.py Male Female session.mp4 -o bench.json
+"""
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+
+from detectors import add_detector_arguments, create_detector, detector_options
+from face_shape import PREDICTOR_PATH, default_model
+from gallery import IMAGE_EXTENSIONS
+from landmarks import LandmarkPredictor
+from pipeline import FrameAnalyzer, StaticFaceCache
+from profiling import StageProfiler
+from smoothing import LandmarkSmoother
+from tracking import FaceTracker
+from voting import ScoreAccumulator, ShapeVoter, scoring_for
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_sources(paths):
+    """Split the given paths into video files and still images."""
+    videos, images = [], []
+    for root in paths:
+        if os.path.isfile(root):
+            if root.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append(root)
+            elif root.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(root)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(path)
+                elif name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(path)
+    return videos, images
+
+
+class Benchmark:
+    def __init__(self, detector, predictor, display_size, detect_every, detection_width, profiler,
+                 static_threshold=0.0, max_reuse=15, smoothing=None):
+        self.detector = detector
+        self.predictor = predictor
+        self.display_size = display_size
+        self.detect_every = detect_every
+        self.detection_width = detection_width
+        self.static_threshold = static_threshold
+        self.max_reuse = max_reuse
+        self.smoothing = smoothing
+        self.profiler = profiler
+        self.frames = 0
+        self.seconds = 0.0
+
+    def _analyzer(self, detect_every, reuse=False):
+        tracker = FaceTracker(self.detector, detect_every)
+        cache = smoother = None
+        if reuse and self.static_threshold > 0:
+            cache = StaticFaceCache(self.static_threshold, self.max_reuse)
+        if reuse and self.smoothing is not None:
+            smoother = LandmarkSmoother(**self.smoothing)
+        return FrameAnalyzer(tracker, self.predictor, self.detection_width, self.profiler,
+                             mirror=True, static_cache=cache, smoother=smoother)
+
+    def _run_frame(self, analyzer, frame, timestamp=None):
+        """Resize, analyze (mirrored) and classify one frame; returns the first face's label and scores."""
+        start = time.perf_counter()
+        with self.profiler.stage("resize"):
+            display = cv2.resize(frame, self.display_size)
+        result = analyzer.analyze(frame, display, timestamp=timestamp)
+        self.seconds += time.perf_counter() - start
+        self.frames += 1
+        if not result.labels:
+            return None, None
+        return result.labels[0], result.scores[0]
+
+    def run_video(self, path, max_frames=None):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            return {'path': path, 'error': "could not open video"}
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        analyzer = self._analyzer(self.detect_every, reuse=True)
+        voter = ShapeVoter()
+        accumulator = ScoreAccumulator(**scoring_for(default_model(), {}))
+        labels = []
+        settled_at = scored_settled_at = None
+        index = 0
+        try:
+            while max_frames is None or index < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                elapsed = index / fps
+                label, scores = self._run_frame(analyzer, frame, elapsed)
+                index += 1
+                if label is None:
+                    continue
+                labels.append(label)
+                voter.add(label, elapsed)
+                accumulator.add(scores, elapsed)
+                if settled_at is None and voter.is_settled(elapsed):
+                    settled_at = elapsed
+                if scored_settled_at is None and accumulator.is_settled(elapsed):
+                    scored_settled_at = elapsed
+        finally:
+            cap.release()
+
+        report = {'path': path, 'frames': index, 'frames_with_face': len(labels)}
+        report.update(stability(labels))
+        shape, confidence = voter.leader()
+        report['decision'] = shape
+        report['decision_confidence'] = confidence
+        report['seconds_to_settle'] = settled_at
+        # The same video decided by accumulated shape probabilities
+        shape, confidence = accumulator.leader()
+        report['scored_decision'] = shape
+        report['scored_confidence'] = confidence
+        report['scored_seconds_to_settle'] = scored_settled_at
+        return report
+
+    def run_images(self, paths, repeat=1):
+        # Still images have no temporal context, so detect on every one
+        analyzer = self._analyzer(1)
+        per_image = {}
+        for _ in range(repeat):
+            for path in paths:
+                frame = cv2.imread(path)
+                if frame is None:
+                    continue
+                per_image.setdefault(path, []).append(self._run_frame(analyzer, frame)[0])
+
+        labels = [runs[0] for runs in per_image.values() if runs[0] is not None]
+        deterministic = sum(1 for runs in per_image.values() if len(set(runs)) == 1)
+        return {
+            'images': len(per_image),
+            'images_with_face': len(labels),
+            'shape_counts': dict(collections.Counter(labels)),
+            'deterministic_share': deterministic / len(per_image) if per_image else None,
+        }
+
+
+def stability(labels):
+    """Agreement with the majority label and how often the label flips between frames."""
+    if not labels:
+        return {'majority': None, 'majority_share': None, 'flip_rate': None}
+    majority, count = collections.Counter(labels).most_common(1)[0]
+    flips = sum(1 for a, b in zip(labels, labels[1:]) if a != b)
+    return {
+        'majority': majority,
+        'majority_share': count / len(labels),
+        'flip_rate': flips / (len(labels) - 1) if len(labels) > 1 else 0.0,
+    }
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face shape pipeline on recorded media.")
+    parser.add_argument("paths", nargs="+", help="Video files, images or directories of either")
+    parser.add_argument("-o", "--output", help="JSON report path (default: stdout)")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="Path to the dlib shape predictor (68-point or reduced)")
+    parser.add_argument("--display-size", type=parse_size, default=(640, 480),
+                        help="Display frame size WxH, as the app would resize to")
+    parser.add_argument("--detect-every", type=int, default=10, help="Detector cadence for videos")
+    parser.add_argument("--detection-width", type=int, default=320, help="Detection width (0 = full resolution)")
+    parser.add_argument("--static-threshold", type=float, default=0.0,
+                        help="Reuse landmarks of unchanged faces in videos, as the app does (0 = off)")
+    parser.add_argument("--max-reuse", type=int, default=15, help="Longest run of reused frames")
+    parser.add_argument("--smooth", action="store_true", help="Filter landmarks over time in videos")
+    parser.add_argument("--smooth-min-cutoff", type=float, default=1.0, help="Landmark filter cutoff at rest (Hz)")
+    parser.add_argument("--smooth-beta", type=float, default=0.05, help="Landmark filter speed coefficient")
+    parser.add_argument("--max-frames", type=int, help="Stop each video after this many frames")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the still images")
+    parser.add_argument("--label", help="Free-form run label stored in the report")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    videos, images = collect_sources(args.paths)
+    if not videos and not images:
+        parser.error("No videos or images found")
+
+    load_start = time.perf_counter()
+    detector = create_detector(args.detector, **options)
+    predictor = LandmarkPredictor(args.predictor)
+    load_seconds = time.perf_counter() - load_start
+
+    profiler = StageProfiler(enabled=True, capacity=100000)
+    bench = Benchmark(detector, predictor, args.display_size, args.detect_every,
+                      args.detection_width, profiler, args.static_threshold, args.max_reuse,
+                      {'min_cutoff': args.smooth_min_cutoff, 'beta': args.smooth_beta} if args.smooth else None)
+
+    video_reports = [bench.run_video(path, args.max_frames) for path in videos]
+    image_report = bench.run_images(images, args.repeat) if images else None
+
+    summary = profiler.summary()
+    report = {
+        'label': args.label,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'settings': {
+            'detector': args.detector,
+            'predictor': predictor.describe(),
+            'detect_every': args.detect_every,
+            'detection_width': args.detection_width,
+            'static_threshold': args.static_threshold,
+            'max_reuse': args.max_reuse,
+            'smoothing': {'min_cutoff': args.smooth_min_cutoff, 'beta': args.smooth_beta} if args.smooth else None,
+            'display_size': list(args.display_size),
+        },
+        'model_load_seconds': load_seconds,
+        'frames': bench.frames,
+        'frames_per_sec': bench.frames / bench.seconds if bench.seconds > 0 else 0.0,
+        'stages_ms': summary['stages'],
+        'peak_rss_mb': peak_rss_mb(),
+        'videos': video_reports,
+        'images': image_report,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"{bench.frames} frames at {report['frames_per_sec']:.1f} fps; report written to {args.output}",
+              file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
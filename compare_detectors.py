@@ -0,0 +1,129 @@
+"""
+Compare face detector backends on a folder of images.
+
+Reports images/sec, faces/sec and recall for each backend. Recall is
+measured against an optional JSON labels file mapping image paths (relative
+to the folder) to lists of [left, top, right, bottom] boxes; a labelled box
+counts as found when a detection overlaps it with IoU >= --iou. Without a
+labels file every image is assumed to contain exactly one face, which suits
+the bundled hairstyle gallery.
+
+Example:
+    python compare_detectors.py Male Female --backends hog cascade
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from batch_classify import iter_images
+from detectors import add_detector_arguments, create_detector, detector_options
+
+
+def iou(a, b):
+    """Intersection over union of two [left, top, right, bottom] boxes"""
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def load_images(paths, max_width):
+    """Decode every image once up front so timings cover detection only."""
+    images = []
+    for path in iter_images(paths):
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        scale = 1.0
+        if max_width and gray.shape[1] > max_width:
+            scale = max_width / gray.shape[1]
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        images.append((path, gray, scale))
+    return images
+
+
+def evaluate(detector, images, labels, roots, iou_threshold, repeat):
+    detections = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path, gray, _ in images:
+            detections[path] = detector(gray)
+    elapsed = time.perf_counter() - start
+
+    found = expected = 0
+    for path, _, scale in images:
+        boxes = [[r.left() / scale, r.top() / scale, r.right() / scale, r.bottom() / scale]
+                 for r in detections[path]]
+        truth = None
+        if labels is not None:
+            for root in roots:
+                truth = labels.get(os.path.relpath(path, root))
+                if truth is not None:
+                    break
+            truth = truth or []
+        if truth is None:
+            expected += 1
+            found += 1 if boxes else 0
+        else:
+            expected += len(truth)
+            found += sum(1 for t in truth if any(iou(t, b) >= iou_threshold for b in boxes))
+
+    runs = len(images) * repeat
+    total_faces = sum(len(d) for d in detections.values()) * repeat
+    return {
+        'images_per_sec': runs / elapsed if elapsed > 0 else 0.0,
+        'faces_per_sec': total_faces / elapsed if elapsed > 0 else 0.0,
+        'ms_per_image': elapsed * 1000 / runs if runs else 0.0,
+        'recall': found / expected if expected else 0.0,
+        'detections': sum(len(d) for d in detections.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare face detector backends for speed and recall.")
+    parser.add_argument("paths", nargs="+", help="Image files or directories")
+    parser.add_argument("--labels", help="JSON file mapping relative image paths to face boxes")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for a labelled face to count as found")
+    parser.add_argument("--max-width", type=int, default=640,
+                        help="Downscale wider images to this width before detection (0 = no scaling)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the images for steadier timings")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    add_detector_arguments(parser, compare=["hog", "cascade"])
+    args = parser.parse_args(argv)
+
+    labels = None
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    images = load_images(args.paths, args.max_width)
+    if not images:
+        parser.error("No readable images found")
+
+    results = {}
+    for name in args.backends:
+        try:
+            options = detector_options(args, name)
+        except ValueError as e:
+            parser.error(str(e))
+        detector = create_detector(name, **options)
+        results[name] = evaluate(detector, images, labels, args.paths, args.iou, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(images)} images, {args.repeat} pass(es)")
+    print(f"{'backend':<10}{'img/s':>10}{'faces/s':>10}{'ms/img':>10}{'recall':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['images_per_sec']:>10.1f}{r['faces_per_sec']:>10.1f}"
+              f"{r['ms_per_image']:>10.1f}{r['recall']:>10.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Compare landmark predictors on a folder of images.
+
+The first predictor is the reference, normally the stock 68-point model.
+Every predictor is timed on the same face boxes, found once with the chosen
+detector. The report covers load time, model size and per-face latency,
+and for the others also agreement with the reference: how often the face
+shape label matches, and the mean distance between their shared landmarks
+as a fraction of the face box width.
+
+Example:
+    python compare_predictors.py Male Female --repeat 3
+    python compare_predictors.py photos/ --predictors tools/shape_predictor_68_face_landmarks.dat my_model.dat
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from face_shape import PREDICTOR_PATH, ShapeModel, score_points, scores_to_labels
+from landmarks import REDUCED_PREDICTOR_PATH, LandmarkPredictor
+
+
+def detect_faces(detector, images):
+    """(image index, box) for the largest face in each image that has one."""
+    faces = []
+    for i, (_, gray, _) in enumerate(images):
+        boxes = detector(gray)
+        if boxes:
+            faces.append((i, max(boxes, key=lambda r: r.width() * r.height())))
+    return faces
+
+
+def evaluate(path, images, faces, repeat, shape_model):
+    start = time.perf_counter()
+    predictor = LandmarkPredictor(path)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        points = [predictor(images[i][1], box) for i, box in faces]
+    elapsed = time.perf_counter() - start
+
+    points = np.stack(points).astype(np.float64)
+    scores, _ = score_points(points, shape_model)
+    runs = len(faces) * repeat
+    return {
+        'predictor': predictor.describe(),
+        'landmarks': len(predictor.parts),
+        'size_mb': predictor.size / 1e6,
+        'load_seconds': load_seconds,
+        'ms_per_face': elapsed * 1000 / runs if runs else 0.0,
+        'faces_per_sec': runs / elapsed if elapsed > 0 else 0.0,
+        'points': points,
+        'labels': scores_to_labels(scores),
+    }
+
+
+def agreement(result, reference, faces):
+    """Share of matching labels, and mean landmark distance over box width on the shared landmarks."""
+    shared = np.isfinite(result['points']).all(axis=2) & np.isfinite(reference['points']).all(axis=2)
+    distance = np.linalg.norm(result['points'] - reference['points'], axis=2)
+    widths = np.array([max(box.width(), 1) for _, box in faces], dtype=np.float64)[:, np.newaxis]
+    error = (distance / widths)[shared]
+    return {
+        'label_agreement': float(np.mean(result['labels'] == reference['labels'])),
+        'point_error': float(error.mean()) if error.size else None,
+    }
+
+
+def compare(paths, images, faces, repeat=1, shape_model=None):
+    """
+    Evaluate every predictor on the same faces and measure its agreement
+    with the first
+
+    Returns:
+        dict: Report per predictor path, in `paths` order
+    """
+    results = {path: evaluate(path, images, faces, repeat, shape_model) for path in paths}
+    reference = results[paths[0]]
+    for result in results.values():
+        result.update(agreement(result, reference, faces))
+    # Only once every agreement is measured, as the reference is one of the results
+    for result in results.values():
+        del result['points'], result['labels']
+    return results
+
+
+def main(argv=None):
+    # Detection needs dlib and OpenCV; compare() only needs the predictors
+    from compare_detectors import load_images
+    from detectors import add_detector_arguments, create_detector, detector_options
+
+    parser = argparse.ArgumentParser(description="Compare landmark predictors for speed, size and agreement.")
+    parser.add_argument("paths", nargs="+", help="Image files or directories")
+    parser.add_argument("--predictors", nargs="+", default=[PREDICTOR_PATH, REDUCED_PREDICTOR_PATH],
+                        help="Predictor files; the first is the reference")
+    parser.add_argument("--max-width", type=int, default=640,
+                        help="Downscale wider images to this width (0 = no scaling)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the faces for steadier timings")
+    parser.add_argument("--shape-model", metavar="PATH", help="Face shape model from fit_shapes.py")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    for path in args.predictors:
+        if not os.path.exists(path):
+            parser.error(f"Predictor file not found at: {path}")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    images = load_images(args.paths, args.max_width)
+    if not images:
+        parser.error("No readable images found")
+    faces = detect_faces(create_detector(args.detector, **options), images)
+    if not faces:
+        parser.error("No faces found")
+    shape_model = ShapeModel.load(args.shape_model) if args.shape_model else None
+
+    results = compare(args.predictors, images, faces, args.repeat, shape_model)
+
+    if args.json:
+        print(json.dumps({'images': len(images), 'faces': len(faces), 'predictors': results}, indent=2))
+        return
+
+    print(f"{len(faces)} faces in {len(images)} images, {args.repeat} pass(es); "
+          f"agreement is with {os.path.basename(args.predictors[0])}")
+    print(f"{'predictor':<44}{'MB':>8}{'load s':>8}{'ms/face':>9}{'labels':>9}{'error':>8}")
+    for r in results.values():
+        error = f"{r['point_error']:.2%}" if r['point_error'] is not None else "-"
+        print(f"{r['predictor']:<44}{r['size_mb']:>8.1f}{r['load_seconds']:>8.2f}{r['ms_per_face']:>9.2f}"
+              f"{r['label_agreement']:>9.1%}{error:>8}")
+
+
+if __name__ == "__main__":
+    main()
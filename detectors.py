@@ -0,0 +1,132 @@
+"""
+Interchangeable face detector backends.
+
+Every backend is a callable taking a grayscale image and returning a list
+of dlib.rectangle boxes, so any of them can be dropped in wherever the dlib
+HOG detector was used (FaceTracker, the shape predictor, batch scoring).
+"""
+import os
+
+import cv2
+import dlib
+
+CASCADE_PATH = os.path.join("tools", "haarcascade_frontalface_default.xml")
+
+
+class DlibHogDetector:
+    """dlib's HOG + linear SVM frontal face detector."""
+
+    def __init__(self, upsample=0):
+        self.upsample = upsample
+        self._detector = dlib.get_frontal_face_detector()
+
+    def __call__(self, gray):
+        return list(self._detector(gray, self.upsample))
+
+
+class CascadeDetector:
+    """OpenCV Haar cascade, by default the one bundled in tools/."""
+
+    def __init__(self, cascade_path=CASCADE_PATH, scale_factor=1.1, min_neighbors=5, min_size=(40, 40)):
+        if not os.path.exists(cascade_path):
+            raise FileNotFoundError(f"Cascade file not found at: {cascade_path}")
+        self._cascade = cv2.CascadeClassifier(cascade_path)
+        if self._cascade.empty():
+            raise ValueError(f"Could not load cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = tuple(min_size)
+
+    def __call__(self, gray):
+        boxes = self._cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                               minNeighbors=self.min_neighbors,
+                                               minSize=self.min_size)
+        return [dlib.rectangle(int(x), int(y), int(x + w), int(y + h)) for x, y, w, h in boxes]
+
+
+class DnnDetector:
+    """
+    OpenCV DNN SSD face detector loaded from local files, e.g. the res10
+    Caffe model (deploy.prototxt + res10_300x300_ssd_iter_140000.caffemodel)
+    or an equivalent ONNX export.
+    """
+
+    def __init__(self, model_path, config_path=None, confidence=0.5, input_size=(300, 300),
+                 mean=(104.0, 177.0, 123.0)):
+        for path in (model_path, config_path):
+            if path and not os.path.exists(path):
+                raise FileNotFoundError(f"DNN model file not found at: {path}")
+        self._net = cv2.dnn.readNet(model_path, config_path or "")
+        self.confidence = confidence
+        self.input_size = tuple(input_size)
+        self.mean = mean
+
+    def __call__(self, gray):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(image, 1.0, self.input_size, self.mean)
+        self._net.setInput(blob)
+        detections = self._net.forward().reshape(-1, 7)
+
+        faces = []
+        for _, _, score, x1, y1, x2, y2 in detections:
+            if score < self.confidence:
+                continue
+            left = max(0, int(x1 * width))
+            top = max(0, int(y1 * height))
+            right = min(width - 1, int(x2 * width))
+            bottom = min(height - 1, int(y2 * height))
+            if right > left and bottom > top:
+                faces.append(dlib.rectangle(left, top, right, bottom))
+        return faces
+
+
+DETECTOR_BACKENDS = {
+    'hog': DlibHogDetector,
+    'cascade': CascadeDetector,
+    'dnn': DnnDetector,
+}
+
+
+def create_detector(name='hog', **options):
+    """
+    Build a detector backend by name
+
+    Args:
+        name (str): One of DETECTOR_BACKENDS ('hog', 'cascade', 'dnn')
+        **options: Keyword arguments for the backend's constructor
+
+    Returns:
+        callable: Detector mapping a grayscale image to a list of dlib.rectangle
+    """
+    try:
+        backend = DETECTOR_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector backend '{name}', expected one of: {', '.join(DETECTOR_BACKENDS)}")
+    return backend(**options)
+
+
+def add_detector_arguments(parser, compare=None):
+    """
+    Add the shared --detector/--dnn-* options to an argparse parser
+
+    With `compare`, a list of backends, --backends (defaulting to that list)
+    is added instead of --detector, for tools that run several backends.
+    """
+    if compare is None:
+        parser.add_argument("--detector", choices=sorted(DETECTOR_BACKENDS), default="hog",
+                            help="Face detector backend")
+    else:
+        parser.add_argument("--backends", nargs="+", choices=sorted(DETECTOR_BACKENDS), default=list(compare),
+                            help="Face detector backends to compare")
+    parser.add_argument("--dnn-model", help="Model weights for the 'dnn' backend")
+    parser.add_argument("--dnn-config", help="Network config for the 'dnn' backend (e.g. deploy.prototxt)")
+
+
+def detector_options(args, backend=None):
+    """Constructor options for `backend` (default: the one selected by add_detector_arguments)."""
+    if (backend or args.detector) == 'dnn':
+        if not args.dnn_model:
+            raise ValueError("The 'dnn' detector needs --dnn-model")
+        return {'model_path': args.dnn_model, 'config_path': args.dnn_config}
+    return {}
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class VideoSink:
+    """
+    Shows BGR frames in a Tk label without per-frame allocations.
+
+    One RGBA buffer and one PhotoImage are created up front. load() mirrors
+    and converts a frame to RGB into the buffer in a single pass and returns
+    it for drawing overlays (colours are RGBA there); show() copies it into
+    the PhotoImage in place. The PIL image wrapping the buffer shares its
+    memory, so nothing is allocated per frame.
+    """
+
+    def __init__(self, label, size):
+        width, height = size
+        self.size = (width, height)
+        self._buffer = np.full((height, width, 4), 255, dtype=np.uint8)
+        self._rgb = self._buffer[..., :3]
+        self._image = Image.frombuffer("RGBA", self.size, self._buffer, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage("RGBA", self.size)
+        label.configure(image=self.photo)
+        label.imgtk = self.photo  # Keep a reference
+
+    @property
+    def canvas(self):
+        """The RGBA buffer, for drawing overlays with cv2."""
+        return self._buffer
+
+    def load(self, frame, mirror=True):
+        """
+        Copy a display-sized BGR frame into the buffer as RGB
+
+        Args:
+            frame (np.ndarray): BGR frame of the sink's size
+            mirror (bool): Flip horizontally in the same pass
+
+        Returns:
+            np.ndarray: The RGBA buffer, ready for overlays
+        """
+        np.copyto(self._rgb, frame[:, ::-1, ::-1] if mirror else frame[..., ::-1])
+        return self._buffer
+
+    def show(self):
+        """Push the buffer into the Tk image."""
+        self.photo.paste(self._image)
+
+    def draw_face(self, face, points, text):
+        """Draw a face box, its landmarks (those a reduced model predicts) and a label above it."""
+        canvas = self._buffer
+        cv2.rectangle(canvas, (face.left(), face.top()), (face.right(), face.bottom()), (0, 0, 255, 255), 2)
+        for x, y in points[np.isfinite(points).all(axis=1)]:
+            cv2.circle(canvas, (int(x), int(y)), 1, (0, 255, 0, 255), -1)
+        cv2.putText(canvas, text, (face.left(), face.top() - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0, 255), 2)
+
+    def draw_lines(self, lines):
+        """Draw small text lines in the top-left corner."""
+        for i, line in enumerate(lines):
+            cv2.putText(self._buffer, line, (8, 16 + i * 16), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4, (255, 255, 0, 255), 1, cv2.LINE_AA)
@@ -0,0 +1,446 @@
+"""
+Stateless face shape geometry.
+
+Everything here works on landmark arrays of shape (N, 68, 2) so a whole
+batch of faces is measured and classified in one vectorized pass. A single
+face can be passed as a (68, 2) array and is treated as a batch of one.
+
+Faces are classified by a ShapeModel, which scores every shape at once from
+the measured ratios and reports class probabilities, calibrated once the
+model is fitted to labelled faces (see fit_shapes.py). The only state is
+the default model, loaded once from PROTOTYPES_PATH.
+"""
+import json
+import os
+
+import numpy as np
+
+SHAPES = ["Round", "Oval", "Square", "Diamond", "Heart"]
+UNKNOWN_SHAPE = "Cannot determine"
+
+PREDICTOR_PATH = os.path.join("tools", "shape_predictor_68_face_landmarks.dat")
+
+# Landmark indices used by the geometry (dlib 68-point layout)
+FOREHEAD_LEFT, FOREHEAD_RIGHT = 17, 26
+CHEEKBONE_LEFT, CHEEKBONE_RIGHT = 2, 14
+JAW_LEFT, JAW_RIGHT, JAW_BOTTOM = 5, 11, 8
+BROW_TOP = 19
+
+# Index of each landmark's left/right counterpart, for mirrored frames
+MIRROR_INDEX = np.array(
+    list(range(16, -1, -1))                                # jaw
+    + list(range(26, 21, -1)) + list(range(21, 16, -1))    # brows
+    + [27, 28, 29, 30] + list(range(35, 30, -1))           # nose
+    + [45, 44, 43, 42, 47, 46, 39, 38, 37, 36, 41, 40]     # eyes
+    + list(range(54, 47, -1)) + [59, 58, 57, 56, 55]       # outer lips
+    + list(range(64, 59, -1)) + [67, 66, 65])              # inner lips
+
+RATIO_KEYS = ('length_to_width', 'forehead_to_jaw', 'cheekbone_to_jaw', 'face_aspect_ratio')
+FEATURE_KEYS = ('forehead_width', 'cheekbone_width', 'jaw_width', 'face_length',
+                'jaw_angle_left', 'jaw_angle_right', 'avg_jaw_angle') + RATIO_KEYS
+
+
+def landmarks_to_points(face_landmarks):
+    """
+    Convert a dlib landmark detection to a 68x2 coordinate array
+
+    Args:
+        face_landmarks (dlib.full_object_detection): Facial landmarks from dlib
+
+    Returns:
+        np.ndarray: 68x2 array of (x, y) landmark coordinates
+    """
+    return np.array([[p.x, p.y] for p in face_landmarks.parts()])
+
+
+def mirror_points(points, width):
+    """
+    Mirror landmarks horizontally, as if predicted on a flipped frame
+
+    Args:
+        points (np.ndarray): (..., 68, 2) landmark coordinates
+        width (int): Width of the frame the coordinates refer to
+
+    Returns:
+        np.ndarray: Mirrored coordinates with left/right landmarks swapped
+    """
+    mirrored = np.array(points, dtype=np.float64)[..., MIRROR_INDEX, :]
+    mirrored[..., 0] = width - 1 - mirrored[..., 0]
+    return mirrored
+
+
+def _angle(p1, p2, p3):
+    """Angle at p2 in degrees for (N, 2) point arrays"""
+    ba = p1 - p2
+    bc = p3 - p2
+    cosine = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def compute_features(points):
+    """
+    Measure widths, face length, jaw angles and ratios for a batch of faces
+
+    Args:
+        points (np.ndarray): (N, 68, 2) or (68, 2) landmark coordinates
+
+    Returns:
+        dict: FEATURE_KEYS mapped to float arrays of shape (N,)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim == 2:
+        points = points[np.newaxis]
+
+    jaw_left = points[:, JAW_LEFT]
+    jaw_right = points[:, JAW_RIGHT]
+    jaw_bottom = points[:, JAW_BOTTOM]
+    cheekbone_left = points[:, CHEEKBONE_LEFT]
+    cheekbone_right = points[:, CHEEKBONE_RIGHT]
+
+    forehead_width = np.linalg.norm(points[:, FOREHEAD_LEFT] - points[:, FOREHEAD_RIGHT], axis=1)
+    cheekbone_width = np.linalg.norm(cheekbone_left - cheekbone_right, axis=1)
+    jaw_width = np.linalg.norm(jaw_left - jaw_right, axis=1)
+    face_length = np.linalg.norm(points[:, BROW_TOP] - jaw_bottom, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jaw_angle_left = _angle(jaw_left, jaw_bottom, cheekbone_left)
+        jaw_angle_right = _angle(jaw_right, jaw_bottom, cheekbone_right)
+
+        return {
+            'forehead_width': forehead_width,
+            'cheekbone_width': cheekbone_width,
+            'jaw_width': jaw_width,
+            'face_length': face_length,
+            'jaw_angle_left': jaw_angle_left,
+            'jaw_angle_right': jaw_angle_right,
+            'avg_jaw_angle': (jaw_angle_left + jaw_angle_right) / 2,
+            'length_to_width': face_length / cheekbone_width,
+            'forehead_to_jaw': forehead_width / jaw_width,
+            'cheekbone_to_jaw': cheekbone_width / jaw_width,
+            'face_aspect_ratio': face_length / (forehead_width + jaw_width),
+        }
+
+
+# Features the shape model scores on, and where fitted prototypes are kept
+SCORE_KEYS = ('length_to_width', 'forehead_to_jaw', 'cheekbone_to_jaw', 'avg_jaw_angle')
+PROTOTYPES_PATH = os.path.join("tools", "shape_prototypes.json")
+
+# Geometry landmarks of an average frontal face (left side; the right
+# mirrors it), in pixels with the chin at the origin and y growing downwards
+TEMPLATE_POINTS = {
+    BROW_TOP: (-45.0, -232.0),
+    FOREHEAD_LEFT: (-88.0, -212.0),
+    CHEEKBONE_LEFT: (-99.0, -112.0),
+    JAW_LEFT: (-67.0, -34.0),
+}
+
+# Hand-placed proportions of each shape relative to the template face, as
+# multipliers of its (length, forehead width, cheekbone width, jaw width).
+# The built-in prototypes are these faces measured with compute_features,
+# used until a fitted set is written to PROTOTYPES_PATH (see fit_shapes.py)
+BUILTIN_PROPORTIONS = {
+    "Round": (0.90, 1.00, 1.00, 1.10),
+    "Oval": (1.10, 1.00, 1.00, 0.90),
+    "Square": (0.95, 1.05, 1.00, 1.20),
+    "Diamond": (1.05, 0.90, 1.05, 0.90),
+    "Heart": (1.00, 1.10, 1.00, 0.85),
+}
+
+# Candidate temperatures tried when calibrating a fitted model
+TEMPERATURES = np.geomspace(0.05, 20.0, 81)
+
+
+def template_face(length=1.0, forehead=1.0, cheekbone=1.0, jaw=1.0):
+    """
+    The template face with its length and widths scaled
+
+    Returns:
+        np.ndarray: (68, 2) coordinates, NaN for landmarks the geometry does not read
+    """
+    points = np.full((68, 2), np.nan)
+    points[JAW_BOTTOM] = 0.0
+    widths = {FOREHEAD_LEFT: forehead, CHEEKBONE_LEFT: cheekbone, JAW_LEFT: jaw}
+    for index, (x, y) in TEMPLATE_POINTS.items():
+        x *= widths.get(index, 1.0)
+        points[index] = (x, y * length)
+        if index in widths:
+            points[MIRROR_INDEX[index]] = (-x, y * length)
+    return points
+
+
+def feature_matrix(features, keys=SCORE_KEYS):
+    """Stack the scored features of a compute_features batch into an (N, K) array"""
+    return np.stack([np.asarray(features[key], dtype=np.float64) for key in keys], axis=-1)
+
+
+def _log_softmax(logits):
+    shifted = logits - np.max(logits, axis=1, keepdims=True)
+    return shifted - np.log(np.sum(np.exp(shifted), axis=1, keepdims=True))
+
+
+def _squared_distances(x, means, scales):
+    """(N, S) squared distances of (N, K) faces to (S, K) prototypes, per-feature scaled"""
+    z = (x[:, np.newaxis, :] - means[np.newaxis]) / scales
+    return np.einsum('nsk,nsk->ns', z, z)
+
+
+def _prototypes(x, y, count, fallback=None):
+    """Class means and pooled within-class spread of labelled rows"""
+    means = np.empty((count, x.shape[1]))
+    for i in range(count):
+        rows = x[y == i]
+        means[i] = rows.mean(axis=0) if len(rows) else fallback[i]
+    spread = np.sqrt(np.mean((x - means[y]) ** 2, axis=0))
+    return means, np.maximum(spread, 1e-3 * np.maximum(np.abs(means).mean(axis=0), 1.0))
+
+
+def _log_loss(distances, y, temperature):
+    log_probs = _log_softmax(-0.5 * distances / temperature)
+    return float(-np.mean(log_probs[np.arange(len(y)), y]))
+
+
+class ShapeModel:
+    """
+    Nearest-prototype face shape scorer.
+
+    Each shape is a prototype point in SCORE_KEYS space. A face scores
+    minus half its squared distance to each prototype, every feature divided
+    by its within-class spread; dividing by `temperature` and taking a
+    softmax turns the scores into class probabilities. fit() picks the
+    temperature that best predicts held-out faces, so a probability of 0.8
+    is right about 80% of the time on faces like the training set.
+    """
+
+    def __init__(self, means, scales, temperature=1.0, shapes=SHAPES, keys=SCORE_KEYS, info=None):
+        self.shapes = list(shapes)
+        self.keys = tuple(keys)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.temperature = float(temperature)
+        self.info = info or {}
+
+    @property
+    def calibrated(self):
+        """True for fitted models, whose probabilities were calibrated on held-out faces."""
+        return self.info.get('source') == 'fitted'
+
+    @classmethod
+    def builtin(cls):
+        """
+        Prototypes measured on the BUILTIN_PROPORTIONS faces
+
+        Each feature is scaled by its spread across the prototypes. Nothing
+        is calibrated, so the probabilities only rank the shapes.
+        """
+        faces = np.stack([template_face(*BUILTIN_PROPORTIONS[shape]) for shape in SHAPES])
+        means = feature_matrix(compute_features(faces))
+        return cls(means, means.std(axis=0), info={'source': 'builtin'})
+
+    @classmethod
+    def fit(cls, x, y, shapes=SHAPES, keys=SCORE_KEYS, folds=5, seed=0):
+        """
+        Fit prototypes to labelled faces and calibrate the temperature
+
+        The temperature is chosen on k-fold held-out predictions, whose
+        accuracy and log loss are kept in `info`.
+
+        Args:
+            x (np.ndarray): (N, K) features in `keys` order
+            y (np.ndarray): (N,) indices into `shapes`
+            folds (int): Cross-validation folds
+
+        Returns:
+            ShapeModel: The fitted model
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.int64)
+        usable = np.all(np.isfinite(x), axis=1)
+        x, y = x[usable], y[usable]
+        counts = np.bincount(y, minlength=len(shapes))
+        missing = [shape for shape, count in zip(shapes, counts) if count == 0]
+        if missing:
+            raise ValueError(f"No usable faces for: {', '.join(missing)}")
+        means, scales = _prototypes(x, y, len(shapes))
+
+        order = np.random.default_rng(seed).permutation(len(x))
+        held_out = np.empty((len(x), len(shapes)))
+        for fold in np.array_split(order, max(2, min(folds, len(x)))):
+            train = np.ones(len(x), dtype=bool)
+            train[fold] = False
+            fold_means, fold_scales = _prototypes(x[train], y[train], len(shapes), fallback=means)
+            held_out[fold] = _squared_distances(x[fold], fold_means, fold_scales)
+        temperature = float(min(TEMPERATURES, key=lambda t: _log_loss(held_out, y, t)))
+
+        info = {
+            'source': 'fitted',
+            'faces': {shape: int(count) for shape, count in zip(shapes, counts)},
+            'cv_accuracy': float(np.mean(np.argmin(held_out, axis=1) == y)),
+            'cv_log_loss': _log_loss(held_out, y, temperature),
+        }
+        return cls(means, scales, temperature, shapes, keys, info)
+
+    def log_probabilities(self, features):
+        """
+        Args:
+            features (dict): Output of compute_features
+
+        Returns:
+            np.ndarray: (N, len(shapes)) log-probabilities; NaN rows where
+                the features are not finite
+        """
+        with np.errstate(invalid='ignore'):
+            distances = _squared_distances(feature_matrix(features, self.keys), self.means, self.scales)
+            return _log_softmax(-0.5 * distances / self.temperature)
+
+    def probabilities(self, features):
+        return np.exp(self.log_probabilities(features))
+
+    def to_dict(self):
+        return {
+            'shapes': self.shapes,
+            'keys': list(self.keys),
+            'means': {shape: dict(zip(self.keys, row.tolist())) for shape, row in zip(self.shapes, self.means)},
+            'scales': dict(zip(self.keys, self.scales.tolist())),
+            'temperature': self.temperature,
+            'info': self.info,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        keys = data['keys']
+        return cls([[data['means'][shape][key] for key in keys] for shape in data['shapes']],
+                   [data['scales'][key] for key in keys], data['temperature'],
+                   data['shapes'], keys, data.get('info'))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+_default_model = None
+
+
+def default_model():
+    """The fitted model at PROTOTYPES_PATH if there is one, else the built-in prototypes"""
+    global _default_model
+    if _default_model is None:
+        if os.path.exists(PROTOTYPES_PATH):
+            _default_model = ShapeModel.load(PROTOTYPES_PATH)
+        else:
+            _default_model = ShapeModel.builtin()
+    return _default_model
+
+
+def shape_scores(features, model=None):
+    """
+    Class probabilities for a batch of faces
+
+    Args:
+        features (dict): Output of compute_features
+        model (ShapeModel): Scorer to use (default: default_model())
+
+    Returns:
+        np.ndarray: (N, len(SHAPES)) probabilities, rows in SHAPES order
+    """
+    return (model or default_model()).probabilities(features)
+
+
+def scores_to_labels(scores, min_confidence=0.0, shapes=SHAPES):
+    """
+    Most probable shape per face
+
+    Args:
+        scores (np.ndarray): (N, len(shapes)) probabilities
+        min_confidence (float): Below this top probability the face is UNKNOWN_SHAPE
+
+    Returns:
+        np.ndarray: Shape label per face (UNKNOWN_SHAPE where the features
+            were unusable or the best score is too low)
+    """
+    scores = np.asarray(scores)
+    if scores.ndim == 1:
+        scores = scores[np.newaxis]
+    usable = np.all(np.isfinite(scores), axis=1)
+    filled = np.where(usable[:, np.newaxis], scores, 0.0)
+    best = np.argmax(filled, axis=1)
+    confident = usable & (filled.max(axis=1, initial=0.0) >= min_confidence)
+    return np.where(confident, np.asarray(shapes, dtype=object)[best], UNKNOWN_SHAPE).astype(str)
+
+
+def classify_features(features, model=None):
+    """
+    Classify a batch of faces with the shape model
+
+    Args:
+        features (dict): Output of compute_features
+        model (ShapeModel): Scorer to use (default: default_model())
+
+    Returns:
+        np.ndarray: Shape label per face (UNKNOWN_SHAPE where the features are unusable)
+    """
+    return scores_to_labels(shape_scores(features, model))
+
+
+def score_points(points, model=None):
+    """
+    Measure and score a batch of faces
+
+    Args:
+        points (np.ndarray): (N, 68, 2) or (68, 2) landmark coordinates
+        model (ShapeModel): Scorer to use (default: default_model())
+
+    Returns:
+        tuple: ((N, len(SHAPES)) probabilities, features dict)
+    """
+    features = compute_features(points)
+    return shape_scores(features, model), features
+
+
+def classify_points(points, model=None):
+    """
+    Measure and classify a batch of faces
+
+    Args:
+        points (np.ndarray): (N, 68, 2) or (68, 2) landmark coordinates
+        model (ShapeModel): Scorer to use (default: default_model())
+
+    Returns:
+        tuple: (labels array of shape (N,), features dict)
+    """
+    scores, features = score_points(points, model)
+    return scores_to_labels(scores), features
+
+
+def measure_face(points):
+    """
+    Measure a single face
+
+    Args:
+        points (np.ndarray): 68x2 array of facial landmark coordinates
+
+    Returns:
+        dict: FEATURE_KEYS mapped to plain floats
+    """
+    features = compute_features(points)
+    return {key: float(value[0]) for key, value in features.items()}
+
+
+def classify_face_shape(measurements, model=None):
+    """
+    Classify a single face from measure_face output
+
+    Args:
+        measurements (dict): Output of measure_face
+        model (ShapeModel): Scorer to use (default: default_model())
+
+    Returns:
+        str: One of SHAPES, or UNKNOWN_SHAPE
+    """
+    features = {key: np.atleast_1d(value) for key, value in measurements.items()}
+    return str(classify_features(features, model)[0])
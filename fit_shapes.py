@@ -0,0 +1,101 @@
+"""
+Fit the face shape model to labelled photos.
+
+Photos are labelled by folder: a directory named after a shape (Round, Oval,
+Square, Diamond or Heart, in any case) labels every image below it, so both
+labelled/oval/*.jpg and Male/Oval/*.jpg work. Each shape's prototype is the
+mean of its faces' features, and the temperature is calibrated on
+cross-validated predictions. The model is written as JSON; the app, batch
+classifier and service load tools/shape_prototypes.json by default.
+
+Example:
+    python fit_shapes.py labelled/ --workers 4
+    python fit_shapes.py Male Female -o tools/shape_prototypes.json
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_classify import init_worker, iter_images, measure_image
+from detectors import add_detector_arguments, detector_options
+from face_shape import PREDICTOR_PATH, PROTOTYPES_PATH, SCORE_KEYS, SHAPES, ShapeModel, feature_matrix
+
+
+def shape_label(path, root):
+    """Index into SHAPES of the innermost shape-named folder above `path`, or None."""
+    names = {shape.lower(): i for i, shape in enumerate(SHAPES)}
+    relative = os.path.relpath(os.path.dirname(path), root) if os.path.isdir(root) else os.path.dirname(path)
+    for part in reversed(os.path.normpath(relative).split(os.sep)):
+        if part.lower() in names:
+            return names[part.lower()]
+    return None
+
+
+def labelled_images(roots):
+    """Yield (path, shape index) for every image under a shape-named folder."""
+    for root in roots:
+        for path in iter_images([root]):
+            label = shape_label(path, root)
+            if label is not None:
+                yield path, label
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit face shape prototypes to photos labelled by folder.")
+    parser.add_argument("paths", nargs="+", help="Directories holding Round/, Oval/, ... folders")
+    parser.add_argument("-o", "--output", default=PROTOTYPES_PATH, help="JSON model file to write")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds for calibration")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="Path to the dlib shape predictor (68-point or reduced)")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.predictor):
+        parser.error(f"Predictor file not found at: {args.predictor}")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    images = list(labelled_images(args.paths))
+    if not images:
+        parser.error(f"No images found in folders named {', '.join(SHAPES)}")
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=init_worker,
+                              initargs=(args.predictor, args.detector, options)) as pool:
+        measured = pool.map(measure_image, [path for path, _ in images], chunksize=8)
+    rows = [(m, label) for m, (_, label) in zip(measured, images) if m is not None]
+    print(f"Measured {len(rows)} of {len(images)} images in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+    if not rows:
+        sys.exit("No faces found")
+
+    features = {key: np.array([m[key] for m, _ in rows]) for key in SCORE_KEYS}
+    x = feature_matrix(features)
+    y = np.array([label for _, label in rows])
+    try:
+        model = ShapeModel.fit(x, y, folds=args.folds)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    builtin = ShapeModel.builtin().probabilities(features)
+    builtin_accuracy = float(np.mean(np.argmax(builtin, axis=1) == y))
+    model.info['builtin_accuracy'] = builtin_accuracy
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    model.save(args.output)
+
+    info = model.info
+    print("Faces per shape: " + ", ".join(f"{shape} {count}" for shape, count in info['faces'].items()))
+    print(f"Cross-validated accuracy {info['cv_accuracy']:.1%} (built-in prototypes {builtin_accuracy:.1%}), "
+          f"log loss {info['cv_log_loss']:.3f} at temperature {model.temperature:.2f}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
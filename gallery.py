@@ -0,0 +1,232 @@
+"""
+Packed hairstyle gallery index.
+
+Builds one file holding a JSON manifest of every gallery image (gender,
+shape, tags, dimensions, content hash, source mtime) followed by a
+pre-shrunk thumbnail of each. The app memory-maps the file and looks images
+up by gender and shape without walking directories or decoding originals.
+Rebuilding only re-encodes images whose size or mtime changed.
+
+File layout:
+    MAGIC (8 bytes) | manifest length (uint32 LE) | manifest JSON | thumbnails
+
+Example:
+    python gallery.py              # build or update .cache/gallery.pack
+    python gallery.py --check      # exit 1 if the pack is out of date
+"""
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+MAGIC = b"FSHGAL01"
+HEADER = struct.Struct("<8sI")
+PACK_PATH = os.path.join(".cache", "gallery.pack")
+GENDER_DIRS = {'male': "Male", 'female': "Female"}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+THUMB_SIZE = 256
+
+
+def shape_key(gender, shape):
+    return f"{gender.lower()}/{shape.lower()}"
+
+
+class GalleryIndex:
+    """
+    Read-only view of a gallery pack.
+
+    Opening parses the small manifest; thumbnail bytes stay in the mapped
+    file until thumbnail_bytes() slices them out.
+    """
+
+    def __init__(self, path=PACK_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a gallery pack: {path}")
+        self._data_offset = HEADER.size + length
+        manifest = json.loads(self._map[HEADER.size:self._data_offset].decode("utf-8"))
+        self.root = manifest['root']
+        self.thumb_size = manifest['thumb_size']
+        self.entries = manifest['entries']
+        self._by_shape = manifest['index']
+
+    @classmethod
+    def open(cls, path=PACK_PATH):
+        """The pack at `path`, or None if it is missing or unreadable."""
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(path):
+                print(f"Ignoring gallery pack {path}: {e}")
+            return None
+
+    def images(self, gender, shape):
+        """Manifest entries for a gender and face shape, in gallery order."""
+        return [self.entries[i] for i in self._by_shape.get(shape_key(gender, shape), [])]
+
+    def thumbnail_bytes(self, entry):
+        offset, length = entry['thumb']
+        start = self._data_offset + offset
+        return self._map[start:start + length]
+
+    def close(self):
+        self._map.close()
+
+
+def _tags(name):
+    """Lowercase words of a file name, split on CamelCase, digits and punctuation."""
+    stem = os.path.splitext(name)[0]
+    return [word.lower() for word in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", stem)]
+
+
+def _scan(root):
+    """Yield (gender, shape, path) for every gallery image, in sorted order."""
+    for gender, dirname in GENDER_DIRS.items():
+        gender_dir = os.path.join(root, dirname)
+        if not os.path.isdir(gender_dir):
+            continue
+        for shape in sorted(os.listdir(gender_dir)):
+            shape_dir = os.path.join(gender_dir, shape)
+            if not os.path.isdir(shape_dir):
+                continue
+            for name in sorted(os.listdir(shape_dir)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield gender, shape, os.path.normpath(os.path.join(shape_dir, name))
+
+
+def _make_entry(gender, shape, path, thumb_size):
+    """Hash, measure and shrink one image; returns (entry, thumbnail bytes)."""
+    from PIL import Image
+
+    with open(path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        has_alpha = "A" in img.getbands() or "transparency" in img.info
+        thumb = img.convert("RGBA" if has_alpha else "RGB")
+    thumb.thumbnail((thumb_size, thumb_size), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    if has_alpha:
+        thumb.save(out, format="PNG", optimize=True)
+    else:
+        thumb.save(out, format="JPEG", quality=90)
+
+    stat = os.stat(path)
+    entry = {
+        'gender': gender,
+        'shape': shape,
+        'name': os.path.splitext(os.path.basename(path))[0],
+        'path': path.replace(os.sep, "/"),
+        'tags': _tags(os.path.basename(path)),
+        'width': width,
+        'height': height,
+        'sha1': hashlib.sha1(data).hexdigest(),
+        'mtime_ns': stat.st_mtime_ns,
+        'bytes': stat.st_size,
+    }
+    return entry, out.getvalue()
+
+
+def _unchanged(entry, path):
+    stat = os.stat(path)
+    return entry['mtime_ns'] == stat.st_mtime_ns and entry['bytes'] == stat.st_size
+
+
+def build(root=".", pack_path=PACK_PATH, thumb_size=THUMB_SIZE):
+    """
+    Build or incrementally update the gallery pack
+
+    Entries whose source file kept its size and mtime are copied from the
+    existing pack as they are; only new or changed images are decoded.
+
+    Returns:
+        dict: Counts of 'reused', 'encoded' and 'removed' images
+    """
+    old = GalleryIndex.open(pack_path)
+    previous = {}
+    if old is not None and old.thumb_size == thumb_size:
+        previous = {entry['path']: entry for entry in old.entries}
+
+    entries, blobs, index = [], [], {}
+    offset = 0
+    stats = {'reused': 0, 'encoded': 0, 'removed': 0}
+    try:
+        for gender, shape, path in _scan(root):
+            key = path.replace(os.sep, "/")
+            entry = previous.pop(key, None)
+            if entry is not None and _unchanged(entry, path):
+                thumb = bytes(old.thumbnail_bytes(entry))
+                entry = dict(entry)
+                stats['reused'] += 1
+            else:
+                entry, thumb = _make_entry(gender, shape, path, thumb_size)
+                stats['encoded'] += 1
+            entry['thumb'] = [offset, len(thumb)]
+            offset += len(thumb)
+            index.setdefault(shape_key(gender, shape), []).append(len(entries))
+            entries.append(entry)
+            blobs.append(thumb)
+    finally:
+        if old is not None:
+            old.close()
+    stats['removed'] = len(previous)
+
+    manifest = json.dumps({'root': root, 'thumb_size': thumb_size, 'entries': entries, 'index': index},
+                          separators=(",", ":")).encode("utf-8")
+    os.makedirs(os.path.dirname(pack_path) or ".", exist_ok=True)
+    tmp = f"{pack_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(manifest)))
+        f.write(manifest)
+        for thumb in blobs:
+            f.write(thumb)
+    os.replace(tmp, pack_path)
+    return stats
+
+
+def is_current(root=".", pack_path=PACK_PATH):
+    """True if the pack lists exactly the gallery's images, all unchanged."""
+    index = GalleryIndex.open(pack_path)
+    if index is None:
+        return False
+    try:
+        known = {entry['path']: entry for entry in index.entries}
+        paths = [path for _, _, path in _scan(root)]
+        if len(paths) != len(known):
+            return False
+        return all(path.replace(os.sep, "/") in known
+                   and _unchanged(known[path.replace(os.sep, "/")], path) for path in paths)
+    finally:
+        index.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index the hairstyle gallery into a packed manifest.")
+    parser.add_argument("--root", default=".", help="Directory holding the Male/ and Female/ galleries")
+    parser.add_argument("-o", "--output", default=PACK_PATH, help="Pack file to build or update")
+    parser.add_argument("--thumb-size", type=int, default=THUMB_SIZE,
+                        help="Longest side of the stored thumbnails in pixels")
+    parser.add_argument("--check", action="store_true", help="Only report whether the pack is up to date")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        current = is_current(args.root, args.output)
+        print(f"{args.output} is {'up to date' if current else 'out of date'}")
+        sys.exit(0 if current else 1)
+
+    stats = build(args.root, args.output, args.thumb_size)
+    print(f"Wrote {args.output}: {stats['encoded']} encoded, {stats['reused']} reused, "
+          f"{stats['removed']} removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Adaptive pacing of the inference thread.
+
+With nobody in front of the kiosk, every frame would otherwise go through a
+full face detection. A RateGovernor caps the analysis rate and backs off
+when frames are expensive. After a while with no face it switches to a
+motion check on a tiny grayscale copy of each frame, and returns to full
+rate as soon as something moves.
+"""
+import collections
+import time
+
+import cv2
+import numpy as np
+
+ACTIVE = 'active'
+IDLE = 'idle'
+
+
+class RateGovernor:
+    """
+    Decides when the inference thread takes its next frame.
+
+    Active: at most `target_fps` frames a second are analyzed. Fewer are
+    analyzed when the measured per-frame cost (an exponential average)
+    would use more than `max_load` of a core, so a slow machine keeps
+    headroom for capture and the UI.
+
+    Idle: after `idle_after` seconds without a face, `idle_fps` frames a
+    second are compared with the previous one at `motion_size`. A mean
+    change above `motion_threshold` grey levels switches back to active,
+    and that frame is analyzed straight away.
+
+    The last `history` mode changes are kept in `transitions` as (time,
+    old, new, reason) and passed to `on_transition`, which runs on the
+    inference thread; `switches` counts every change into each mode.
+    """
+
+    def __init__(self, target_fps=15.0, idle_after=10.0, idle_fps=2.0, motion_threshold=4.0,
+                 max_load=0.8, motion_size=(32, 24), on_transition=None, history=100):
+        self.target_fps = target_fps
+        self.idle_after = idle_after
+        self.idle_fps = idle_fps
+        self.motion_threshold = motion_threshold
+        self.max_load = max_load
+        self.motion_size = tuple(motion_size)
+        self.on_transition = on_transition
+        self.transitions = collections.deque(maxlen=history)
+        self.switches = {ACTIVE: 0, IDLE: 0}
+        self.reset()
+
+    def reset(self):
+        self.mode = ACTIVE
+        self.cost_ms = None
+        self._next = 0.0
+        self._started = 0.0
+        self._last_face = time.perf_counter()
+        self._reference = None
+
+    @property
+    def idle(self):
+        return self.mode == IDLE
+
+    def interval(self):
+        """Seconds between analyzed frames in the current mode."""
+        if self.mode == IDLE:
+            return 1.0 / self.idle_fps
+        interval = 1.0 / self.target_fps if self.target_fps > 0 else 0.0
+        if self.cost_ms is not None and self.max_load > 0:
+            interval = max(interval, self.cost_ms / 1000 / self.max_load)
+        return interval
+
+    def delay(self):
+        """Seconds until the next frame is due; zero or less when it is due."""
+        return self._next - time.perf_counter()
+
+    def begin(self):
+        """Mark the start of a frame, which the next interval counts from."""
+        self._started = time.perf_counter()
+
+    def wait(self, stop_event):
+        """Sleep until the next frame is due; returns False if stopped meanwhile."""
+        delay = self.delay()
+        if delay > 0 and stop_event.wait(delay):
+            return False
+        self.begin()
+        return not stop_event.is_set()
+
+    def motion(self, display):
+        """
+        Compare an idle frame with the previous one
+
+        Args:
+            display (np.ndarray): Display-sized BGR frame
+
+        Returns:
+            bool: True if it moved enough to wake up (the governor is then active)
+        """
+        small = cv2.resize(cv2.cvtColor(display, cv2.COLOR_BGR2GRAY), self.motion_size,
+                           interpolation=cv2.INTER_AREA).astype(np.int16)
+        reference, self._reference = self._reference, small
+        self._next = self._started + self.interval()
+        if reference is None:
+            return False
+        change = float(np.abs(small - reference).mean())
+        if change <= self.motion_threshold:
+            return False
+        self._switch(ACTIVE, f"motion ({change:.1f} grey levels)")
+        return True
+
+    def observe(self, result):
+        """Update the cost estimate and face timer from an analyzed frame."""
+        now = time.perf_counter()
+        self.cost_ms = result.cost_ms if self.cost_ms is None else 0.8 * self.cost_ms + 0.2 * result.cost_ms
+        if result.faces:
+            self._last_face = now
+        elif self.mode == ACTIVE and self.idle_after > 0 and now - self._last_face >= self.idle_after:
+            self._switch(IDLE, f"no face for {self.idle_after:g}s")
+        self._next = self._started + self.interval()
+
+    def _switch(self, mode, reason):
+        old, self.mode = self.mode, mode
+        now = time.perf_counter()
+        if mode == ACTIVE:
+            # Give whoever moved the full idle_after to show their face
+            self._last_face = now
+        else:
+            self._reference = None
+        self.transitions.append((now, old, mode, reason))
+        self.switches[mode] += 1
+        if self.on_transition is not None:
+            self.on_transition(old, mode, reason)
+
+    def summary(self):
+        return (f"{self.mode}, went idle {self.switches[IDLE]} times and woke "
+                f"{self.switches[ACTIVE]} times; analysis cost ~{self.cost_ms or 0:.1f} ms/frame")
@@ -0,0 +1,252 @@
+"""
+Returning-customer recognition.
+
+An IdentityCache remembers, for each person whose analysis finished, their
+face shape and when they were last seen. Faces are matched with OpenCV's LBPH
+recognizer (opencv-contrib's cv2.face) on crops aligned by the eye
+landmarks. A returning customer is therefore recognised within the first
+few frames and gets their stored shape straight away, skipping the full
+analysis.
+
+Only LBPH histograms are stored, never face images. They live in
+.cache/identities.yml.gz, which has the format of the bundled
+tools/classifier.yml, gzipped. Until the cache exists, that file seeds the
+recognizer's LBPH parameters; its single anonymous sample is dropped.
+A JSON sidecar holds each identity's shape, confidence and timestamps.
+New results are added incrementally with LBPH update(). Identities unseen
+for `max_age` seconds, or beyond `capacity`, are evicted by rewriting the
+histogram file without them.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+SEED_PATH = os.path.join("tools", "classifier.yml")
+CACHE_PATH = os.path.join(".cache", "identities.yml.gz")
+CROP_SIZE = 96
+
+LEFT_EYE = slice(36, 42)
+RIGHT_EYE = slice(42, 48)
+
+
+def align_face(gray, points, size=CROP_SIZE):
+    """
+    Crop a face upright with the eyes at fixed positions
+
+    Args:
+        gray (np.ndarray): Grayscale frame the landmarks refer to
+        points (np.ndarray): (68, 2) landmark coordinates
+        size (int): Side of the square crop
+
+    Returns:
+        np.ndarray: size x size histogram-equalised crop
+    """
+    left = points[LEFT_EYE].mean(axis=0)
+    right = points[RIGHT_EYE].mean(axis=0)
+    dx, dy = right - left
+    angle = np.degrees(np.arctan2(dy, dx))
+    scale = 0.4 * size / max(np.hypot(dx, dy), 1.0)
+    centre = (left + right) / 2
+    matrix = cv2.getRotationMatrix2D((float(centre[0]), float(centre[1])), float(angle), float(scale))
+    matrix[:, 2] += (size * 0.5 - centre[0], size * 0.35 - centre[1])
+    crop = cv2.warpAffine(gray, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return cv2.equalizeHist(crop)
+
+
+class _Track:
+    __slots__ = ('attempts', 'crops', 'identity')
+
+    def __init__(self):
+        self.attempts = 0
+        self.crops = []
+        self.identity = None
+
+
+class IdentityCache:
+    """
+    LBPH recognizer plus per-identity results, safe to share between the
+    inference thread (lookup) and the UI thread (enroll, save).
+
+    A track is compared with the stored faces on up to `attempts` frames; a
+    match needs an LBPH distance of at most `threshold` (lower is closer).
+    The first `crops_per_face` crops of every track are kept in memory, so
+    the track can be enrolled once its analysis finishes. Every sample is a
+    16k-bin histogram, so `capacity` is kept modest; the model is written
+    on a background thread after each enrolment.
+    """
+
+    def __init__(self, path=CACHE_PATH, seed_path=SEED_PATH, threshold=50.0, attempts=5,
+                 crops_per_face=3, max_age=30 * 24 * 3600, capacity=200):
+        if not hasattr(cv2, "face"):
+            raise ImportError("cv2.face is missing; install opencv-contrib-python")
+        self.path = path
+        self.meta_path = os.path.splitext(path[:-3] if path.endswith(".gz") else path)[0] + ".json"
+        self.threshold = threshold
+        self.attempts = attempts
+        self.crops_per_face = crops_per_face
+        self.max_age = max_age
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._tracks = {}
+        self._dirty = False
+
+        self._recognizer = cv2.face.LBPHFaceRecognizer_create()
+        source = path if os.path.exists(path) else seed_path
+        if os.path.exists(source):
+            self._recognizer.read(source)
+        self.identities = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                self.identities = {int(label): entry for label, entry in json.load(f).items()}
+        self._samples = len(self._recognizer.getHistograms())
+        with self._lock:
+            if self._evict(time.time()):
+                self._save()
+
+    @classmethod
+    def open(cls, path=CACHE_PATH, **options):
+        """The cache at `path`, or None if the recognizer is unavailable or the files are unreadable."""
+        try:
+            return cls(path, **options)
+        except (ImportError, OSError, ValueError, cv2.error) as e:
+            print(f"Returning-customer recognition disabled: {e}")
+            return None
+
+    def lookup(self, face_id, gray, points):
+        """
+        Try to recognise a tracked face
+
+        Args:
+            face_id (int): Track ID
+            gray (np.ndarray): Grayscale frame
+            points (np.ndarray): The face's (68, 2) landmarks in `gray`
+
+        Returns:
+            dict: The stored identity ('label', 'shape', 'confidence', ...) or None
+        """
+        track = self._tracks.get(face_id)
+        if track is None:
+            track = self._tracks[face_id] = _Track()
+        if track.identity is not None:
+            return track.identity
+        collecting = len(track.crops) < self.crops_per_face
+        trying = track.attempts < self.attempts and self._samples > 0
+        if not (collecting or trying):
+            return None
+
+        crop = align_face(gray, points)
+        if collecting:
+            track.crops.append(crop)
+        if not trying:
+            return None
+        track.attempts += 1
+        with self._lock:
+            label, distance = self._recognizer.predict(crop)
+            entry = self.identities.get(label)
+            if entry is None or distance > self.threshold:
+                return None
+            entry['last_seen'] = time.time()
+            entry['visits'] += 1
+            self._dirty = True
+            track.identity = dict(entry, label=label, distance=round(float(distance), 2))
+        return track.identity
+
+    def forget_tracks(self, face_ids):
+        """Drop per-track state for faces no longer in view."""
+        for face_id in [i for i in list(self._tracks) if i not in face_ids]:
+            del self._tracks[face_id]
+
+    def enroll(self, face_id, shape, confidence):
+        """
+        Remember a finished analysis for the face on this track
+
+        Returns:
+            int: The identity's label, or None when there are no crops of the face
+        """
+        track = self._tracks.get(face_id)
+        if track is None or not track.crops:
+            return None
+        now = time.time()
+        with self._lock:
+            label = max(list(self.identities) + [0]) + 1
+            self._recognizer.update(track.crops, np.full(len(track.crops), label, dtype=np.int32))
+            self._samples += len(track.crops)
+            self.identities[label] = {'shape': shape, 'confidence': round(float(confidence), 4),
+                                      'first_seen': now, 'last_seen': now, 'visits': 1}
+            track.identity = dict(self.identities[label], label=label, distance=0.0)
+            self._evict(now)
+            self._dirty = True
+        threading.Thread(target=self.save, name="identity-save", daemon=True).start()
+        return label
+
+    def save(self):
+        """Write visit counts and last-seen times if they changed."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _evict(self, now):
+        """
+        Drop stale identities, those beyond capacity and samples without an
+        identity (such as the seed model's); returns True if anything changed.
+        """
+        stale = {label for label, entry in self.identities.items() if now - entry['last_seen'] > self.max_age}
+        fresh = sorted((label for label in self.identities if label not in stale),
+                       key=lambda label: self.identities[label]['last_seen'], reverse=True)
+        stale.update(fresh[self.capacity:])
+        for label in stale:
+            del self.identities[label]
+        labels = self._recognizer.getLabels()
+        labels = np.zeros(0, dtype=np.int32) if labels is None else labels.ravel()
+        keep = [i for i, label in enumerate(labels) if int(label) in self.identities]
+        if len(keep) == len(labels):
+            return bool(stale)
+        histograms = self._recognizer.getHistograms()
+        self._rewrite([histograms[i] for i in keep], labels[keep])
+        return True
+
+    def _rewrite(self, histograms, labels):
+        """Replace the recognizer with one holding only the given samples."""
+        old = self._recognizer
+        recognizer = cv2.face.LBPHFaceRecognizer_create(old.getRadius(), old.getNeighbors(), old.getGridX(),
+                                                        old.getGridY(), old.getThreshold())
+        if histograms:
+            # LBPH has no way to drop samples, so write the kept ones as a
+            # model file and read that back
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp.yml.gz"
+            fs = cv2.FileStorage(tmp, cv2.FILE_STORAGE_WRITE)
+            fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+            fs.write("threshold", old.getThreshold())
+            fs.write("radius", old.getRadius())
+            fs.write("neighbors", old.getNeighbors())
+            fs.write("grid_x", old.getGridX())
+            fs.write("grid_y", old.getGridY())
+            fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+            for histogram in histograms:
+                fs.write("", histogram)
+            fs.endWriteStruct()
+            fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(1, -1))
+            fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+            fs.endWriteStruct()
+            fs.endWriteStruct()
+            fs.release()
+            recognizer.read(tmp)
+            os.remove(tmp)
+        self._recognizer = recognizer
+        self._samples = len(histograms)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp.yml.gz"
+        self._recognizer.write(tmp)
+        os.replace(tmp, self.path)
+        tmp = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({str(label): entry for label, entry in self.identities.items()}, f, indent=1)
+        os.replace(tmp, self.meta_path)
+        self._dirty = False
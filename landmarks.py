@@ -0,0 +1,118 @@
+"""
+Landmark predictors that always answer in the 68-point layout.
+
+The geometry only reads a handful of jaw, chin and brow landmarks, so a
+dlib shape predictor trained on just those points (see train_predictor.py)
+is a fraction of the stock model's ~100 MB and quicker to load and run.
+Such a model is saved with a JSON layout file beside it listing the
+68-point index of each of its parts. LandmarkPredictor reads that file and
+returns (68, 2) arrays either way, with NaN for landmarks the model does
+not predict, so indexing, mirroring and smoothing work unchanged.
+"""
+import json
+import os
+
+import numpy as np
+
+from face_shape import (BROW_TOP, CHEEKBONE_LEFT, CHEEKBONE_RIGHT, FOREHEAD_LEFT, FOREHEAD_RIGHT, JAW_BOTTOM,
+                        JAW_LEFT, JAW_RIGHT, MIRROR_INDEX, PREDICTOR_PATH, landmarks_to_points)
+
+FULL_PARTS = tuple(range(68))
+
+# The landmarks compute_features reads, plus their mirror images so that
+# mirrored frames keep them (brow point 19 mirrors to 24)
+_GEOMETRY_PARTS = {FOREHEAD_LEFT, FOREHEAD_RIGHT, CHEEKBONE_LEFT, CHEEKBONE_RIGHT,
+                   JAW_LEFT, JAW_RIGHT, JAW_BOTTOM, BROW_TOP}
+REDUCED_PARTS = tuple(sorted(_GEOMETRY_PARTS | {int(MIRROR_INDEX[i]) for i in _GEOMETRY_PARTS}))
+REDUCED_PREDICTOR_PATH = os.path.join("tools", "shape_predictor_face_shape.dat")
+
+# Landmarks identity.align_face needs
+EYE_PARTS = tuple(range(36, 48))
+
+
+def layout_path(predictor_path):
+    """The JSON layout file that goes with a predictor file."""
+    return os.path.splitext(predictor_path)[0] + ".json"
+
+
+def read_layout(predictor_path):
+    """
+    Load a predictor's layout file
+
+    Args:
+        predictor_path (str): Path of the .dat predictor
+
+    Returns:
+        dict: The layout, whose 'parts' lists the 68-point index of each
+            predicted part; the full layout when there is no layout file
+    """
+    path = layout_path(predictor_path)
+    if not os.path.exists(path):
+        return {'parts': list(FULL_PARTS)}
+    with open(path, encoding="utf-8") as f:
+        layout = json.load(f)
+    parts = layout.get('parts')
+    if not parts or any(not 0 <= int(i) < 68 for i in parts) or len(set(parts)) != len(parts):
+        raise ValueError(f"{path} must list distinct 68-point landmark indices under 'parts'")
+    return layout
+
+
+def default_predictor_path(needs=()):
+    """
+    REDUCED_PREDICTOR_PATH if it exists and predicts the geometry's
+    landmarks and every one in `needs`, else the full PREDICTOR_PATH
+    """
+    try:
+        parts = read_layout(REDUCED_PREDICTOR_PATH)['parts'] if os.path.exists(REDUCED_PREDICTOR_PATH) else ()
+    except (OSError, ValueError):
+        parts = ()
+    if set(REDUCED_PARTS) | set(needs) <= set(parts):
+        return REDUCED_PREDICTOR_PATH
+    return PREDICTOR_PATH
+
+
+def write_layout(predictor_path, parts, **info):
+    """Write the layout file for a predictor predicting `parts`, with any extra info."""
+    with open(layout_path(predictor_path), "w", encoding="utf-8") as f:
+        json.dump(dict(info, parts=[int(i) for i in parts]), f, indent=1)
+
+
+class LandmarkPredictor:
+    """
+    A dlib shape predictor and its layout.
+
+    Calling it with an image and a dlib.rectangle returns (68, 2) landmark
+    coordinates. A full model's come back as integers, exactly as before;
+    a reduced model's are floats with NaN where it predicts nothing.
+    """
+
+    def __init__(self, path):
+        import dlib
+
+        self.path = path
+        self.layout = read_layout(path)
+        self.parts = tuple(int(i) for i in self.layout['parts'])
+        self.reduced = self.parts != FULL_PARTS
+        self.size = os.path.getsize(path)
+        self._index = np.array(self.parts)
+        self._predictor = dlib.shape_predictor(path)
+
+    def covers(self, indices):
+        """True if every landmark in `indices` is predicted."""
+        return set(indices) <= set(self.parts)
+
+    def __call__(self, image, box):
+        detection = self._predictor(image, box)
+        if detection.num_parts != len(self.parts):
+            raise ValueError(f"{self.path} predicts {detection.num_parts} landmarks but its layout lists "
+                             f"{len(self.parts)}; is {layout_path(self.path)} missing or stale?")
+        if not self.reduced:
+            return landmarks_to_points(detection)
+        points = np.full((68, 2), np.nan)
+        points[self._index] = landmarks_to_points(detection)
+        return points
+
+    def describe(self):
+        """Short description for logs and reports."""
+        kind = f"{len(self.parts)}-point" if self.reduced else "68-point"
+        return f"{os.path.basename(self.path)} ({kind}, {self.size / 1e6:.1f} MB)"
@@ -0,0 +1,76 @@
+"""
+Background loading of the face detector and shape predictor.
+
+Importing cv2/dlib and reading the ~100 MB landmark model take seconds, so
+windows start a ModelLoader and keep responding while it works. One loader
+can be shared by every screen in the process, so the models are loaded once.
+"""
+import os
+import threading
+import time
+
+
+class ModelLoader:
+    """
+    Loads a detector backend, the dlib shape predictor (as a
+    landmarks.LandmarkPredictor, full or reduced) and the face shape model
+    on a thread.
+
+    Without a `predictor_path`, the reduced model from train_predictor.py is
+    used when it is installed, unless `eye_landmarks` asks for a model that
+    also predicts the eyes.
+
+    `status` is a short progress message for the UI. Once `ready` is set,
+    either `detector`, `predictor` and `shape_model` are available or
+    `error` holds the exception that stopped loading.
+    """
+
+    def __init__(self, detector_backend='hog', detector_options=None, predictor_path=None,
+                 shape_model_path=None, eye_landmarks=False):
+        self.detector_backend = detector_backend
+        self.detector_options = detector_options or {}
+        self.predictor_path = predictor_path
+        self.eye_landmarks = eye_landmarks
+        self.shape_model_path = shape_model_path
+        self.detector = None
+        self.predictor = None
+        self.shape_model = None
+        self.error = None
+        self.status = "Waiting to load models"
+        self.seconds = None
+        self.ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Begin loading if it has not started yet; returns self."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self.status = "Loading face detector..."
+            from detectors import create_detector
+            from face_shape import ShapeModel, default_model
+            from landmarks import EYE_PARTS, LandmarkPredictor, default_predictor_path
+
+            self.detector = create_detector(self.detector_backend, **self.detector_options)
+
+            self.status = "Loading landmark model..."
+            predictor_path = self.predictor_path or default_predictor_path(EYE_PARTS if self.eye_landmarks else ())
+            if not os.path.exists(predictor_path):
+                raise FileNotFoundError(f"Predictor file not found at: {predictor_path}")
+            self.predictor = LandmarkPredictor(predictor_path)
+            self.predictor_path = predictor_path
+
+            self.status = "Loading face shape model..."
+            self.shape_model = ShapeModel.load(self.shape_model_path) if self.shape_model_path else default_model()
+            self.status = "Models ready"
+        except Exception as e:
+            self.error = e
+            self.status = f"Error loading models: {e}"
+        finally:
+            self.seconds = time.perf_counter() - start
+            self.ready.set()
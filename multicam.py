@@ -0,0 +1,406 @@
+"""
+Multi-camera kiosk host.
+
+One process serves several cameras, such as the chairs of a salon, with a
+single copy of the face detector, landmark model and shape model. Each
+camera gets a pipeline.CameraChannel with its own capture thread, tracker
+and caches, its own votes and a panel in a shared window. One
+pipeline.InferencePool analyzes the frames of every camera in turn, so a
+busy camera cannot starve the others.
+
+Per-camera capture and inference rates, queue depth, queue wait and
+analysis cost are printed every --stats-interval seconds. They can also be
+drawn on each panel, and are summarised on exit. Finished analyses go to
+the results database with the camera name appended to the kiosk ID (see
+analytics.py).
+
+Example:
+    python multicam.py 0 1
+    python multicam.py 0 rtsp://chair2/stream --workers 2 --stats-overlay --stats-interval 2
+"""
+import math
+import threading
+import time
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+# cv2, dlib, numpy and PIL are imported where first needed, as in app.py
+from models import ModelLoader
+
+
+class CameraView:
+    """One camera's panel: video, analysis status and hairstyle strip, plus its votes."""
+
+    def __init__(self, parent, name, spec, size, thumbnails_per_gender=3):
+        self.name = name
+        self.spec = spec
+        self.size = size
+        self.frame = ttk.Frame(parent, padding=6)
+        ttk.Label(self.frame, text=name, font=("Cambria", 14, "bold")).pack(anchor="w")
+        self.video_label = ttk.Label(self.frame)
+        self.video_label.pack()
+        self.status_label = ttk.Label(self.frame, text="Starting...", font=("Cambria", 12),
+                                      wraplength=size[0], justify="left")
+        self.status_label.pack(anchor="w", pady=(4, 0))
+        strip = ttk.Frame(self.frame)
+        strip.pack(anchor="w", pady=(4, 0))
+        self.hairstyle_labels = [ttk.Label(strip) for _ in range(2 * thumbnails_per_gender)]
+        for label in self.hairstyle_labels:
+            label.pack(side="left", padx=2)
+        self.thumbnails_per_gender = thumbnails_per_gender
+        self.source = None
+        self.source_error = None
+        self.channel = None
+        self.sink = None
+        self.sessions = None
+        self.shape = None
+        self.hairstyles = []
+        self.stats_lines = []
+        self.done = False
+
+    def show_hairstyles(self, thumbnails, shape):
+        if shape == self.shape:
+            return
+        self.shape = shape
+        photos, self.hairstyles = [], []
+        for gender in ("male", "female"):
+            self.hairstyles += thumbnails.list_images(gender, shape)[:self.thumbnails_per_gender]
+            photos += thumbnails.photos_for(gender, shape)[:self.thumbnails_per_gender]
+        for i, label in enumerate(self.hairstyle_labels):
+            photo = photos[i] if i < len(photos) else ''
+            label.configure(image=photo)
+            label._image = photo  # Keep a reference
+
+
+class MultiCameraHost:
+    """
+    Window with one CameraView per source, all fed by one InferencePool.
+
+    The models are loaded and the sources opened in the background, as in
+    app.FaceShapeRecognizer. A source that fails to open is reported on its
+    panel and left out; the others run normally.
+    """
+
+    def __init__(self, specs, view_size=(480, 360), workers=1, queue_size=2, detect_every=10,
+                 track_min_confidence=7.0, detection_width=320, detector_backend='hog', detector_options=None,
+                 predictor_path=None, shape_model_path=None, realtime=False, loop=False, mirror=True,
+                 analysis_time=10.0, face_timeout=3.0, scoring=None, static_threshold=2.0, max_reuse=15,
+                 governor_options=None, results_db=None, kiosk_id=None, stats_interval=10.0,
+                 stats_overlay=False):
+        self.view_size = view_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.detect_every = detect_every
+        self.track_min_confidence = track_min_confidence
+        self.detection_width = detection_width
+        self.realtime = realtime
+        self.loop = loop
+        self.mirror = mirror
+        self.analysis_time = analysis_time
+        self.face_timeout = face_timeout
+        self.scoring = scoring or {}
+        self.static_threshold = static_threshold
+        self.max_reuse = max_reuse
+        # None uses the governor defaults, False analyzes every frame
+        self.governor_options = {} if governor_options is None else governor_options
+        self.results_db = results_db
+        self.kiosk_id = kiosk_id
+        self.stats_interval = stats_interval
+        self.stats_overlay = stats_overlay
+        self.display_interval = 15  # ms between UI polls
+        self.pool = None
+        self.results = None
+        self.thumbnails = None
+        self.is_running = False
+        self._next_stats = None
+
+        self.root = tk.Tk()
+        self.root.title("Face Shape Recognition - Multi-camera")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        columns = math.ceil(math.sqrt(len(specs)))
+        self.views = []
+        for i, spec in enumerate(specs):
+            view = CameraView(self.root, f"Camera {i + 1}", spec, view_size)
+            view.frame.grid(row=i // columns, column=i % columns, sticky="nw")
+            self.views.append(view)
+
+        self.models = ModelLoader(detector_backend, detector_options, predictor_path,
+                                  shape_model_path=shape_model_path).start()
+        self.source_thread = threading.Thread(target=self.open_sources, name="open-sources", daemon=True)
+        self.source_thread.start()
+        self.root.after(100, self.check_loading)
+
+    def open_sources(self):
+        """Open every frame source; runs on a background thread."""
+        from sources import open_source
+        for view in self.views:
+            try:
+                view.source = open_source(view.spec, realtime=self.realtime, loop=self.loop)
+                print(f"{view.name}: opened {view.source.describe()}")
+            except Exception as e:
+                view.source_error = e
+
+    def check_loading(self):
+        """Poll background loading from the Tk thread until it is done."""
+        if not self.models.ready.is_set() or self.source_thread.is_alive():
+            for view in self.views:
+                if view.source is None:
+                    view.status_label.config(text=self.models.status)
+            self.root.after(100, self.check_loading)
+            return
+        for view in self.views:
+            if view.source_error is not None:
+                view.status_label.config(text=f"Could not open {view.spec}: {view.source_error}")
+                print(f"{view.name}: could not open {view.spec}: {view.source_error}")
+        if self.models.error is not None:
+            messagebox.showerror("Error", f"Error loading dlib models: {self.models.error}")
+            self.on_closing()
+            return
+        if not any(view.source is not None for view in self.views):
+            messagebox.showerror("Error", "None of the video sources could be opened")
+            self.on_closing()
+            return
+        print(f"Models loaded in {self.models.seconds:.1f}s (landmarks: {self.models.predictor.describe()}), "
+              f"shared by {sum(view.source is not None for view in self.views)} cameras")
+        self.start()
+
+    def start(self):
+        from display import VideoSink
+        from pipeline import CameraChannel, FrameAnalyzer, InferencePool, SerializedModel, StaticFaceCache
+        from profiling import StageProfiler
+        from tracking import FaceTracker
+        from voting import FaceSessions, scoring_for
+
+        # One copy of each model for every camera; calls are serialized
+        # when several workers could make them at once
+        detector, predictor = self.models.detector, self.models.predictor
+        if self.workers > 1:
+            detector, predictor = SerializedModel(detector), SerializedModel(predictor)
+
+        channels = []
+        for view in self.views:
+            if view.source is None:
+                continue
+            tracker = FaceTracker(detector, self.detect_every, self.track_min_confidence)
+            static_cache = StaticFaceCache(self.static_threshold, self.max_reuse) if self.static_threshold > 0 else None
+            analyzer = FrameAnalyzer(tracker, predictor, self.detection_width, StageProfiler(), mirror=self.mirror,
+                                     static_cache=static_cache, shape_model=self.models.shape_model)
+            governor = None
+            if self.governor_options is not False:
+                from governor import RateGovernor
+                governor = RateGovernor(on_transition=self._transition_reporter(view.name), **self.governor_options)
+            view.channel = CameraChannel(view.name, view.source, self.view_size, analyzer, self.queue_size, governor)
+            view.sink = VideoSink(view.video_label, self.view_size)
+            view.sessions = FaceSessions(self.analysis_time, self.face_timeout,
+                                         scoring_for(self.models.shape_model, self.scoring))
+            view.status_label.config(text="Face Shape: Unknown")
+            channels.append(view.channel)
+
+        if self.results_db is not False:
+            from analytics import RESULTS_PATH, ResultStore, default_kiosk
+            self.kiosk_id = self.kiosk_id or default_kiosk()
+            self.results = ResultStore.open(self.results_db or RESULTS_PATH, kiosk=self.kiosk_id)
+
+        self.pool = InferencePool(channels, self.workers)
+        self.pool.start()
+        self.is_running = True
+        self._next_stats = time.perf_counter() + self.stats_interval
+        self.root.after(self.display_interval, self.update_display)
+
+    @staticmethod
+    def _transition_reporter(name):
+        def report(old, new, reason):
+            print(f"{name}: frame rate governor {old} -> {new} ({reason})")
+        return report
+
+    def update_display(self):
+        """Route each camera's newest result to its panel; runs on the Tk thread only."""
+        if not self.is_running:
+            return
+        now = time.time()
+        for view in self.views:
+            if view.channel is None or view.done:
+                continue
+            result = view.channel.results.get_nowait()
+            if result is not None:
+                self.show_result(view, result, now)
+            elif view.channel.finished.is_set():
+                view.done = True
+                view.status_label.config(text="End of video source")
+
+        if time.perf_counter() >= self._next_stats:
+            self._next_stats += self.stats_interval
+            self.report_stats()
+        if self.pool.finished and all(view.done or view.channel is None for view in self.views):
+            print("All sources finished")
+            return
+        self.root.after(self.display_interval, self.update_display)
+
+    def show_result(self, view, result, now):
+        """Draw one frame on a camera's panel and add its faces to that camera's votes."""
+        view.sink.load(result.frame, mirror=result.mirrored)
+        several = len(result.faces) > 1
+        for face_id, (face, points), shape, scores, ratios in zip(result.face_ids, result.faces, result.labels,
+                                                                  result.scores, result.ratios):
+            face_shape, session, decided = view.sessions.add(face_id, shape, now, scores, None, ratios)
+            if decided:
+                self.finish_analysis(view, session, now)
+            view.sink.draw_face(face, points, f"#{face_id} {face_shape}" if several else face_shape)
+
+        view.sessions.prune(now)
+        pending = view.sessions.pending()
+        if pending:
+            view.status_label.config(text="Analysis in progress... " + ", ".join(
+                f"#{s.face_id}: {s.remaining()}s" if several else f"{s.remaining()}s" for s in pending))
+        elif not view.sessions and view.shape is None:
+            view.status_label.config(text="Face Shape: Unknown")
+        if self.stats_overlay:
+            view.sink.draw_lines(view.stats_lines)
+        view.sink.show()
+
+    def finish_analysis(self, view, session, now):
+        if self.thumbnails is None:
+            from thumbnails import ThumbnailStore
+            self.thumbnails = ThumbnailStore(min(96, self.view_size[0] // 6))
+        view.show_hairstyles(self.thumbnails, session.result)
+        text = f"Face #{session.face_id}: {session.result}"
+        if self.models.shape_model.calibrated:
+            text += f" ({session.confidence:.0%} confidence)"
+        view.status_label.config(text=text)
+        if self.results is not None:
+            self.results.record_session(session, now, view.hairstyles, kiosk=f"{self.kiosk_id}/{view.name}",
+                                        source=view.source.describe())
+
+    def report_stats(self):
+        """Print, and keep for the overlay, each camera's rates and queue figures since the last report."""
+        pending = sum(len(view.channel.frames) for view in self.views if view.channel is not None)
+        print(f"Inference pool: {self.workers} worker(s), {pending} frame(s) waiting")
+        for view in self.views:
+            if view.channel is None:
+                continue
+            s = view.channel.stats()
+            view.stats_lines = [
+                f"capture {s['capture_fps']:.1f} fps, inference {s['inference_fps']:.1f} fps",
+                f"queue {s['queue_depth']:.2f} (max {s['queue_depth_max']}), wait {s['wait_ms']:.0f} ms, "
+                f"cost {s['cost_ms']:.0f} ms",
+            ]
+            print(f"  {view.name}: " + "; ".join(view.stats_lines) +
+                  f"; dropped {s['dropped_before_inference']} before inference, "
+                  f"{s['dropped_before_display']} before display")
+
+    def shutdown(self):
+        self.is_running = False
+        if self.pool is not None:
+            self.pool.stop()
+            for view in self.views:
+                if view.channel is None:
+                    continue
+                channel = view.channel
+                print(f"{view.name}: {channel.capture_thread.frames_read} frames read, {channel.analyzed} analyzed; "
+                      f"{channel.analyzer.tracker.summary()}")
+                if channel.governor is not None:
+                    print(f"{view.name}: governor {channel.governor.summary()}")
+            self.pool = None
+        if self.results is not None:
+            self.results.close()
+            print(self.results.summary())
+            self.results = None
+        for view in self.views:
+            if view.source is not None:
+                view.source.release()
+                view.source = None
+
+    def on_closing(self):
+        self.shutdown()
+        self.root.destroy()
+
+    def run(self):
+        self.root.mainloop()
+
+
+if __name__ == "__main__":
+    import argparse
+    from detectors import add_detector_arguments, detector_options
+
+    def parse_size(text):
+        width, height = text.lower().split("x")
+        return int(width), int(height)
+
+    parser = argparse.ArgumentParser(description="Face shape recognition on several cameras in one process")
+    parser.add_argument("sources", nargs="+",
+                        help="Camera indexes, video files, image directories or globs, or stream URLs")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Inference threads shared by all cameras")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Newest frames kept per camera while waiting for inference")
+    parser.add_argument("--view-size", type=parse_size, default=(480, 360), help="Panel video size WxH")
+    parser.add_argument("--detect-every", type=int, default=10,
+                        help="Run the face detector every N frames and track in between (1 = every frame)")
+    parser.add_argument("--track-min-confidence", type=float, default=7.0,
+                        help="Re-detect when tracker confidence drops below this value")
+    parser.add_argument("--detection-width", type=int, default=320,
+                        help="Width in pixels to downscale frames to for face detection (0 = full resolution)")
+    parser.add_argument("--static-threshold", type=float, default=2.0,
+                        help="Reuse landmarks while a face region changes by at most this many grey levels (0 = off)")
+    parser.add_argument("--max-reuse", type=int, default=15,
+                        help="Predict landmarks again after reusing them for this many frames in a row")
+    parser.add_argument("--predictor", metavar="PATH",
+                        help="dlib shape predictor, 68-point or reduced from train_predictor.py")
+    parser.add_argument("--shape-model", metavar="PATH", help="Face shape prototypes from fit_shapes.py")
+    parser.add_argument("--analysis-time", type=float, default=10.0, help="Seconds to analyze each face")
+    parser.add_argument("--decision-confidence", type=float, default=0.9,
+                        help="Shape probability needed to finish the analysis early (fitted shape models only)")
+    parser.add_argument("--target-fps", type=float, default=15.0,
+                        help="Most frames analyzed per second per camera (0 = no cap)")
+    parser.add_argument("--idle-after", type=float, default=10.0,
+                        help="Seconds without a face before a camera only checks for motion (0 = never idle)")
+    parser.add_argument("--no-governor", action="store_true", help="Analyze every camera as fast as possible")
+    parser.add_argument("--no-mirror", action="store_true", help="Show frames as captured")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Play recorded media at its own frame rate instead of as fast as possible")
+    parser.add_argument("--loop", action="store_true", help="Restart recorded media when it ends")
+    parser.add_argument("--results-db", metavar="PATH",
+                        help="SQLite database finished analyses are stored in (default: .cache/results.db; "
+                             "see analytics.py)")
+    parser.add_argument("--no-results", action="store_true", help="Do not store finished analyses")
+    parser.add_argument("--kiosk-id", help="Name stored with each result, before the camera name (default: host name)")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="Seconds between per-camera rate and queue reports")
+    parser.add_argument("--stats-overlay", action="store_true", help="Draw the latest report on each panel")
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.queue_size < 1:
+        parser.error("--workers and --queue-size must be at least 1")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    host = MultiCameraHost(args.sources,
+                           view_size=args.view_size,
+                           workers=args.workers,
+                           queue_size=args.queue_size,
+                           detect_every=args.detect_every,
+                           track_min_confidence=args.track_min_confidence,
+                           detection_width=args.detection_width,
+                           detector_backend=args.detector,
+                           detector_options=options,
+                           predictor_path=args.predictor,
+                           shape_model_path=args.shape_model,
+                           realtime=args.realtime,
+                           loop=args.loop,
+                           mirror=not args.no_mirror,
+                           analysis_time=args.analysis_time,
+                           scoring={'threshold': args.decision_confidence},
+                           static_threshold=args.static_threshold,
+                           max_reuse=args.max_reuse,
+                           governor_options=False if args.no_governor else {
+                               'target_fps': args.target_fps,
+                               'idle_after': args.idle_after,
+                           },
+                           results_db=False if args.no_results else args.results_db,
+                           kiosk_id=args.kiosk_id,
+                           stats_interval=args.stats_interval,
+                           stats_overlay=args.stats_overlay)
+    host.run()
@@ -0,0 +1,750 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from face_shape import RATIO_KEYS, mirror_points, score_points, scores_to_labels
+from landmarks import LandmarkPredictor
+from profiling import StageProfiler
+
+
+class LatestQueue:
+    """
+    Bounded queue where new items push out the oldest unread ones.
+
+    Producers never block: if the consumer falls behind, stale items are
+    dropped so the consumer always sees the most recent data. `on_put`, if
+    set, is called after every put, outside the queue's lock.
+    """
+
+    def __init__(self, maxsize=1, on_put=None):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.on_put = on_put
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if self.on_put is not None:
+            self.on_put()
+
+    def get(self, timeout=None):
+        """Wait for an item; returns None on timeout or once closed."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get_nowait(self):
+        with self._cond:
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+
+def scale_rect(rect, sx, sy):
+    """Scale a dlib rectangle's coordinates by (sx, sy)."""
+    return dlib.rectangle(int(round(rect.left() * sx)), int(round(rect.top() * sy)),
+                          int(round(rect.right() * sx)), int(round(rect.bottom() * sy)))
+
+
+def mirror_rect(rect, width):
+    """Flip a dlib rectangle horizontally within a frame `width` pixels wide."""
+    return dlib.rectangle(width - 1 - rect.right(), rect.top(), width - 1 - rect.left(), rect.bottom())
+
+
+# Per-process shape predictor, set up once by _init_landmark_worker
+_worker_predictor = None
+
+
+def _init_landmark_worker(predictor_path):
+    global _worker_predictor
+    _worker_predictor = LandmarkPredictor(predictor_path)
+
+
+def _predict_crop(crop, box):
+    """Landmarks for a face box inside a cropped region, in crop coordinates."""
+    return _worker_predictor(crop, dlib.rectangle(*box))
+
+
+class LandmarkPool:
+    """
+    Predicts landmarks for several faces at once on a pool of processes.
+
+    Each worker loads its own shape predictor. Only a crop around each face
+    is sent, with `margin` times the box size on each side so the predictor
+    sees the same pixels it would on the full frame. A single face is
+    predicted in-process, since the hand-off would cost more than it saves.
+    """
+
+    def __init__(self, predictor, predictor_path, workers=2, margin=0.5):
+        self.predictor = predictor
+        self.margin = margin
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_landmark_worker, initargs=(predictor_path,))
+
+    def predict(self, gray, boxes):
+        """
+        Args:
+            gray (np.ndarray): Full resolution grayscale frame
+            boxes (list): dlib.rectangle face boxes in full frame coordinates
+
+        Returns:
+            list: (68, 2) landmark arrays in full frame coordinates
+        """
+        if len(boxes) < 2:
+            return [self.predictor(gray, box) for box in boxes]
+
+        height, width = gray.shape[:2]
+        futures = []
+        for box in boxes:
+            pad = int(self.margin * max(box.width(), box.height()))
+            x0, y0 = max(0, box.left() - pad), max(0, box.top() - pad)
+            x1, y1 = min(width, box.right() + pad + 1), min(height, box.bottom() + pad + 1)
+            local = (box.left() - x0, box.top() - y0, box.right() - x0, box.bottom() - y0)
+            future = self._executor.submit(_predict_crop, gray[y0:y1, x0:x1], local)
+            futures.append((future, (x0, y0)))
+        return [future.result() + offset for future, offset in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FrameResult:
+    """A display-sized frame plus the faces found in it."""
+
+    def __init__(self, frame, faces, mode=None, cost_ms=0.0, seq=None, timestamp=None,
+                 face_ids=None, labels=None, mirrored=False, scores=None, identities=None, ratios=None):
+        self.frame = frame
+        # True when the faces are in mirrored coordinates but the frame itself
+        # is not flipped yet; the display mirrors it while converting colours
+        self.mirrored = mirrored
+        # List of (dlib.rectangle, (68, 2) landmark array) pairs
+        self.faces = faces
+        # Track ID and per-frame shape label for each face, in the same order
+        self.face_ids = face_ids if face_ids is not None else list(range(1, len(faces) + 1))
+        self.labels = labels if labels is not None else [None] * len(faces)
+        # Per-frame shape probabilities for each face, in face_shape.SHAPES order
+        self.scores = scores if scores is not None else [None] * len(faces)
+        # Per-frame face_shape.RATIO_KEYS values for each face
+        self.ratios = ratios if ratios is not None else [None] * len(faces)
+        # Stored identity of each face recognised as a returning customer, else None
+        self.identities = identities if identities is not None else [None] * len(faces)
+        # Whether the faces were detected, tracked or reused, and what it cost
+        self.mode = mode
+        self.cost_ms = cost_ms
+        # Sequence number and perf_counter() read time of the source frame
+        self.seq = seq
+        self.timestamp = timestamp
+
+
+class CapturedFrame:
+    """A decoded frame stamped with its read order and read time."""
+
+    __slots__ = ('seq', 'timestamp', 'frame', 'display')
+
+    def __init__(self, seq, timestamp, frame, display):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+        self.display = display
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads frames from a FrameSource as fast as it delivers them.
+
+    Each frame is resized for display and queued as a CapturedFrame
+    holding both sizes, so landmarks can be predicted on the
+    full frame while the UI gets a frame it can draw directly. The queue
+    keeps only the newest frame: when inference falls behind, older frames
+    are dropped instead of piling up, so latency stays bounded. Sequence
+    numbers count every frame read, so gaps show what was dropped.
+
+    When a finite source (video file, image sequence) runs out, `finished`
+    is set and the thread exits.
+    """
+
+    def __init__(self, source, frame_size, frame_queue, stop_event, profiler=None):
+        super().__init__(name="capture", daemon=True)
+        self.source = source
+        self.frame_size = frame_size
+        self.frame_queue = frame_queue
+        self.stop_event = stop_event
+        self.profiler = profiler or StageProfiler()
+        self.finished = threading.Event()
+        self.frames_read = 0
+
+    def run(self):
+        profiler = self.profiler
+        while not self.stop_event.is_set():
+            with profiler.stage("read"):
+                frame = self.source.read()
+            if frame is None:
+                if self.source.finished:
+                    self.finished.set()
+                    return
+                self.stop_event.wait(0.01)
+                continue
+            timestamp = time.perf_counter()
+            seq = self.frames_read
+            self.frames_read += 1
+            with profiler.stage("resize"):
+                display = cv2.resize(frame, self.frame_size)
+            self.frame_queue.put(CapturedFrame(seq, timestamp, frame, display))
+            profiler.tick("capture")
+
+
+class _CachedFace:
+    __slots__ = ('signature', 'box', 'points', 'reuses')
+
+    def __init__(self, signature, box, points):
+        self.signature = signature
+        self.box = box
+        self.points = points
+        self.reuses = 0
+
+
+class StaticFaceCache:
+    """
+    Reuses landmarks while faces hold still.
+
+    Each face's region in the detection-sized frame is reduced to a small
+    thumbnail. The face counts as unchanged while the mean absolute
+    difference to the thumbnail taken when its landmarks were predicted is at
+    most `threshold` grey levels, and then its landmarks are reused for up to
+    `max_reuse` frames in a row before being predicted again. When the whole
+    scene and every face are unchanged, the previous frame's result is reused
+    outright and face location is skipped too, which covers an idle kiosk
+    with nobody in view.
+    """
+
+    def __init__(self, threshold=2.0, max_reuse=15, size=16):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self._scene = None
+        self._faces = {}
+        self._last = None
+        self._scene_reuses = 0
+
+    def signature(self, gray, box=None):
+        if box is not None:
+            gray = gray[max(0, box.top()):box.bottom() + 1, max(0, box.left()):box.right() + 1]
+            if gray.size == 0:
+                return None
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _unchanged(self, old, new):
+        return old is not None and new is not None and np.abs(old - new).mean() <= self.threshold
+
+    def reuse_frame(self, small):
+        """The last (face_ids, faces, labels, scores, ratios) if nothing in view has changed, else None."""
+        if self._last is None or self._scene_reuses >= self.max_reuse:
+            return None
+        if not self._unchanged(self._scene, self.signature(small)):
+            return None
+        for entry in self._faces.values():
+            if not self._unchanged(entry.signature, self.signature(small, entry.box)):
+                return None
+        self._scene_reuses += 1
+        return self._last
+
+    def reuse_face(self, small, face_id, box):
+        """
+        Returns:
+            tuple: (cached full frame landmarks or None, the face's new signature)
+        """
+        signature = self.signature(small, box)
+        entry = self._faces.get(face_id)
+        if entry is not None and entry.reuses < self.max_reuse and self._unchanged(entry.signature, signature):
+            entry.reuses += 1
+            return entry.points, signature
+        return None, signature
+
+    def update(self, small, faces, last):
+        """
+        Remember the faces of a frame that was analyzed
+
+        Args:
+            small (np.ndarray): Detection-sized grayscale frame
+            faces (dict): face ID -> (signature, box, full frame landmarks, reused);
+                only faces with fresh landmarks replace their cache entry
+            last (tuple): (face_ids, faces, labels, scores, ratios) to hand back from reuse_frame
+        """
+        entries = {}
+        for face_id, (signature, box, points, reused) in faces.items():
+            entry = self._faces.get(face_id) if reused else None
+            entries[face_id] = entry or _CachedFace(signature, box, points)
+        self._faces = entries
+        self._scene = self.signature(small)
+        self._scene_reuses = 0
+        self._last = last
+
+
+class FrameAnalyzer:
+    """
+    Face location and landmark prediction for one frame.
+
+    Faces are located on a copy downscaled to `detection_width` pixels wide,
+    so detection cost does not depend on camera or display resolution. The
+    boxes are mapped back and the landmarks.LandmarkPredictor runs on the
+    full frame, spread over a LandmarkPool when one is given. All faces in the frame
+    are then scored in one batch by `shape_model` (default: the face_shape
+    default model). Results are reported in display coordinates.
+
+    With `mirror`, frames are analyzed as captured and only the results are
+    flipped, as if the frame had been mirrored first. That saves flipping
+    every full resolution frame; the display mirrors its own small copy.
+
+    With a StaticFaceCache, landmarks of faces that have not moved are
+    reused instead of predicted again (see StaticFaceCache). With a
+    LandmarkSmoother, each face's landmarks are filtered over time before
+    classification, which steadies the per-frame label. With an
+    identity.IdentityCache, new faces are checked against returning
+    customers over their first few frames.
+    """
+
+    def __init__(self, tracker, predictor, detection_width=None, profiler=None, landmark_pool=None,
+                 mirror=False, static_cache=None, smoother=None, shape_model=None, identities=None):
+        self.tracker = tracker
+        self.predictor = predictor
+        self.detection_width = detection_width
+        self.profiler = profiler or StageProfiler()
+        self.landmark_pool = landmark_pool
+        self.mirror = mirror
+        self.static_cache = static_cache
+        self.smoother = smoother
+        self.shape_model = shape_model
+        self.identities = identities
+
+    def analyze(self, frame, display, seq=None, timestamp=None):
+        """
+        Args:
+            frame (np.ndarray): Full resolution BGR frame
+            display (np.ndarray): The same frame resized for display
+            seq (int): Source sequence number, passed through to the result
+            timestamp (float): Source read time in seconds, passed through to the
+                result and used as the smoothing clock (default: now)
+
+        Returns:
+            FrameResult: The display frame, faces in display coordinates, their
+                track IDs, shape labels and shape probabilities
+        """
+        profiler = self.profiler
+        start = time.perf_counter()
+        with profiler.stage("grayscale"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+
+        # Locate faces on a small copy, then map boxes to full resolution
+        scale = 1.0
+        small = gray
+        if self.detection_width and width > self.detection_width:
+            scale = self.detection_width / width
+            with profiler.stage("downscale"):
+                small = cv2.resize(gray, (self.detection_width, int(round(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+
+        cache = self.static_cache
+        if cache is not None:
+            with profiler.stage("static_check"):
+                last = cache.reuse_frame(small)
+            if last is not None:
+                face_ids, faces, labels, scores, ratios = last
+                cost_ms = (time.perf_counter() - start) * 1000
+                self.tracker.record('reuse', cost_ms)
+                profiler.tick("inference")
+                return FrameResult(display, faces, 'reuse', cost_ms, seq, timestamp,
+                                   face_ids, labels, self.mirror, scores, ratios=ratios)
+
+        with profiler.stage("locate"):
+            boxes, mode = self.tracker.locate(small)
+        face_ids = list(self.tracker.face_ids)
+
+        # Landmarks on the full frame, reported in display coordinates
+        display_sx = display.shape[1] / width
+        display_sy = display.shape[0] / height
+        full_boxes = [scale_rect(box, 1 / scale, 1 / scale) if scale != 1.0 else box for box in boxes]
+        points = [None] * len(boxes)
+        cached = {}
+        if cache is not None:
+            with profiler.stage("static_check"):
+                for i, (face_id, box) in enumerate(zip(face_ids, boxes)):
+                    points[i], signature = cache.reuse_face(small, face_id, box)
+                    cached[face_id] = (signature, box, points[i], points[i] is not None)
+        todo = [i for i, face_points in enumerate(points) if face_points is None]
+        if todo:
+            with profiler.stage("landmarks"):
+                todo_boxes = [full_boxes[i] for i in todo]
+                if self.landmark_pool is not None:
+                    predicted = self.landmark_pool.predict(gray, todo_boxes)
+                else:
+                    predicted = [self.predictor(gray, face) for face in todo_boxes]
+            for i, face_points in zip(todo, predicted):
+                points[i] = face_points
+                if cache is not None:
+                    signature, box, _, _ = cached[face_ids[i]]
+                    cached[face_ids[i]] = (signature, box, face_points, False)
+        identities = None
+        if self.identities is not None:
+            with profiler.stage("identify"):
+                self.identities.forget_tracks(face_ids)
+                identities = [self.identities.lookup(face_id, gray, face_points)
+                              for face_id, face_points in zip(face_ids, points)]
+
+        faces = []
+        display_width = display.shape[1]
+        for face, face_points in zip(full_boxes, points):
+            face = scale_rect(face, display_sx, display_sy)
+            face_points = face_points * (display_sx, display_sy)
+            if self.mirror:
+                face = mirror_rect(face, display_width)
+                face_points = mirror_points(face_points, display_width)
+            faces.append((face, face_points))
+
+        if self.smoother is not None and faces:
+            now = timestamp if timestamp is not None else time.perf_counter()
+            with profiler.stage("smooth"):
+                faces = [(face, self.smoother.smooth(face_id, face_points, now))
+                         for face_id, (face, face_points) in zip(face_ids, faces)]
+                self.smoother.prune(now)
+
+        labels, scores, ratios = [], [], []
+        if faces:
+            with profiler.stage("classify"):
+                batch, features = score_points(np.stack([face_points for _, face_points in faces]), self.shape_model)
+                labels = [str(label) for label in scores_to_labels(batch)]
+                scores = list(batch)
+                ratios = list(np.stack([features[key] for key in RATIO_KEYS], axis=1))
+        if cache is not None:
+            cache.update(small, cached, (face_ids, faces, labels, scores, ratios))
+        cost_ms = (time.perf_counter() - start) * 1000
+        self.tracker.record(mode, cost_ms)
+        profiler.tick("inference")
+        return FrameResult(display, faces, mode, cost_ms, seq, timestamp,
+                           face_ids, labels, self.mirror, scores, identities, ratios)
+
+
+def analyze_captured(analyzer, item, governor=None):
+    """
+    Analyze one CapturedFrame, or only check it for motion while `governor` is idle
+
+    Returns:
+        FrameResult: The analysis, or a face-less result in mode 'idle'
+    """
+    if governor is not None and governor.idle:
+        start = time.perf_counter()
+        with analyzer.profiler.stage("motion"):
+            moved = governor.motion(item.display)
+        if not moved:
+            cost_ms = (time.perf_counter() - start) * 1000
+            analyzer.tracker.record('idle', cost_ms)
+            return FrameResult(item.display, [], 'idle', cost_ms, item.seq, item.timestamp,
+                               mirrored=analyzer.mirror)
+    result = analyzer.analyze(item.frame, item.display, item.seq, item.timestamp)
+    if governor is not None:
+        governor.observe(result)
+    return result
+
+
+class InferenceWorker(threading.Thread):
+    """
+    Runs a FrameAnalyzer over captured frames.
+
+    If `source_finished` is given, the worker sets `finished` and exits once
+    that event is set and every remaining frame has been analyzed.
+
+    With a governor.RateGovernor, the worker waits for the governor before
+    taking each (newest) frame. While the governor is idle, frames are only
+    checked for motion and passed on without faces, in mode 'idle'.
+    """
+
+    def __init__(self, analyzer, frame_queue, result_queue, stop_event, source_finished=None,
+                 governor=None):
+        super().__init__(name="inference", daemon=True)
+        self.analyzer = analyzer
+        self.frame_queue = frame_queue
+        self.result_queue = result_queue
+        self.stop_event = stop_event
+        self.source_finished = source_finished
+        self.governor = governor
+        self.finished = threading.Event()
+
+    def run(self):
+        governor = self.governor
+        while not self.stop_event.is_set():
+            if governor is not None and not governor.wait(self.stop_event):
+                break
+            item = self.frame_queue.get(timeout=0.1)
+            if item is None:
+                if self.source_finished is None or not self.source_finished.is_set():
+                    continue
+                # The last frame may have landed between the wait and the check
+                item = self.frame_queue.get_nowait()
+                if item is None:
+                    self.finished.set()
+                    return
+            self.result_queue.put(analyze_captured(self.analyzer, item, governor))
+
+
+class FramePipeline:
+    """
+    Capture -> inference -> UI pipeline joined by latest-frame-wins queues.
+
+    The UI side polls `results` from the Tk thread and only draws, so the
+    display keeps its own rate even when detection is slower than capture.
+    """
+
+    def __init__(self, source, frame_size, tracker, predictor, detection_width=None, profiler=None,
+                 landmark_pool=None, mirror=True, static_cache=None, smoother=None, shape_model=None,
+                 identities=None, governor=None):
+        self.stop_event = threading.Event()
+        self.frames = LatestQueue()
+        self.results = LatestQueue()
+        self.tracker = tracker
+        self.analyzer = FrameAnalyzer(tracker, predictor, detection_width, profiler,
+                                      landmark_pool, mirror, static_cache, smoother, shape_model, identities)
+        self.capture_thread = CaptureThread(source, frame_size, self.frames, self.stop_event, profiler)
+        self.governor = governor
+        self.inference_thread = InferenceWorker(self.analyzer, self.frames, self.results,
+                                                self.stop_event, self.capture_thread.finished, governor)
+
+    def start(self):
+        self.capture_thread.start()
+        self.inference_thread.start()
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        self.frames.close()
+        self.results.close()
+        for thread in (self.capture_thread, self.inference_thread):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    @property
+    def finished(self):
+        """True once a finite source has been read to the end and fully analyzed."""
+        return self.inference_thread.finished.is_set()
+
+    def summary(self):
+        """Frames read and how many were dropped before inference or display."""
+        return (f"{self.capture_thread.frames_read} frames read, "
+                f"{self.frames.dropped} dropped before inference, "
+                f"{self.results.dropped} results dropped before display")
+
+
+class CameraChannel:
+    """
+    One camera's share of an InferencePool.
+
+    A channel owns the camera's capture thread, its frame and result
+    queues, and its own FrameAnalyzer and optional governor, so tracker
+    state, caches and smoothing never mix between cameras. The frame queue
+    keeps the newest `queue_size` frames. The detector and predictor inside
+    the analyzer may be shared with other channels.
+    """
+
+    def __init__(self, name, source, frame_size, analyzer, queue_size=2, governor=None):
+        self.name = name
+        self.source = source
+        self.analyzer = analyzer
+        self.governor = governor
+        self.stop_event = threading.Event()
+        self.frames = LatestQueue(queue_size)
+        self.results = LatestQueue()
+        self.capture_thread = CaptureThread(source, frame_size, self.frames, self.stop_event, analyzer.profiler)
+        self.capture_thread.name = f"capture-{name}"
+        self.finished = threading.Event()
+        # Scheduling state, guarded by the pool's lock
+        self.busy = False
+        self.last_served = 0.0
+        # Totals for stats(): frames analyzed, ms waited in the queue and
+        # spent in analysis, and queue depth seen at each scheduling decision
+        self.analyzed = 0
+        self.wait_ms = 0.0
+        self.cost_ms = 0.0
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.depth_max = 0
+        self._mark = (time.perf_counter(), 0, 0)
+
+    def sample_depth(self):
+        depth = len(self.frames)
+        self.depth_total += depth
+        self.depth_samples += 1
+        self.depth_max = max(self.depth_max, depth)
+
+    def stats(self):
+        """
+        Rates since the previous call and running totals
+
+        Returns:
+            dict: capture_fps, inference_fps, mean queue_depth and its max,
+                mean wait_ms and cost_ms per analyzed frame, and frames
+                dropped before inference or display
+        """
+        now = time.perf_counter()
+        since, read, analyzed = self._mark
+        self._mark = (now, self.capture_thread.frames_read, self.analyzed)
+        elapsed = max(now - since, 1e-9)
+        count = max(self.analyzed, 1)
+        return {
+            'capture_fps': (self.capture_thread.frames_read - read) / elapsed,
+            'inference_fps': (self.analyzed - analyzed) / elapsed,
+            'queue_depth': self.depth_total / self.depth_samples if self.depth_samples else 0.0,
+            'queue_depth_max': self.depth_max,
+            'wait_ms': self.wait_ms / count,
+            'cost_ms': self.cost_ms / count,
+            'dropped_before_inference': self.frames.dropped,
+            'dropped_before_display': self.results.dropped,
+        }
+
+
+class InferencePool:
+    """
+    Inference threads shared by several CameraChannels.
+
+    Each of the `workers` threads takes its next frame from the channel
+    served longest ago among those with a frame waiting, no frame already
+    in analysis and, with a governor, a frame due. A camera therefore gets
+    at most one turn per round however fast it delivers, so a busy camera
+    cannot starve a quiet one. A channel's frames are analyzed one at a
+    time and in order, as its tracker needs. With at most `queue_size`
+    frames per channel, the backlog is bounded however many cameras there are.
+
+    The detector and predictor are shared, and dlib and OpenCV models are
+    not safe to call concurrently, so with several workers they should be
+    wrapped in SerializedModel. Workers still overlap on everything else.
+    """
+
+    def __init__(self, channels, workers=1):
+        self.channels = list(channels)
+        self.stop_event = threading.Event()
+        self._cond = threading.Condition()
+        for channel in self.channels:
+            channel.frames.on_put = self._wake
+        self.threads = [threading.Thread(target=self._run, name=f"inference-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+
+    def start(self):
+        for channel in self.channels:
+            channel.capture_thread.start()
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        for channel in self.channels:
+            channel.stop_event.set()
+            channel.frames.close()
+            channel.results.close()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self.threads + [channel.capture_thread for channel in self.channels]:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _claim(self):
+        """
+        Pick the next channel and take its frame; call with the lock held
+
+        Returns:
+            tuple: (channel, CapturedFrame), or (None, seconds to wait)
+        """
+        chosen, wait = None, 0.1
+        for channel in self.channels:
+            if channel.busy or channel.finished.is_set():
+                continue
+            if not len(channel.frames):
+                if channel.capture_thread.finished.is_set():
+                    channel.finished.set()
+                continue
+            if channel.governor is not None:
+                delay = channel.governor.delay()
+                if delay > 0:
+                    wait = min(wait, delay)
+                    continue
+            if chosen is None or channel.last_served < chosen.last_served:
+                chosen = channel
+        if chosen is None:
+            return None, wait
+        for channel in self.channels:
+            channel.sample_depth()
+        item = chosen.frames.get_nowait()
+        if item is None:
+            # stop() closed and emptied the queue since it was checked
+            return None, wait
+        chosen.busy = True
+        chosen.last_served = time.perf_counter()
+        return chosen, item
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self._cond:
+                channel, item = self._claim()
+                if channel is None:
+                    self._cond.wait(item)
+                    continue
+            try:
+                if channel.governor is not None:
+                    channel.governor.begin()
+                start = time.perf_counter()
+                result = analyze_captured(channel.analyzer, item, channel.governor)
+                channel.wait_ms += (start - item.timestamp) * 1000
+                channel.cost_ms += (time.perf_counter() - start) * 1000
+                channel.analyzed += 1
+                channel.results.put(result)
+            finally:
+                with self._cond:
+                    channel.busy = False
+                    self._cond.notify()
+
+    @property
+    def finished(self):
+        """True once every channel's source has ended and been fully analyzed."""
+        return all(channel.finished.is_set() for channel in self.channels)
+
+
+class SerializedModel:
+    """Calls a shared detector or predictor under a lock, for use from several threads."""
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            return self.model(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
@@ -0,0 +1,125 @@
+import collections
+import contextlib
+import csv
+import json
+import time
+
+# Shared no-op context returned when profiling is off
+_DISABLED = contextlib.nullcontext()
+
+
+class _Timer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class StageProfiler:
+    """
+    Per-stage latency samples kept in fixed-size ring buffers.
+
+    Usage:
+        with profiler.stage("detect"):
+            faces = detector(gray)
+
+    When disabled, stage() returns a shared no-op context and record() and
+    tick() return immediately, so instrumented code costs next to nothing.
+    Safe to use from several threads (deque appends are atomic).
+    """
+
+    def __init__(self, enabled=False, capacity=512):
+        self.enabled = enabled
+        self.capacity = capacity
+        self._samples = {}
+        self._ticks = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self, name)
+
+    def record(self, name, ms):
+        if not self.enabled:
+            return
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples.setdefault(name, collections.deque(maxlen=self.capacity))
+        samples.append(ms)
+
+    def tick(self, name):
+        """Mark one completed frame for a loop, for FPS reporting."""
+        if not self.enabled:
+            return
+        ticks = self._ticks.get(name)
+        if ticks is None:
+            ticks = self._ticks.setdefault(name, collections.deque(maxlen=self.capacity))
+        ticks.append(time.perf_counter())
+
+    def fps(self, name):
+        ticks = list(self._ticks.get(name, ()))
+        if len(ticks) < 2 or ticks[-1] <= ticks[0]:
+            return 0.0
+        return (len(ticks) - 1) / (ticks[-1] - ticks[0])
+
+    def summary(self):
+        """
+        Percentiles per stage and rates per loop
+
+        Returns:
+            dict: {'stages': {name: {'count', 'p50', 'p95', 'max'}}, 'fps': {name: rate}}
+        """
+        stages = {}
+        for name, samples in list(self._samples.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            stages[name] = {
+                'count': len(values),
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95),
+                'max': values[-1],
+            }
+        fps = {name: self.fps(name) for name in list(self._ticks)}
+        return {'stages': stages, 'fps': fps}
+
+    def overlay_lines(self):
+        """Short text lines for drawing on the video frame."""
+        summary = self.summary()
+        lines = [f"{name} {rate:.1f} fps" for name, rate in summary['fps'].items()]
+        for name, s in summary['stages'].items():
+            lines.append(f"{name} p50 {s['p50']:.1f} / p95 {s['p95']:.1f} ms")
+        return lines
+
+    def dump(self, path):
+        """Write the raw samples as CSV, or samples and summary as JSON (by extension)."""
+        if path.lower().endswith(".json"):
+            data = {
+                'summary': self.summary(),
+                'samples': {name: list(samples) for name, samples in self._samples.items()},
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            return
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "sample", "ms"])
+            for name, samples in self._samples.items():
+                for i, ms in enumerate(samples):
+                    writer.writerow([name, i, f"{ms:.3f}"])
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
@@ -0,0 +1,339 @@
+"""
+Session recording and offline replay.
+
+An opt-in SessionRecorder logs what the kiosk saw and decided, frame by
+frame: the clock the votes were cast with, read-to-display latency,
+inference cost and mode, and for every face its track ID, box, 68 landmarks,
+shape probabilities, the frame's own label and the label shown after
+voting. Coordinates are display coordinates, mirrored as on screen. The
+display frames can also be kept, as captured, in a compressed video next
+to the log; video frame i is log frame i, and the video can be fed back in
+with --source to rerun the whole pipeline.
+
+Running this module replays a log through voting.FaceSessions, the vote and
+timer logic behind the app's determine_face_shape, on the recorded clock.
+No camera, models or window are needed, so decisions and latency can be
+compared across versions. With --rescore the recorded landmarks are scored
+again by the current shape model first.
+
+File layout (appended as frames arrive, so a crash loses at most a buffer):
+    MAGIC (8 bytes) | metadata length (uint32 LE) | metadata JSON | records
+
+There is one RECORD_DTYPE row per face; a frame without faces gets a
+single row with face_id -1.
+
+Example:
+    python app.py --record session.fsrec --record-video
+    python recording.py session.fsrec -o replay.json
+    python recording.py session.fsrec --rescore --shape-model candidate.json
+"""
+import argparse
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from face_shape import SHAPES, ShapeModel, default_model, score_points, scores_to_labels
+from voting import LABELS, FaceSessions, scoring_for
+
+MAGIC = b"FSHREC01"
+HEADER = struct.Struct("<8sI")
+MODES = ('detect', 'track', 'reuse', 'idle')
+NO_LABEL = 255
+
+RECORD_DTYPE = np.dtype([
+    ('frame', '<u4'),             # Displayed frame number, also the video frame index
+    ('seq', '<i8'),               # Source sequence number (-1 if unknown)
+    ('time', '<f8'),              # Wall clock seconds the votes were cast with
+    ('latency_ms', '<f4'),        # Read-to-display latency (NaN if not measured)
+    ('cost_ms', '<f4'),           # Inference cost of the frame
+    ('mode', 'u1'),               # Index into MODES
+    ('mirrored', '?'),
+    ('face_id', '<i4'),           # Track ID, -1 for a frame without faces
+    ('box', '<i4', (4,)),         # left, top, right, bottom
+    ('points', '<f4', (68, 2)),
+    ('scores', '<f4', (len(SHAPES),)),
+    ('label', 'u1'),              # Frame's own label, index into the log's labels
+    ('shown', 'u1'),              # Label shown after voting
+])
+
+
+def _label_index(label):
+    return LABELS.index(label) if label in LABELS else NO_LABEL
+
+
+class SessionRecorder:
+    """
+    Appends displayed frames to a session log on a background thread.
+
+    write() only packs a few small arrays and queues them, so neither the
+    disk nor the video encoder holds up the Tk thread. If the writer falls
+    more than `queue_size` frames behind, new frames are dropped and
+    counted in `dropped`.
+    """
+
+    def __init__(self, path, metadata=None, video_size=None, fps=15.0, queue_size=256):
+        self.path = path
+        self.video_path = os.path.splitext(path)[0] + ".mp4" if video_size else None
+        self.frames = 0
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._video = None
+        if self.video_path:
+            import cv2
+            self._video = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, video_size)
+            if not self._video.isOpened():
+                raise IOError(f"Could not open video writer: {self.video_path}")
+
+        meta = dict(metadata or {})
+        meta.update({
+            'version': 1,
+            'started': time.time(),
+            'labels': LABELS,
+            'modes': list(MODES),
+            'video': os.path.basename(self.video_path) if self.video_path else None,
+        })
+        data = json.dumps(meta).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, len(data)))
+        self._file.write(data)
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    def write(self, result, now, shown, latency_ms=None):
+        """
+        Queue one displayed frame
+
+        Args:
+            result (pipeline.FrameResult): The frame's analysis
+            now (float): Wall clock time its votes were cast with
+            shown (list): Label shown for each face after voting, in result order
+            latency_ms (float): Read-to-display latency, if measured
+        """
+        rows = np.zeros(max(1, len(result.faces)), dtype=RECORD_DTYPE)
+        rows['frame'] = self.frames
+        rows['seq'] = -1 if result.seq is None else result.seq
+        rows['time'] = now
+        rows['latency_ms'] = np.nan if latency_ms is None else latency_ms
+        rows['cost_ms'] = result.cost_ms
+        rows['mode'] = MODES.index(result.mode) if result.mode in MODES else NO_LABEL
+        rows['mirrored'] = result.mirrored
+        rows['face_id'] = -1
+        rows['scores'] = np.nan
+        rows['label'] = rows['shown'] = NO_LABEL
+        if result.faces:
+            rows['face_id'] = result.face_ids
+            rows['box'] = [(face.left(), face.top(), face.right(), face.bottom()) for face, _ in result.faces]
+            rows['points'] = np.stack([points for _, points in result.faces])
+            for i, scores in enumerate(result.scores):
+                if scores is not None:
+                    rows['scores'][i] = scores
+            rows['label'] = [_label_index(label) for label in result.labels]
+            rows['shown'] = [_label_index(label) for label in shown]
+
+        frame = result.frame if self._video is not None else None
+        try:
+            self._queue.put_nowait((rows, frame))
+            self.frames += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            rows, frame = item
+            self._file.write(rows.tobytes())
+            if frame is not None:
+                self._video.write(frame)
+
+    def close(self):
+        """Write out everything queued and close the log and video."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._video is not None:
+            self._video.release()
+
+    def summary(self):
+        text = f"{self.frames} frames recorded to {self.path}"
+        if self.video_path:
+            text += f" and {self.video_path}"
+        if self.dropped:
+            text += f", {self.dropped} dropped"
+        return text
+
+
+class SessionLog:
+    """A recorded session: `metadata` dict plus the `records` structured array."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a session log: {path}")
+            self.metadata = json.loads(f.read(length).decode("utf-8"))
+            data = f.read()
+        # A log cut short by a crash may end in a partial record
+        count = len(data) // RECORD_DTYPE.itemsize
+        self.records = np.frombuffer(data, dtype=RECORD_DTYPE, count=count)
+        self.labels = self.metadata['labels']
+
+    def frame_starts(self):
+        """Index of the first row of each displayed frame."""
+        if len(self.records) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.r_[0, np.flatnonzero(np.diff(self.records['frame'])) + 1]
+
+
+def _percentiles(values):
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 2), 'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+            'max': round(float(values.max()), 2)}
+
+
+def replay(log, duration=None, timeout=None, scoring=None, vote_options=None, shape_model=None):
+    """
+    Push a recorded session back through the vote and timer logic
+
+    Votes are cast with the recorded clock, so the same log and settings
+    always give the same decisions. Settings left as None are taken from
+    the log's metadata.
+
+    Args:
+        log (SessionLog): The recorded session
+        duration (float): Analysis time per face in seconds
+        timeout (float): Seconds a face may be out of view before it is forgotten
+        scoring (dict): ScoreAccumulator options; with vote_options alone,
+            labels are counted instead
+        vote_options (dict): ShapeVoter options
+        shape_model (ShapeModel): Score the recorded landmarks again with this
+            model instead of using the recorded scores and labels; early
+            decisions then follow its calibration (see voting.scoring_for)
+
+    Returns:
+        dict: Decisions per face, agreement with what was shown at the time,
+            and recorded latency and cost percentiles
+    """
+    voting = log.metadata.get('voting', {})
+    duration = voting.get('duration', 10.0) if duration is None else duration
+    timeout = voting.get('timeout', 3.0) if timeout is None else timeout
+    if scoring is None and vote_options is None:
+        scoring, vote_options = voting.get('scoring', {}), voting.get('vote_options')
+        if shape_model is not None:
+            # The recorded scoring is what the recorded model allowed
+            scoring = voting.get('requested_scoring', scoring)
+    if shape_model is not None:
+        scoring = scoring_for(shape_model, scoring)
+    sessions = FaceSessions(duration, timeout, scoring, **(vote_options or {}))
+
+    records = log.records
+    labels = np.array(log.labels + [None], dtype=object)
+    frame_labels = labels[np.minimum(records['label'], len(log.labels))]
+    scores = records['scores'].astype(np.float64)
+    is_face = records['face_id'] >= 0
+    if shape_model is not None and is_face.any():
+        scores[is_face], _ = score_points(records['points'][is_face], shape_model)
+        rescored = scores_to_labels(scores[is_face])
+        label_agreement = float(np.mean(rescored == frame_labels[is_face]))
+        frame_labels[is_face] = rescored
+    else:
+        label_agreement = None
+    recorded_shown = labels[np.minimum(records['shown'], len(log.labels))]
+
+    decisions = []
+    agreed = 0
+    starts = log.frame_starts()
+    start = float(records['time'][0]) if len(records) else 0.0
+    for begin, end in zip(starts, np.r_[starts[1:], len(records)]):
+        now = float(records['time'][begin])
+        for index in range(begin, end):
+            face_id = int(records['face_id'][index])
+            if face_id < 0:
+                continue
+            face_scores = scores[index] if np.all(np.isfinite(scores[index])) else None
+            face_shape, session, decided = sessions.add(face_id, frame_labels[index], now, face_scores)
+            agreed += face_shape == recorded_shown[index]
+            if decided:
+                decisions.append({
+                    'face_id': face_id,
+                    'shape': session.result,
+                    'confidence': round(float(session.confidence), 4),
+                    'seconds_to_decide': round(session.elapsed, 3),
+                    'at': round(now - start, 3),
+                })
+        sessions.prune(now)
+
+    # Timing columns hold the same value on every row of a frame
+    first_rows = records[starts]
+    span = float(records['time'][-1] - start) if len(records) else 0.0
+    face_frames = int(is_face.sum())
+    return {
+        'log': log.path,
+        'frames': len(first_rows),
+        'face_frames': face_frames,
+        'seconds': round(span, 3),
+        'display_fps': round(len(first_rows) / span, 2) if span > 0 else None,
+        'modes': {mode: int(np.sum(first_rows['mode'] == i)) for i, mode in enumerate(MODES)},
+        'latency_ms': _percentiles(first_rows['latency_ms'].astype(np.float64)),
+        'cost_ms': _percentiles(first_rows['cost_ms'].astype(np.float64)),
+        'decisions': decisions,
+        'shown_agreement': round(agreed / face_frames, 4) if face_frames else None,
+        'label_agreement': label_agreement,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded kiosk session through the voting logic.")
+    parser.add_argument("log", help="Session log written with app.py --record")
+    parser.add_argument("-o", "--output", help="JSON report path (default: stdout)")
+    parser.add_argument("--rescore", action="store_true",
+                        help="Score the recorded landmarks again with the current shape model")
+    parser.add_argument("--shape-model", metavar="PATH",
+                        help="Shape model for --rescore (default: the face_shape default model)")
+    parser.add_argument("--vote-labels", action="store_true",
+                        help="Count per-frame labels instead of accumulating shape probabilities")
+    parser.add_argument("--decision-confidence", type=float,
+                        help="Shape probability needed to finish early (default: as recorded)")
+    parser.add_argument("--analysis-time", type=float, help="Analysis time per face (default: as recorded)")
+    args = parser.parse_args(argv)
+
+    try:
+        log = SessionLog(args.log)
+    except (OSError, ValueError, struct.error) as e:
+        parser.error(f"Could not read {args.log}: {e}")
+
+    model = None
+    if args.rescore or args.shape_model:
+        model = ShapeModel.load(args.shape_model) if args.shape_model else default_model()
+    scoring = vote_options = None
+    recorded = log.metadata.get('voting', {})
+    if args.vote_labels:
+        vote_options = recorded.get('vote_options') or {}
+    elif args.decision_confidence is not None:
+        base = recorded.get('requested_scoring' if model is not None else 'scoring', recorded.get('scoring'))
+        scoring = dict(base or {}, threshold=args.decision_confidence)
+
+    report = replay(log, args.analysis_time, None, scoring, vote_options, model)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Replayed {report['frames']} frames, {len(report['decisions'])} decisions; "
+              f"report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
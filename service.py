@@ -0,0 +1,290 @@
+"""
+Local HTTP service exposing the face shape classifier.
+
+A pool of worker processes is started up front, each with its own face
+detector and shape predictor, so requests never wait for model loading.
+Work is admitted up to --queue-size images in flight; beyond that requests
+are refused with 503 and a Retry-After header instead of queueing without
+bound. A batch larger than the whole queue can never be admitted and gets
+413 instead.
+
+Endpoints:
+    POST /classify        Raw image bytes in the body (any format OpenCV
+                          decodes); returns shape, per-shape scores, ratios
+                          and confidence
+    POST /classify/batch  JSON {"images": [<base64 image>, ...]}; returns
+                          {"results": [...]} in the same order
+    GET  /health          Liveness, worker count and queue depth
+    GET  /metrics         Request counts, queue depth and latency percentiles
+
+Example:
+    python service.py --port 8080 --workers 2
+    curl --data-binary @Male/Oval/1.jpg http://127.0.0.1:8080/classify
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from face_shape import PREDICTOR_PATH
+from profiling import StageProfiler
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ClassifierService:
+    """
+    Admission control and metrics around a multiprocessing pool.
+
+    `pending` counts images admitted and not yet finished, whether still
+    queued for a worker or being classified. `task(data, confidence)` runs
+    in the pool for each image; it defaults to batch_classify.classify_bytes,
+    imported only then so that dlib and OpenCV stay out of this process
+    until the pool needs them.
+    """
+
+    def __init__(self, pool, workers, queue_size=64, confidence=True, task=None):
+        if task is None:
+            from batch_classify import classify_bytes as task
+        self.pool = pool
+        self.task = task
+        self.workers = workers
+        self.queue_size = queue_size
+        self.confidence = confidence
+        self.pending = 0
+        self.started = time.time()
+        self.counts = {'requests': 0, 'images': 0, 'errors': 0, 'rejected': 0}
+        self.profiler = StageProfiler(enabled=True, capacity=4096)
+
+    def admit(self, count):
+        if count > self.queue_size:
+            self.counts['rejected'] += 1
+            raise HttpError(413, f"Batch of {count} images exceeds the queue size of {self.queue_size}")
+        if self.pending + count > self.queue_size:
+            self.counts['rejected'] += 1
+            raise HttpError(503, f"Queue full ({self.pending} images pending)", {'Retry-After': '1'})
+        self.pending += count
+
+    async def classify(self, data):
+        """Run one admitted image on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def done(record):
+            loop.call_soon_threadsafe(future.set_result, record)
+
+        def failed(error):
+            loop.call_soon_threadsafe(future.set_exception, error)
+
+        start = time.perf_counter()
+        try:
+            self.pool.apply_async(self.task, (data, self.confidence),
+                                  callback=done, error_callback=failed)
+            record = await future
+        finally:
+            self.pending -= 1
+        self.profiler.record("image", (time.perf_counter() - start) * 1000)
+        self.counts['images'] += 1
+        if 'error' in record:
+            self.counts['errors'] += 1
+        return record
+
+    async def handle(self, method, path, body):
+        """
+        Route one request
+
+        Returns:
+            tuple: (status, JSON-serialisable payload)
+        """
+        if path == "/health":
+            self._expect(method, "GET")
+            return 200, {'status': 'ok', 'workers': self.workers, 'queue_depth': self.pending}
+        if path == "/metrics":
+            self._expect(method, "GET")
+            return 200, self.metrics()
+        if path == "/classify":
+            self._expect(method, "POST")
+            if not body:
+                raise HttpError(400, "Send the image bytes as the request body")
+            self.admit(1)
+            record = await self.classify(body)
+            return (400 if 'error' in record else 200), record
+        if path == "/classify/batch":
+            self._expect(method, "POST")
+            images = self._decode_batch(body)
+            self.admit(len(images))
+            results = await asyncio.gather(*(self.classify(data) for data in images))
+            return 200, {'results': list(results)}
+        raise HttpError(404, f"No such endpoint: {path}")
+
+    def metrics(self):
+        summary = self.profiler.summary()
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'workers': self.workers,
+            'queue_depth': self.pending,
+            'queue_size': self.queue_size,
+            'counts': dict(self.counts),
+            'latency_ms': summary['stages'],
+            'requests_per_sec': summary['fps'].get('requests', 0.0),
+        }
+
+    @staticmethod
+    def _expect(method, allowed):
+        if method != allowed:
+            raise HttpError(405, f"Use {allowed}", {'Allow': allowed})
+
+    @staticmethod
+    def _decode_batch(body):
+        try:
+            images = json.loads(body)['images']
+            if not isinstance(images, list) or not images:
+                raise ValueError
+            return [base64.b64decode(item, validate=True) for item in images]
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise HttpError(400, 'Expected JSON {"images": [<base64 image>, ...]}')
+
+
+async def read_request(reader, max_body):
+    """
+    Parse one HTTP/1.1 request
+
+    Returns:
+        tuple: (method, path, headers, body), or None when the client closed
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        raise HttpError(411, "Chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HttpError(400, "Malformed Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"Body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def write_response(writer, status, payload, headers=None, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             "Content-Type: application/json",
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+def make_handler(service, max_body):
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                start = time.perf_counter()
+                keep_alive = True
+                try:
+                    request = await read_request(reader, max_body)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    service.counts['requests'] += 1
+                    status, payload = await service.handle(method, path, body)
+                    extra = None
+                except HttpError as e:
+                    status, payload, extra = e.status, {'error': str(e)}, e.headers
+                    keep_alive = keep_alive and e.status not in (400, 411, 413)
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload, extra = 500, {'error': str(e)}, None
+                write_response(writer, status, payload, extra, keep_alive)
+                await writer.drain()
+                service.profiler.record("request", (time.perf_counter() - start) * 1000)
+                service.profiler.tick("requests")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(service, host, port, max_body):
+    server = await asyncio.start_server(make_handler(service, max_body), host, port)
+    addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Serving face shape classifier on {addresses} with {service.workers} workers", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    # Only the command line needs the models; importing ClassifierService does not
+    from batch_classify import init_worker
+    from detectors import add_detector_arguments, detector_options
+
+    parser = argparse.ArgumentParser(description="Serve the face shape classifier over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="Images admitted at once; more are refused with 503, larger batches with 413")
+    parser.add_argument("--max-body-mb", type=float, default=16.0, help="Largest accepted request body")
+    parser.add_argument("--no-confidence", action="store_true",
+                        help="Skip the extra landmark passes averaged into the confidence")
+    parser.add_argument("--predictor", default=PREDICTOR_PATH,
+                        help="Path to the dlib shape predictor (68-point or reduced)")
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.predictor):
+        parser.error(f"Predictor file not found at: {args.predictor}")
+    try:
+        options = detector_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Every worker loads its models here, before the first request arrives
+    with multiprocessing.Pool(args.workers, initializer=init_worker,
+                              initargs=(args.predictor, args.detector, options)) as pool:
+        service = ClassifierService(pool, args.workers, args.queue_size, not args.no_confidence)
+        try:
+            asyncio.run(serve(service, args.host, args.port, int(args.max_body_mb * 1024 * 1024)))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
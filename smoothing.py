@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+
+
+def _alpha(dt, cutoff):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    """
+    One Euro low-pass filter (Casiez et al., CHI 2012) over a NumPy array.
+
+    Each element is filtered independently. The cutoff frequency rises with
+    the element's speed, so a still face is smoothed heavily while real
+    movement passes through with little lag. `min_cutoff` (Hz) sets the
+    smoothing at rest and `beta` how fast it relaxes with speed (in units
+    of the input per second).
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    def __call__(self, x, t):
+        """
+        Args:
+            x (np.ndarray): New measurement
+            t (float): Its timestamp in seconds
+
+        Returns:
+            np.ndarray: Filtered value, same shape as x
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None:
+            self._x = x.copy()
+            self._dx = np.zeros_like(x)
+            self._t = t
+            return self._x.copy()
+
+        dt = t - self._t
+        if dt <= 0:
+            # Same frame seen twice; keep the current estimate
+            return self._x.copy()
+        self._t = t
+
+        a_d = _alpha(dt, self.d_cutoff)
+        self._dx = a_d * (x - self._x) / dt + (1 - a_d) * self._dx
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        a = _alpha(dt, cutoff)
+        self._x = a * x + (1 - a) * self._x
+        return self._x.copy()
+
+
+class LandmarkSmoother:
+    """
+    One OneEuroFilter per tracked face over its (68, 2) landmarks.
+
+    A face not seen for `max_gap` seconds starts over, so a person walking
+    back into view is not blended with where they were before.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, max_gap=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_gap = max_gap
+        self._filters = {}
+
+    def reset(self):
+        self._filters = {}
+
+    def smooth(self, face_id, points, t):
+        """Filtered landmarks for one face at time t (seconds)."""
+        entry = self._filters.get(face_id)
+        if entry is None or t - entry[1] > self.max_gap:
+            entry = [OneEuroFilter(self.min_cutoff, self.beta, self.d_cutoff), t]
+            self._filters[face_id] = entry
+        entry[1] = t
+        return entry[0](points, t)
+
+    def prune(self, t):
+        """Forget faces not seen for more than max_gap seconds."""
+        for face_id in [i for i, (_, seen) in self._filters.items() if t - seen > self.max_gap]:
+            del self._filters[face_id]
@@ -0,0 +1,225 @@
+"""
+Frame sources for the live pipeline.
+
+A source is opened from a single spec string, so the app and tools can take
+a camera index, a video file, a directory or glob of still images, or a
+network stream URL interchangeably:
+
+    0                        camera index
+    session.mp4              video file
+    frames/  or  frames/*.png  image sequence, in sorted order
+    rtsp://host/stream       network stream (rtsp, rtmp, http(s), udp, tcp)
+
+Every source has the same small interface: read() returns the next decoded
+BGR frame or None, `finished` becomes True once a finite source has nothing
+left, and release() frees it.
+"""
+import glob
+import os
+import time
+
+import cv2
+
+from gallery import IMAGE_EXTENSIONS
+
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+
+class FrameSource:
+    """Base class; `live` sources keep producing, so a failed read is retried."""
+
+    live = True
+
+    def __init__(self):
+        self.finished = False
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class _CaptureSource(FrameSource):
+    """Shared handling for sources backed by a cv2.VideoCapture."""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.cap = cv2.VideoCapture(target)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise IOError(f"Could not open video source: {target}")
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+    def describe(self):
+        return f"{self.__class__.__name__}({self.target})"
+
+
+class CameraSource(_CaptureSource):
+    def __init__(self, index=0, fps=30):
+        super().__init__(index)
+        # Only a hint; the reader thread drains the device either way
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+
+class VideoFileSource(_CaptureSource):
+    """
+    Decodes a recorded video as fast as possible, or at the file's own
+    frame rate with `realtime`. With `loop` it rewinds at the end.
+    """
+
+    live = False
+
+    def __init__(self, path, realtime=False, loop=False):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Video file not found at: {path}")
+        super().__init__(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._pacer = _Pacer(self.fps if realtime else None)
+
+    def read(self):
+        frame = super().read()
+        if frame is None and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._pacer.reset()
+            frame = super().read()
+        if frame is None:
+            self.finished = True
+            return None
+        self._pacer.wait()
+        return frame
+
+
+class StreamSource(_CaptureSource):
+    """Network stream; reconnects after `reconnect_delay` seconds when reads fail."""
+
+    def __init__(self, url, reconnect_delay=1.0):
+        super().__init__(url)
+        self.reconnect_delay = reconnect_delay
+        self._failed_at = None
+
+    def read(self):
+        frame = super().read()
+        if frame is not None:
+            self._failed_at = None
+            return frame
+
+        now = time.monotonic()
+        if self._failed_at is None:
+            self._failed_at = now
+        elif now - self._failed_at >= self.reconnect_delay:
+            self._failed_at = now
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.target)
+        return None
+
+
+class ImageSequenceSource(FrameSource):
+    """Still images read in sorted order, optionally paced to `fps`."""
+
+    live = False
+
+    def __init__(self, paths, fps=None, loop=False):
+        super().__init__()
+        self.paths = list(paths)
+        if not self.paths:
+            raise FileNotFoundError("No images found for the image sequence")
+        self.loop = loop
+        self._index = 0
+        self._pacer = _Pacer(fps)
+
+    def read(self):
+        while True:
+            if self._index >= len(self.paths):
+                if not self.loop:
+                    self.finished = True
+                    return None
+                self._index = 0
+                self._pacer.reset()
+            path = self.paths[self._index]
+            self._index += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                self._pacer.wait()
+                return frame
+            print(f"Skipping unreadable image {path}")
+
+    def describe(self):
+        return f"ImageSequenceSource({len(self.paths)} images)"
+
+
+class _Pacer:
+    """Sleeps so successive wait() calls return at most `fps` times a second."""
+
+    def __init__(self, fps=None):
+        self.interval = 1.0 / fps if fps else None
+        self.reset()
+
+    def reset(self):
+        self._start = None
+        self._count = 0
+
+    def wait(self):
+        if self.interval is None:
+            return
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        delay = self._start + self._count * self.interval - now
+        if delay > 0:
+            time.sleep(delay)
+        self._count += 1
+
+
+def _image_paths(spec):
+    if os.path.isdir(spec):
+        names = sorted(os.listdir(spec))
+        return [os.path.join(spec, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(glob.glob(spec))
+
+
+def open_source(spec, realtime=False, loop=False, fps=None):
+    """
+    Open a frame source from a spec string
+
+    Args:
+        spec (str or int): Camera index, video file, image directory or glob, or stream URL
+        realtime (bool): Pace recorded media to its own frame rate instead of full speed
+        loop (bool): Restart recorded media from the beginning when it ends
+        fps (float): Frame rate for image sequences with `realtime`, and requested camera rate
+
+    Returns:
+        FrameSource: The opened source
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return CameraSource(int(spec), fps=fps or 30)
+    if spec.lower().startswith(STREAM_SCHEMES):
+        return StreamSource(spec)
+    if os.path.isdir(spec) or any(c in spec for c in '*?['):
+        return ImageSequenceSource(_image_paths(spec), fps=(fps or 30) if realtime else None, loop=loop)
+    return VideoFileSource(spec, realtime=realtime, loop=loop)
+
+
+def add_source_arguments(parser):
+    """Add the shared --source/--realtime/--loop options to an argparse parser."""
+    parser.add_argument("--source", default="0",
+                        help="Camera index, video file, image directory or glob, or stream URL")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Play recorded media at its own frame rate instead of as fast as possible")
+    parser.add_argument("--loop", action="store_true",
+                        help="Restart recorded media when it ends")
@@ -1,13 +1,19 @@
-import os
-import sys
-import subprocess
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from models import ModelLoader
+
 
 class App:
-    def __init__(self, root):
+    def __init__(self, root, models=None, recognizer=None):
         self.root = root
+        # Start loading the face models now so they are ready by the time
+        # Start is pressed; the recognizer screen is created once and reused
+        self.models = models or ModelLoader().start()
+        self.recognizer = recognizer
+        if recognizer is not None:
+            recognizer.on_back = self.show_menu
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
         self.root.title("Face Shape Hairstylist")
         self.root.geometry("500x700")
         self.root.configure(bg="#FFB5C1")  # Light pink gradient-like background
@@ -95,18 +101,23 @@ class App:
         window.geometry(f'{width}x{height}+{x}+{y}')
 
     def open_start_window(self):
-        """Launch the app.py file in a new Python process and close current window."""
+        """Hide the menu and show the face shape screen in this process."""
         try:
-            script_path = os.path.abspath(r"app.py")
-            if os.path.exists(script_path):
-                # Open the script in the same directory
-                subprocess.Popen([sys.executable, script_path], cwd=os.path.dirname(script_path))
-                self.root.destroy()  # Close the current window
+            if self.recognizer is None:
+                from app import FaceShapeRecognizer
+                self.recognizer = FaceShapeRecognizer(master=self.root, models=self.models,
+                                                      on_back=self.show_menu)
+                self.recognizer.root.after(100, self.recognizer.start_video)
             else:
-                tk.messagebox.showerror("Error", f"File not found: {script_path}")
+                self.recognizer.show()
+            self.root.withdraw()
         except Exception as e:
             tk.messagebox.showerror("Error", f"Failed to open start window: {e}")
 
+    def show_menu(self):
+        """Bring the menu back after the face shape screen was hidden."""
+        self.root.deiconify()
+
     def open_help_window(self):
         """Opens the Help Window."""
         self.root.withdraw()  # Hide the main window
@@ -149,6 +160,8 @@ class App:
 
     def exit_app(self):
         """Closes the application."""
+        if self.recognizer is not None:
+            self.recognizer.shutdown()
         self.root.quit()
 
 
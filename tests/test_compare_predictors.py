@@ -0,0 +1,53 @@
+"""
+Tests for compare_predictors.compare.
+
+Stand-in predictors return the template face's geometry landmarks with a
+fixed offset, so the comparison runs without dlib or predictor files.
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compare_predictors  # noqa: E402
+from face_shape import template_face  # noqa: E402
+
+OFFSETS = {'full.dat': 0.0, 'reduced.dat': 2.0}
+
+
+class Box:
+    def width(self):
+        return 200
+
+    def height(self):
+        return 240
+
+
+class FakePredictor:
+    def __init__(self, path):
+        self.path = path
+        self.parts = tuple(range(68))
+        self.size = 1000
+
+    def __call__(self, image, box):
+        return template_face() + OFFSETS[self.path]
+
+    def describe(self):
+        return self.path
+
+
+def test_compare_two_predictors(monkeypatch):
+    monkeypatch.setattr(compare_predictors, "LandmarkPredictor", FakePredictor)
+    images = [("a.jpg", None, None), ("b.jpg", None, None)]
+    faces = [(0, Box()), (1, Box())]
+
+    results = compare_predictors.compare(["full.dat", "reduced.dat"], images, faces, repeat=2)
+
+    assert list(results) == ["full.dat", "reduced.dat"]
+    for result in results.values():
+        assert 'points' not in result and 'labels' not in result
+        assert result['label_agreement'] == 1.0
+    assert results["full.dat"]['point_error'] == 0.0
+    assert np.isclose(results["reduced.dat"]['point_error'], np.hypot(2.0, 2.0) / 200)
@@ -0,0 +1,83 @@
+"""
+Replay tests for recording.py on a synthetic session log.
+
+Every frame holds one face with the built-in Oval proportions, scored by
+the built-in (uncalibrated) shape model as the app would have.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_shape import (BUILTIN_PROPORTIONS, ShapeModel, compute_features, scores_to_labels,  # noqa: E402
+                        template_face)
+from recording import SessionLog, SessionRecorder, replay  # noqa: E402
+from voting import scoring_for  # noqa: E402
+
+FPS = 15.0
+DURATION = 10.0
+
+
+class Box:
+    def left(self):
+        return 0
+
+    def top(self):
+        return 0
+
+    def right(self):
+        return 200
+
+    def bottom(self):
+        return 240
+
+
+def record_session(path, model, frames=200):
+    points = template_face(*BUILTIN_PROPORTIONS["Oval"])
+    scores = model.probabilities(compute_features(points))[0]
+    label = str(scores_to_labels(scores)[0])
+    scoring = {}
+    metadata = {
+        'shape_model': model.info,
+        'voting': {
+            'duration': DURATION,
+            'timeout': 3.0,
+            'scoring': scoring_for(model, scoring),
+            'requested_scoring': scoring,
+            'vote_options': {},
+        },
+    }
+    recorder = SessionRecorder(path, metadata)
+    for i in range(frames):
+        result = SimpleNamespace(faces=[(Box(), points)], face_ids=[1], scores=[scores], labels=[label],
+                                 seq=i, cost_ms=1.0, mode='track', mirrored=True, frame=None)
+        recorder.write(result, 1000.0 + i / FPS, [label])
+    recorder.close()
+    return SessionLog(path)
+
+
+def fitted(model):
+    return ShapeModel.from_dict(dict(model.to_dict(), info={'source': 'fitted'}))
+
+
+def test_replay_keeps_full_analysis_time_for_uncalibrated_model(tmp_path):
+    builtin = ShapeModel.builtin()
+    log = record_session(str(tmp_path / "session.fsrec"), builtin)
+
+    for model in (None, builtin):
+        decisions = replay(log, shape_model=model)['decisions']
+        assert len(decisions) == 1
+        assert decisions[0]['shape'] == "Oval"
+        assert decisions[0]['seconds_to_decide'] >= DURATION
+
+
+def test_rescoring_with_calibrated_model_decides_early(tmp_path):
+    log = record_session(str(tmp_path / "session.fsrec"), ShapeModel.builtin())
+
+    decisions = replay(log, shape_model=fitted(ShapeModel.builtin()))['decisions']
+    assert len(decisions) == 1
+    assert decisions[0]['shape'] == "Oval"
+    assert decisions[0]['seconds_to_decide'] < DURATION
@@ -0,0 +1,209 @@
+"""
+Localhost tests for service.py.
+
+The worker pool is a thread pool running a stand-in task, so neither dlib
+nor a predictor file is needed.
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import ClassifierService, make_handler  # noqa: E402
+
+MAX_BODY = 1024
+
+
+def fake_task(data, confidence):
+    if data == b"bad":
+        return {'error': "Could not decode image"}
+    return {'shape': "Oval", 'bytes': len(data), 'confidence': confidence}
+
+
+@pytest.fixture
+def pool():
+    with ThreadPool(2) as pool:
+        yield pool
+
+
+async def start(service):
+    server = await asyncio.start_server(make_handler(service, MAX_BODY), "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return int(status_line.split()[1]), headers, json.loads(body)
+
+
+def request(method, path, body=b"", headers=None):
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost"]
+    if body or method == "POST":
+        lines.append(f"Content-Length: {len(body)}")
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def exchange(port, raw, check_close=False):
+    """
+    Send raw request bytes on a new connection and read the response; with
+    `check_close`, also return whether the server then closed the connection
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        response = await read_response(reader)
+        if not check_close:
+            return response
+        try:
+            closed = await asyncio.wait_for(reader.read(1), 1.0) == b""
+        except asyncio.TimeoutError:
+            closed = False
+        return response, closed
+    finally:
+        writer.close()
+
+
+def run(service, scenario):
+    async def main():
+        server, port = await start(service)
+        async with server:
+            return await scenario(port)
+    return asyncio.run(main())
+
+
+def test_routing(pool):
+    service = ClassifierService(pool, 2, task=fake_task)
+
+    async def scenario(port):
+        health = await exchange(port, request("GET", "/health"))
+        single = await exchange(port, request("POST", "/classify", b"image"))
+        undecodable = await exchange(port, request("POST", "/classify", b"bad"))
+        batch_body = json.dumps({'images': [base64.b64encode(b"a").decode(), base64.b64encode(b"bcd").decode()]})
+        batch = await exchange(port, request("POST", "/classify/batch", batch_body.encode()))
+        missing = await exchange(port, request("GET", "/nowhere"))
+        wrong_method = await exchange(port, request("GET", "/classify"))
+        return health, single, undecodable, batch, missing, wrong_method
+
+    health, single, undecodable, batch, missing, wrong_method = run(service, scenario)
+    assert health[0] == 200 and health[2]['workers'] == 2 and health[2]['queue_depth'] == 0
+    assert single[0] == 200 and single[2] == {'shape': "Oval", 'bytes': 5, 'confidence': True}
+    assert undecodable[0] == 400 and 'error' in undecodable[2]
+    assert batch[0] == 200 and [r['bytes'] for r in batch[2]['results']] == [1, 3]
+    assert missing[0] == 404
+    assert wrong_method[0] == 405 and wrong_method[1]['allow'] == "POST"
+
+
+def test_keep_alive_serves_several_requests(pool):
+    service = ClassifierService(pool, 2, task=fake_task)
+
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request("GET", "/health") + request("POST", "/classify", b"xy"))
+        await writer.drain()
+        responses = [await read_response(reader), await read_response(reader)]
+        writer.close()
+        return responses
+
+    first, second = run(service, scenario)
+    assert first[0] == 200 and first[1]['connection'] == "keep-alive"
+    assert second[0] == 200 and second[2]['bytes'] == 2
+
+
+def test_full_queue_is_refused_with_retry_after(pool):
+    release = threading.Event()
+
+    def slow_task(data, confidence):
+        release.wait(5)
+        return fake_task(data, confidence)
+
+    service = ClassifierService(pool, 2, queue_size=1, task=slow_task)
+
+    async def scenario(port):
+        first = asyncio.ensure_future(exchange(port, request("POST", "/classify", b"one")))
+        while service.pending < 1:
+            await asyncio.sleep(0.01)
+        refused = await exchange(port, request("POST", "/classify", b"two"))
+        release.set()
+        accepted = await first
+        return refused, accepted
+
+    refused, accepted = run(service, scenario)
+    assert refused[0] == 503 and refused[1]['retry-after'] == "1"
+    assert accepted[0] == 200
+    assert service.counts['rejected'] == 1 and service.pending == 0
+
+
+def test_batch_larger_than_queue_is_413(pool):
+    service = ClassifierService(pool, 2, queue_size=2, task=fake_task)
+    body = json.dumps({'images': [base64.b64encode(b"x").decode()] * 3}).encode()
+
+    async def scenario(port):
+        return await exchange(port, request("POST", "/classify/batch", body))
+
+    status, headers, _ = run(service, scenario)
+    assert status == 413 and 'retry-after' not in headers
+
+
+@pytest.mark.parametrize("raw", [
+    b"GARBAGE\r\n\r\n",
+    request("POST", "/classify/batch", b"not json"),
+    request("POST", "/classify/batch", b'{"images": []}'),
+    request("POST", "/classify/batch", b'{"images": ["***"]}'),
+    request("POST", "/classify"),
+    b"POST /classify HTTP/1.1\r\nContent-Length: abc\r\n\r\nimage",
+    b"POST /classify HTTP/1.1\r\nContent-Length: -5\r\n\r\nimage",
+])
+def test_malformed_requests_get_400_and_close(pool, raw):
+    service = ClassifierService(pool, 2, task=fake_task)
+
+    (status, headers, payload), closed = run(service, lambda port: exchange(port, raw, check_close=True))
+    assert status == 400 and 'error' in payload
+    assert headers['connection'] == "close" and closed
+
+
+def test_oversized_and_chunked_bodies(pool):
+    service = ClassifierService(pool, 2, task=fake_task)
+
+    async def scenario(port):
+        oversized = await exchange(port, request("POST", "/classify", b"x" * (MAX_BODY + 1)))
+        chunked = await exchange(port, b"POST /classify HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n")
+        return oversized, chunked
+
+    oversized, chunked = run(service, scenario)
+    assert oversized[0] == 413
+    assert chunked[0] == 411
+
+
+def test_metrics(pool):
+    service = ClassifierService(pool, 2, queue_size=8, task=fake_task)
+
+    async def scenario(port):
+        await exchange(port, request("POST", "/classify", b"image"))
+        await exchange(port, request("POST", "/classify", b"bad"))
+        metrics = await exchange(port, request("GET", "/metrics"))
+        return metrics
+
+    status, _, metrics = run(service, scenario)
+    assert status == 200
+    assert metrics['workers'] == 2 and metrics['queue_size'] == 8 and metrics['queue_depth'] == 0
+    assert metrics['counts'] == {'requests': 3, 'images': 2, 'errors': 1, 'rejected': 0}
+    assert metrics['latency_ms']['image']['count'] == 2
@@ -0,0 +1,118 @@
+import collections
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageTk
+
+from gallery import GENDER_DIRS, IMAGE_EXTENSIONS, GalleryIndex
+
+CACHE_DIR = os.path.join(".cache", "thumbnails")
+
+
+class ThumbnailStore:
+    """
+    Hairstyle thumbnails decoded on demand and cached.
+
+    When a gallery pack is available (see gallery.py), images are looked up
+    in its manifest and their small pre-shrunk thumbnails are read from the
+    mapped file. Otherwise the gallery directories are listed and resized
+    images are written to `cache_dir` keyed by source path, mtime
+    and target size, so a gallery image is only decoded and resampled once
+    per size. Tk PhotoImages are kept in an LRU of at most `max_photos`.
+    Must be used from the Tk thread.
+    """
+
+    def __init__(self, size, cache_dir=CACHE_DIR, max_photos=20, per_shape=5, index=None):
+        self.size = size
+        self.cache_dir = cache_dir
+        self.max_photos = max_photos
+        self.per_shape = per_shape
+        self.index = index if index is not None else GalleryIndex.open()
+        self._photos = collections.OrderedDict()
+
+    def list_images(self, gender, shape):
+        """Paths of the gallery images for a gender and face shape."""
+        if self.index is not None:
+            return [entry['path'] for entry in self.index.images(gender, shape)[:self.per_shape]]
+        gender_dir = GENDER_DIRS.get(gender.lower(), gender)
+        if not os.path.isdir(gender_dir):
+            return []
+        # Shape folders are capitalised (Male/Round); match case-insensitively
+        for name in os.listdir(gender_dir):
+            if name.lower() == shape.lower():
+                path = os.path.join(gender_dir, name)
+                break
+        else:
+            return []
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        return [os.path.join(path, f) for f in files[:self.per_shape]]
+
+    def photos_for(self, gender, shape):
+        """PhotoImages for a gender and face shape, loading any not yet cached."""
+        if self.index is not None:
+            items = [(entry['path'], entry) for entry in self.index.images(gender, shape)[:self.per_shape]]
+        else:
+            items = [(path, None) for path in self.list_images(gender, shape)]
+
+        photos = []
+        for path, entry in items:
+            try:
+                if entry is None:
+                    photos.append(self.get_photo(path))
+                else:
+                    photos.append(self._get_photo(f"{entry['sha1']}|{self.size}", self._packed_loader(entry)))
+            except Exception as e:
+                print(f"Error loading image {path}: {e}")
+        return photos
+
+    def get_photo(self, path):
+        key = self._cache_key(path)
+        return self._get_photo(key, lambda: self._load_thumbnail(path, key))
+
+    def _get_photo(self, key, load):
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            return photo
+
+        photo = ImageTk.PhotoImage(load())
+        self._photos[key] = photo
+        while len(self._photos) > self.max_photos:
+            # Labels hold their own reference, so evicting a shown image is safe
+            self._photos.popitem(last=False)
+        return photo
+
+    def _packed_loader(self, entry):
+        def load():
+            with Image.open(io.BytesIO(self.index.thumbnail_bytes(entry))) as img:
+                img.load()
+                return img.resize((self.size, self.size), Image.Resampling.LANCZOS)
+        return load
+
+    def _cache_key(self, path):
+        stat = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{self.size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _load_thumbnail(self, path, key):
+        cached = os.path.join(self.cache_dir, f"{key}.png")
+        if os.path.exists(cached):
+            try:
+                img = Image.open(cached)
+                img.load()  # Reads the pixels and releases the file
+                return img
+            except OSError:
+                pass  # Corrupt cache entry, rebuild it below
+
+        with Image.open(path) as img:
+            mode = "RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB"
+            thumb = img.convert(mode).resize((self.size, self.size), Image.Resampling.LANCZOS)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            thumb.save(tmp, format="PNG")
+            os.replace(tmp, cached)
+        except OSError as e:
+            print(f"Could not cache thumbnail for {path}: {e}")
+        return thumb
@@ -0,0 +1,127 @@
+import dlib
+
+
+def rect_iou(a, b):
+    """Intersection over union of two dlib rectangles"""
+    inter = a.intersect(b)
+    inter_area = inter.area() if not inter.is_empty() else 0
+    union = a.area() + b.area() - inter_area
+    return inter_area / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Locates faces with the full detector every `detect_every` frames and
+    follows them with dlib correlation trackers in between.
+
+    A fresh detection is forced whenever any tracker's peak-to-sidelobe
+    confidence drops below `min_confidence` or there is nothing to track.
+    Setting `detect_every` to 1 runs the detector on every frame.
+
+    Every located face gets a track ID, listed in `face_ids` in the same
+    order as the boxes from the latest locate() call. Tracked faces keep
+    their ID, and a fresh detection inherits the ID of the previous box it
+    overlaps with IoU >= `match_iou`, so IDs survive re-detection.
+    """
+
+    def __init__(self, detector, detect_every=10, min_confidence=7.0, match_iou=0.3):
+        self.detector = detector
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = min_confidence
+        self.match_iou = match_iou
+        self._trackers = []
+        self._frames_since_detect = 0
+        self._boxes = []
+        self.face_ids = []
+        self._next_id = 1
+        # mode -> [frame count, total milliseconds]; 'reuse' frames skipped
+        # location because nothing in view had changed, 'idle' frames were
+        # only checked for motion
+        self.costs = {'detect': [0, 0.0], 'track': [0, 0.0], 'reuse': [0, 0.0], 'idle': [0, 0.0]}
+
+    def reset(self):
+        self._trackers = []
+        self._frames_since_detect = 0
+        self._boxes = []
+        self.face_ids = []
+        self._next_id = 1
+
+    def locate(self, gray):
+        """
+        Find face boxes in a grayscale frame
+
+        Args:
+            gray (np.ndarray): Grayscale frame
+
+        Returns:
+            tuple: (list of dlib.rectangle, 'detect' or 'track')
+        """
+        faces = None
+        if self._trackers and self._frames_since_detect < self.detect_every:
+            faces = self._track(gray)
+
+        if faces is not None:
+            self._frames_since_detect += 1
+            self._boxes = faces
+            return faces, 'track'
+
+        faces = list(self.detector(gray))
+        self.face_ids = self._match_ids(faces)
+        self._boxes = faces
+        self._trackers = []
+        for face in faces:
+            tracker = dlib.correlation_tracker()
+            tracker.start_track(gray, face)
+            self._trackers.append(tracker)
+        self._frames_since_detect = 1
+        return faces, 'detect'
+
+    def _match_ids(self, faces):
+        """Give each detected face the ID of the best overlapping previous box, or a new one."""
+        pairs = sorted(((rect_iou(face, box), i, j)
+                        for i, face in enumerate(faces)
+                        for j, box in enumerate(self._boxes)), reverse=True)
+        ids = [None] * len(faces)
+        used = set()
+        for overlap, i, j in pairs:
+            if overlap < self.match_iou:
+                break
+            if ids[i] is None and j not in used:
+                ids[i] = self.face_ids[j]
+                used.add(j)
+        for i, face_id in enumerate(ids):
+            if face_id is None:
+                ids[i] = self._next_id
+                self._next_id += 1
+        return ids
+
+    def _track(self, gray):
+        height, width = gray.shape[:2]
+        faces = []
+        for tracker in self._trackers:
+            if tracker.update(gray) < self.min_confidence:
+                return None
+            pos = tracker.get_position()
+            left = max(0, int(round(pos.left())))
+            top = max(0, int(round(pos.top())))
+            right = min(width - 1, int(round(pos.right())))
+            bottom = min(height - 1, int(round(pos.bottom())))
+            if right <= left or bottom <= top:
+                # Track drifted out of frame
+                return None
+            faces.append(dlib.rectangle(left, top, right, bottom))
+        return faces
+
+    def record(self, mode, cost_ms):
+        """Add one frame's end-to-end inference cost to the per-mode totals."""
+        entry = self.costs[mode]
+        entry[0] += 1
+        entry[1] += cost_ms
+
+    def summary(self):
+        """Average per-frame cost for each mode, for tuning detect_every."""
+        parts = [f"detect_every={self.detect_every}"]
+        for mode, (count, total) in self.costs.items():
+            if count:
+                parts.append(f"{mode}: {count} frames, {total / count:.1f} ms/frame")
+        return ", ".join(parts)
@@ -0,0 +1,150 @@
+"""
+Train a reduced dlib shape predictor for face shape analysis.
+
+The geometry only reads the jaw, chin and brow landmarks in
+landmarks.REDUCED_PARTS, so a predictor trained on just those points is a
+fraction of the size of the stock 68-point model and quicker to load and
+run. This tool takes a 68-point dataset in dlib's imglab XML format (for
+example iBUG 300-W's labels_ibug_300W_train.xml) and exports a copy that
+keeps only the chosen parts. It then trains on that copy and writes the
+predictor with its JSON layout file beside it, which
+landmarks.LandmarkPredictor needs to place the points.
+
+The app picks up tools/shape_predictor_face_shape.dat by default once it
+exists. compare_predictors.py measures it against the full model.
+
+Example:
+    python train_predictor.py ibug_300W/labels_ibug_300W_train.xml \\
+        --test ibug_300W/labels_ibug_300W_test.xml --threads 8
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from landmarks import REDUCED_PARTS, REDUCED_PREDICTOR_PATH, layout_path, write_layout
+
+
+def export_subset(source, destination, parts):
+    """
+    Copy an imglab dataset keeping only some landmarks
+
+    Kept parts are renamed 00, 01, ... in the order of `parts`, which is the
+    order dlib assigns them in the trained model. Image paths are made
+    absolute so the copy can live anywhere.
+
+    Args:
+        source (str): imglab XML with 68-point annotations named 0..67
+        destination (str): XML file to write
+        parts (list): Sorted 68-point indices to keep
+
+    Returns:
+        tuple: (images, boxes) written
+    """
+    tree = ET.parse(source)
+    root = os.path.dirname(os.path.abspath(source))
+    position = {index: i for i, index in enumerate(parts)}
+    images = boxes = 0
+    for image in tree.iter('image'):
+        image.set('file', os.path.normpath(os.path.join(root, image.get('file'))))
+        images += 1
+        for box in image.iter('box'):
+            for part in list(box.findall('part')):
+                index = int(part.get('name'))
+                if index in position:
+                    part.set('name', f"{position[index]:02d}")
+                else:
+                    box.remove(part)
+            boxes += 1
+    tree.write(destination, encoding="utf-8", xml_declaration=True)
+    return images, boxes
+
+
+def training_options(args):
+    import dlib
+
+    options = dlib.shape_predictor_training_options()
+    options.cascade_depth = args.cascade_depth
+    options.tree_depth = args.tree_depth
+    options.num_trees_per_cascade_level = args.trees
+    options.nu = args.nu
+    options.oversampling_amount = args.oversampling
+    options.feature_pool_size = args.feature_pool_size
+    options.num_test_splits = args.test_splits
+    options.num_threads = args.threads
+    options.be_verbose = args.verbose
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a dlib shape predictor on just the landmarks the "
+                                                 "face shape geometry uses.")
+    parser.add_argument("dataset", help="imglab XML with 68-point annotations")
+    parser.add_argument("--test", help="Held-out imglab XML to report the error on")
+    parser.add_argument("-o", "--output", default=REDUCED_PREDICTOR_PATH, help="Predictor file to write")
+    parser.add_argument("--parts", type=int, nargs="+", default=list(REDUCED_PARTS),
+                        help="68-point landmark indices to keep")
+    parser.add_argument("--export-only", action="store_true",
+                        help="Only write the reduced XML dataset(s) next to the output")
+    parser.add_argument("--cascade-depth", type=int, default=10, help="Cascades of regression trees")
+    parser.add_argument("--tree-depth", type=int, default=4, help="Depth of each regression tree")
+    parser.add_argument("--trees", type=int, default=500, help="Trees per cascade level")
+    parser.add_argument("--nu", type=float, default=0.1, help="Regularisation (shrinkage) factor")
+    parser.add_argument("--oversampling", type=int, default=20, help="Random initialisations per face")
+    parser.add_argument("--feature-pool-size", type=int, default=400, help="Pixels sampled per cascade")
+    parser.add_argument("--test-splits", type=int, default=20, help="Split candidates tried per tree node")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Training threads")
+    parser.add_argument("--verbose", action="store_true", help="Print dlib's training progress")
+    args = parser.parse_args(argv)
+
+    parts = sorted(set(args.parts))
+    if any(not 0 <= i < 68 for i in parts):
+        parser.error("--parts must be 68-point landmark indices (0-67)")
+    missing = sorted(set(REDUCED_PARTS) - set(parts))
+    if missing:
+        print(f"Warning: parts {missing} are not predicted, so face shapes cannot be measured", file=sys.stderr)
+    for path in [args.dataset] + ([args.test] if args.test else []):
+        if not os.path.exists(path):
+            parser.error(f"Dataset not found at: {path}")
+
+    stem = os.path.splitext(args.output)[0]
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    train_xml = stem + ".train.xml"
+    images, boxes = export_subset(args.dataset, train_xml, parts)
+    print(f"Exported {boxes} faces in {images} images with {len(parts)} landmarks to {train_xml}")
+    test_xml = None
+    if args.test:
+        test_xml = stem + ".test.xml"
+        images, boxes = export_subset(args.test, test_xml, parts)
+        print(f"Exported {boxes} test faces in {images} images to {test_xml}")
+    if args.export_only:
+        return
+
+    import dlib
+
+    options = training_options(args)
+    start = time.perf_counter()
+    dlib.train_shape_predictor(train_xml, args.output, options)
+    seconds = time.perf_counter() - start
+    train_error = dlib.test_shape_predictor(train_xml, args.output)
+    test_error = dlib.test_shape_predictor(test_xml, args.output) if test_xml else None
+
+    write_layout(args.output, parts,
+                 dataset=os.path.abspath(args.dataset),
+                 trained=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                 training_seconds=round(seconds, 1),
+                 options={'cascade_depth': args.cascade_depth, 'tree_depth': args.tree_depth,
+                          'trees': args.trees, 'nu': args.nu, 'oversampling': args.oversampling,
+                          'feature_pool_size': args.feature_pool_size, 'test_splits': args.test_splits},
+                 train_error_px=round(train_error, 3),
+                 test_error_px=round(test_error, 3) if test_error is not None else None)
+
+    print(f"Trained in {seconds:.0f}s; mean error {train_error:.2f} px on the training set"
+          + (f", {test_error:.2f} px on the test set" if test_error is not None else ""))
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) and {layout_path(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import math
+
+import numpy as np
+
+from face_shape import SHAPES, UNKNOWN_SHAPE
+
+LABELS = SHAPES + [UNKNOWN_SHAPE]
+
+
+def wilson_lower_bound(successes, total, z=2.58):
+    """Lower end of the Wilson score interval for a proportion (99% by default)."""
+    if total <= 0:
+        return 0.0
+    p = successes / total
+    z2 = z * z
+    centre = p + z2 / (2 * total)
+    margin = z * math.sqrt(max(0.0, p * (1 - p) / total + z2 / (4 * total * total)))
+    return (centre - margin) / (1 + z2 / total)
+
+
+class ShapeVoter:
+    """
+    Running per-shape vote counts with fixed memory and O(1) updates.
+
+    By default every vote counts equally. With `window` only the most recent
+    `window` votes count (kept in a ring buffer); with `half_life` (seconds)
+    older votes decay exponentially. The two are mutually exclusive.
+
+    `accept` is the share the leader needs for a decision once the analysis
+    time is up (default: `threshold`).
+    """
+
+    def __init__(self, window=None, half_life=None, threshold=0.6,
+                 min_votes=15, min_time=2.0, z=2.58, accept=None):
+        if window and half_life:
+            raise ValueError("Use either a vote window or a half-life, not both")
+        self.window = window
+        self.half_life = half_life
+        self.threshold = threshold
+        self.min_votes = min_votes
+        self.min_time = min_time
+        self.z = z
+        self.accept = threshold if accept is None else accept
+        self.reset()
+
+    def reset(self):
+        self.counts = dict.fromkeys(LABELS, 0.0)
+        self.total = 0.0
+        self.votes = 0
+        self._last_time = None
+        self._ring = [None] * self.window if self.window else None
+        self._ring_pos = 0
+
+    def add(self, shape, timestamp=None):
+        """Record one per-frame label."""
+        if shape not in self.counts:
+            shape = UNKNOWN_SHAPE
+
+        if self.half_life and timestamp is not None:
+            if self._last_time is not None:
+                decay = 0.5 ** ((timestamp - self._last_time) / self.half_life)
+                for label in self.counts:
+                    self.counts[label] *= decay
+                self.total *= decay
+            self._last_time = timestamp
+
+        if self._ring is not None:
+            oldest = self._ring[self._ring_pos]
+            if oldest is not None:
+                self.counts[oldest] -= 1
+                self.total -= 1
+            self._ring[self._ring_pos] = shape
+            self._ring_pos = (self._ring_pos + 1) % self.window
+
+        self.counts[shape] += 1
+        self.total += 1
+        self.votes += 1
+
+    def leader(self):
+        """
+        Most voted shape and its vote share
+
+        Returns:
+            tuple: (shape, confidence), or (None, 0.0) before any vote
+        """
+        if self.total <= 0:
+            return None, 0.0
+        shape = max(self.counts, key=self.counts.get)
+        return shape, self.counts[shape] / self.total
+
+    def is_settled(self, elapsed):
+        """
+        True once the leader's share is confidently above the threshold,
+        so the analysis can finish before the full time window.
+        """
+        if elapsed < self.min_time or self.votes < self.min_votes:
+            return False
+        shape, _ = self.leader()
+        return wilson_lower_bound(self.counts[shape], self.total, self.z) > self.threshold
+
+
+class ScoreAccumulator:
+    """
+    Running shape evidence from per-frame class probabilities.
+
+    Each frame adds `frame_weight` times its log-probabilities to a running
+    total and the posterior is the softmax of that total. Successive frames
+    of one face are strongly correlated, so a weight below 1 keeps a second
+    of video from counting as thirty independent looks. With `half_life`
+    (seconds) older evidence decays.
+
+    The vote settles once the leader's posterior reaches `threshold`; when
+    the analysis time runs out a posterior of `accept` is enough.
+    """
+
+    def __init__(self, threshold=0.9, accept=0.5, min_votes=5, min_time=0.5,
+                 frame_weight=0.2, half_life=None):
+        self.threshold = threshold
+        self.accept = accept
+        self.min_votes = min_votes
+        self.min_time = min_time
+        self.frame_weight = frame_weight
+        self.half_life = half_life
+        self.reset()
+
+    def reset(self):
+        self.evidence = np.zeros(len(SHAPES))
+        self.votes = 0
+        self._last_time = None
+
+    def add(self, scores, timestamp=None):
+        """Record one frame's probabilities (in SHAPES order); unusable frames are skipped."""
+        if scores is None or not np.all(np.isfinite(scores)):
+            return
+        if self.half_life and timestamp is not None:
+            if self._last_time is not None:
+                self.evidence *= 0.5 ** ((timestamp - self._last_time) / self.half_life)
+            self._last_time = timestamp
+        self.evidence += self.frame_weight * np.log(np.maximum(scores, 1e-12))
+        self.votes += 1
+
+    def posterior(self):
+        """Probability of each shape given the frames so far, in SHAPES order"""
+        weights = np.exp(self.evidence - self.evidence.max())
+        return weights / weights.sum()
+
+    def leader(self):
+        """
+        Most probable shape and its posterior
+
+        Returns:
+            tuple: (shape, confidence), or (None, 0.0) before any usable frame
+        """
+        if self.votes == 0:
+            return None, 0.0
+        posterior = self.posterior()
+        best = int(np.argmax(posterior))
+        return SHAPES[best], float(posterior[best])
+
+    def is_settled(self, elapsed):
+        """True once the leader is probable enough to stop before the full time window."""
+        if elapsed < self.min_time or self.votes < self.min_votes:
+            return False
+        return self.leader()[1] >= self.threshold
+
+
+def scoring_for(shape_model, scoring):
+    """
+    ScoreAccumulator options for `shape_model`'s probabilities
+
+    Stopping early trusts the posterior, so unless the model is calibrated
+    every face gets the full analysis time.
+    """
+    if scoring is None or shape_model is None or shape_model.calibrated:
+        return scoring
+    return dict(scoring, min_time=float('inf'))
+
+
+class FaceSession:
+    """
+    Vote state and analysis timer for one tracked face.
+
+    With `scoring` options the session accumulates per-frame shape
+    probabilities (see ScoreAccumulator); otherwise it counts per-frame
+    labels (see ShapeVoter, configured by `vote_options`).
+
+    The analysis finishes when the vote settles, or when `duration` seconds
+    have passed and the leader clears the voter's `accept` level; `result`
+    and `confidence` then hold the decided shape and its share or posterior.
+    `frames` counts the frames analyzed until then, and mean_ratios() gives
+    their average face ratios when those were passed in.
+    """
+
+    def __init__(self, face_id, now, duration=10.0, scoring=None, **vote_options):
+        self.face_id = face_id
+        self.scored = scoring is not None
+        self.voter = ScoreAccumulator(**scoring) if self.scored else ShapeVoter(**vote_options)
+        self.duration = duration
+        self.start_time = now
+        self.last_seen = now
+        self.elapsed = 0.0
+        self.result = None
+        self.confidence = None
+        self.recalled = False
+        self.frames = 0
+        self._ratio_sum = None
+        self._ratio_count = 0
+
+    def add(self, shape, now, scores=None, ratios=None):
+        """
+        Record one frame of a face
+
+        Args:
+            shape (str): The frame's own label
+            now (float): Current time in seconds
+            scores (np.ndarray): The frame's shape probabilities, used when scoring
+            ratios (np.ndarray): The frame's face_shape.RATIO_KEYS values
+
+        Returns:
+            str: Label to show for this face: the frame's own label while
+                the analysis runs, the running leader after that (the
+                stored shape for a returning face)
+        """
+        self.voter.add(scores if self.scored else shape, now)
+        self.last_seen = now
+        if self.result is None:
+            self.frames += 1
+            if ratios is not None and np.all(np.isfinite(ratios)):
+                self._ratio_sum = ratios if self._ratio_sum is None else self._ratio_sum + ratios
+                self._ratio_count += 1
+            self.elapsed = now - self.start_time
+            settled = self.voter.is_settled(self.elapsed)
+            if settled or self.elapsed >= self.duration:
+                leader, confidence = self.voter.leader()
+                if settled or (leader is not None and confidence > self.voter.accept):
+                    self.result = leader
+                    self.confidence = confidence
+        if self.recalled:
+            return self.result
+        if self.result is not None or self.elapsed >= self.duration:
+            return self.voter.leader()[0] or shape
+        return shape
+
+    def mean_ratios(self):
+        """Average RATIO_KEYS values over the analyzed frames, or None if none were given."""
+        return None if self._ratio_sum is None else self._ratio_sum / self._ratio_count
+
+    def recall(self, shape, confidence):
+        """Take a stored result for a returning face instead of analysing it."""
+        self.result = shape
+        self.confidence = confidence
+        self.recalled = True
+
+    def resume(self, now):
+        """Continue the timer from where it stopped, after the video was paused."""
+        self.start_time = now - self.elapsed
+        self.last_seen = now
+
+    def remaining(self):
+        return max(0, int(self.duration - self.elapsed))
+
+
+class FaceSessions(dict):
+    """
+    FaceSession per track ID.
+
+    A face gets a session the first time it is seen and loses it after
+    `timeout` seconds out of view (see prune), so someone stepping back in
+    front of the camera starts a fresh analysis.
+    """
+
+    def __init__(self, duration=10.0, timeout=3.0, scoring=None, **vote_options):
+        super().__init__()
+        self.duration = duration
+        self.timeout = timeout
+        self.scoring = scoring
+        self.vote_options = vote_options
+
+    def add(self, face_id, shape, now, scores=None, known=None, ratios=None):
+        """
+        Record one frame of a face in its session (see FaceSession.add)
+
+        Args:
+            known (dict): Stored identity of a returning face ('shape' and
+                'confidence'), which decides an undecided session at once
+
+        Returns:
+            tuple: (label to show, the face's FaceSession, True if this frame
+                decided its shape)
+        """
+        session = self.get(face_id)
+        if session is None:
+            session = FaceSession(face_id, now, self.duration, self.scoring, **self.vote_options)
+            self[face_id] = session
+        decided = session.result is not None
+        if known is not None and not decided:
+            session.recall(known['shape'], known['confidence'])
+        face_shape = session.add(shape, now, scores, ratios)
+        return face_shape, session, not decided and session.result is not None
+
+    def prune(self, now):
+        """Drop faces unseen for more than `timeout` seconds."""
+        for face_id in [i for i, session in self.items() if now - session.last_seen > self.timeout]:
+            del self[face_id]
+
+    def pending(self):
+        """Sessions still collecting frames."""
+        return [session for session in self.values() if session.result is None]